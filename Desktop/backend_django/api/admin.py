@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Song, Album, Message
+from .models import User, Artist, Song, Album, Message
+from .deletion import delete_albums, delete_songs
 
 
 @admin.register(User)
@@ -33,14 +34,14 @@ class SongAdmin(admin.ModelAdmin):
     list_filter = ['album', 'created_at']
     search_fields = ['title', 'artist']
     ordering = ['-created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['bitrate', 'codec', 'created_at', 'updated_at']
 
     fieldsets = (
         ('Song Information', {
             'fields': ('title', 'artist', 'duration', 'album')
         }),
         ('Media Files', {
-            'fields': ('image_url', 'audio_url')
+            'fields': ('image_url', 'audio_url', 'bitrate', 'codec')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -48,6 +49,12 @@ class SongAdmin(admin.ModelAdmin):
         }),
     )
 
+    def delete_model(self, request, obj):
+        delete_songs(Song.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_songs(queryset)
+
 
 @admin.register(Album)
 class AlbumAdmin(admin.ModelAdmin):
@@ -71,9 +78,32 @@ class AlbumAdmin(admin.ModelAdmin):
         }),
     )
 
-    def songs_count(self, obj):
-        return obj.songs.count()
-    songs_count.short_description = 'Number of Songs'
+    def get_deleted_objects(self, objs, request):
+        """Summarise the songs by count instead of collecting each one for the confirmation page"""
+        albums = list(objs)
+        songs = Song.objects.filter(album__in=albums).count()
+        perms_needed = set()
+        if songs and not request.user.has_perm('api.delete_song'):
+            perms_needed.add(Song._meta.verbose_name)
+        model_count = {Album._meta.verbose_name_plural: len(albums)}
+        if songs:
+            model_count[Song._meta.verbose_name_plural] = songs
+        return [str(album) for album in albums], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        delete_albums(Album.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_albums(queryset)
+
+
+@admin.register(Artist)
+class ArtistAdmin(admin.ModelAdmin):
+    """Admin configuration for Artist model"""
+    list_display = ['name', 'songs_count', 'albums_count', 'created_at']
+    search_fields = ['name']
+    ordering = ['name']
+    readonly_fields = ['songs_count', 'albums_count', 'created_at']
 
 
 @admin.register(Message)
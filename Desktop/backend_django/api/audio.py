@@ -0,0 +1,178 @@
+"""
+Audio metadata and waveforms for uploaded songs.
+
+On upload the audio headers are parsed (mutagen) to fill ``duration``,
+``bitrate`` and ``codec``, so nobody types durations in by hand. After the
+upload commits, ``audio_pipeline`` decodes the file in a worker process
+(libsndfile via soundfile) and reduces it with NumPy to WAVEFORM_POINTS
+peaks, stored as one byte each in SongWaveform and served by
+``GET /api/songs/{id}/waveform/``. Songs saved without signals are covered
+by ``manage.py extract_audio_metadata``.
+"""
+
+import io
+import logging
+
+from django.conf import settings
+
+from .models import Song, SongWaveform
+from .workers import MediaWorkers
+
+
+logger = logging.getLogger(__name__)
+
+WAVEFORM_POINTS = 1000
+PEAK_MAX = 127  # Peaks fit a signed byte
+# Frames decoded per read while computing peaks, in units of one point's frames
+DECODE_POINTS_PER_READ = 64
+
+# mutagen file type -> codec name
+CODECS = {
+    "MP3": "mp3",
+    "EasyMP3": "mp3",
+    "FLAC": "flac",
+    "OggVorbis": "vorbis",
+    "OggOpus": "opus",
+    "OggFLAC": "flac",
+    "WAVE": "pcm",
+    "AIFF": "pcm",
+    "MP4": "aac",
+    "EasyMP4": "aac",
+}
+
+
+def audio_storage():
+    return Song._meta.get_field("audio_url").storage
+
+
+def read_metadata(source):
+    """
+    {"duration", "bitrate", "codec"} from the headers of ``source`` (a path
+    or a seekable file), or None when the format isn't recognised.
+    Duration is in whole seconds and bitrate in kbps.
+    """
+    import mutagen
+
+    try:
+        audio = mutagen.File(source)
+    except mutagen.MutagenError:
+        return None
+    if audio is None or not getattr(audio.info, "length", 0):
+        return None
+    bitrate = getattr(audio.info, "bitrate", 0) or 0
+    codec = CODECS.get(type(audio).__name__, type(audio).__name__.lower())
+    if codec == "aac" and getattr(audio.info, "codec", "").startswith("alac"):
+        codec = "alac"
+    return {
+        "duration": round(audio.info.length),
+        "bitrate": round(bitrate / 1000) or None,
+        "codec": codec,
+    }
+
+
+def compute_peaks(source, points=WAVEFORM_POINTS):
+    """
+    (peaks, seconds) for the audio in ``source``: the loudest absolute
+    sample of each of (at most) ``points`` equal slices, over all channels,
+    scaled so the loudest slice is PEAK_MAX and packed one int8 per point.
+    """
+    # Imported here so web workers that never decode audio don't load them
+    import numpy as np
+    import soundfile
+
+    with soundfile.SoundFile(source) as audio:
+        frames, samplerate = audio.frames, audio.samplerate
+        if frames <= 0:
+            raise ValueError("No audio frames")
+        step = -(-frames // points)  # Frames per point, rounded up
+        envelope = []
+        for block in audio.blocks(step * DECODE_POINTS_PER_READ, dtype="float32", always_2d=True):
+            block = np.abs(block).max(axis=1)
+            block = np.pad(block, (0, -len(block) % step))
+            envelope.append(block.reshape(-1, step).max(axis=1))
+
+    peaks = np.concatenate(envelope) if envelope else np.zeros(0, dtype="float32")
+    top = peaks.max(initial=0)
+    if top > 0:
+        peaks = np.rint(peaks * (PEAK_MAX / top))
+    return peaks.astype(np.int8).tobytes(), frames / samplerate
+
+
+def analyze(source):
+    """
+    Metadata and peaks of ``source`` (a path, or the file's bytes when the
+    storage has no local paths). Runs in a worker process.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    metadata = read_metadata(source)
+    if not isinstance(source, str):
+        source.seek(0)
+    peaks, seconds = compute_peaks(source)
+    if metadata is None:
+        metadata = {"duration": round(seconds), "bitrate": None, "codec": ""}
+    return {**metadata, "peaks": peaks}
+
+
+def unpack_peaks(peaks):
+    """Stored peaks as a list of ints"""
+    return list(bytes(peaks))
+
+
+def store_analysis(song_id, name, result, overwrite=False):
+    """
+    Record ``result`` for song ``song_id`` unless its audio changed from
+    ``name`` meanwhile. Metadata already read at upload time is kept unless
+    ``overwrite``.
+    """
+    songs = Song.objects.filter(pk=song_id, audio_url=name)
+    if not songs.exists():
+        return False
+    metadata = {"duration": result["duration"], "bitrate": result["bitrate"], "codec": result["codec"]}
+    (songs if overwrite else songs.filter(bitrate__isnull=True)).update(**metadata)
+    SongWaveform.objects.update_or_create(
+        song_id=song_id, defaults={"peaks": result["peaks"], "source": name}
+    )
+    return True
+
+
+class AudioPipeline:
+    """Audio analysis on MediaWorkers pools (inline with ``workers=0``)"""
+
+    def __init__(self, workers=2):
+        self.pool = MediaWorkers(workers, "audio-pipeline")
+
+    def analyze(self, name):
+        """analyze() of the stored file ``name``, or None when it can't be decoded"""
+        storage = audio_storage()
+        try:
+            try:
+                source = storage.path(name)
+            except NotImplementedError:
+                with storage.open(name, "rb") as audio:
+                    source = audio.read()
+            return self.pool.compute(analyze, source)
+        except (RuntimeError, OSError, ValueError):
+            # Missing files and undecodable uploads (soundfile's LibsndfileError is a RuntimeError)
+            logger.warning("Could not analyze audio %s", name, exc_info=True)
+            return None
+
+    def process(self, song_id, name):
+        result = self.analyze(name)
+        if result is not None:
+            store_analysis(song_id, name, result)
+        return result
+
+    def submit(self, song_id, name):
+        """Queue process(); call once the song is committed"""
+        return self.pool.submit(self.process, song_id, name)
+
+    def map(self, names):
+        """analyze() for many files in parallel; results in the order of ``names``"""
+        return self.pool.map(self.analyze, names)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+audio_pipeline = AudioPipeline(workers=getattr(settings, "AUDIO_WORKERS", 2))
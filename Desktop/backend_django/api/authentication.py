@@ -0,0 +1,136 @@
+"""
+Authentication without a database round trip per request.
+
+CachedTokenAuthentication resolves DRF tokens through a bounded TTL cache
+(AUTH_CACHE_ALIAS) holding the user's columns, so only the first request
+of each token within AUTH_CACHE_TIMEOUT queries ``authtoken_token`` and
+``users``. The signals in api/signals.py drop a user's entry when the
+token is deleted (logout) or the user is saved (password change,
+deactivation) or deleted. With a per-process cache other workers may keep
+serving a revoked token until the entry expires; point AUTH_CACHE_ALIAS
+at a shared cache to invalidate everywhere at once.
+
+SignedTokenAuthentication accepts ``Authorization: Bearer <token>``
+access tokens minted by POST /api/auth/access-token/. They carry the user
+in signed claims and are never looked up, so they can't be revoked: they
+simply expire after ACCESS_TOKEN_LIFETIME seconds.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+
+TOKEN_CACHE_PREFIX = "auth:token:"
+ACCESS_TOKEN_SALT = "api.authentication.access-token"
+# Enough for request.user in views and permissions; other fields load on access
+ACCESS_TOKEN_CLAIMS = ("id", "email", "full_name", "is_active", "is_staff", "is_superuser")
+
+
+def _cache():
+    return caches[getattr(settings, "AUTH_CACHE_ALIAS", "default")]
+
+
+def _cache_key(key):
+    # Raw tokens never reach a shared cache
+    return TOKEN_CACHE_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _cached_fields():
+    return [field.attname for field in User._meta.concrete_fields if field.attname != "password"]
+
+
+def user_from_values(values):
+    """User instance built without a query; columns not in ``values`` are deferred"""
+    # from_db() wants the values in concrete field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+def resolve_token(key):
+    """(user, token) for a DRF token key, or None. Cached per AUTH_CACHE_TIMEOUT."""
+    cache = _cache()
+    cache_key = _cache_key(key)
+    cached = cache.get(cache_key)
+    if cached is None:
+        token = Token.objects.select_related("user").filter(key=key).first()
+        if token is None:
+            return None
+        cached = (token.created, {name: getattr(token.user, name) for name in _cached_fields()})
+        cache.set(cache_key, cached, getattr(settings, "AUTH_CACHE_TIMEOUT", 300))
+
+    created, values = cached
+    user = user_from_values(values)
+    return user, Token(key=key, user=user, created=created)
+
+
+def invalidate_tokens(keys):
+    """Forget cached resolutions of these token keys once the transaction commits"""
+    cache_keys = [_cache_key(key) for key in keys]
+    if cache_keys:
+        transaction.on_commit(lambda: _cache().delete_many(cache_keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication backed by resolve_token()"""
+
+    def authenticate_credentials(self, key):
+        resolved = resolve_token(key)
+        if resolved is None:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        user, token = resolved
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return user, token
+
+
+def issue_access_token(user):
+    """Signed, stateless access token for ``user``"""
+    claims = {name: getattr(user, name) for name in ACCESS_TOKEN_CLAIMS}
+    return signing.dumps(claims, salt=ACCESS_TOKEN_SALT, compress=True)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    ``Authorization: Bearer <access token>``: verified with SECRET_KEY only.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid bearer header.")
+
+        try:
+            claims = signing.loads(
+                auth[1].decode(),
+                salt=ACCESS_TOKEN_SALT,
+                max_age=getattr(settings, "ACCESS_TOKEN_LIFETIME", 900),
+            )
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed("Access token expired.")
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed("Invalid access token.")
+
+        user = user_from_values(claims)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return user, auth[1].decode()
+
+    def authenticate_header(self, request):
+        return self.keyword
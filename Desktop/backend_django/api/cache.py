@@ -0,0 +1,110 @@
+"""
+Versioned response cache for the read-only catalog endpoints.
+
+Cache keys embed the CatalogVersion counter, so any song/album write (API,
+admin site or bulk queryset operation) makes every cached payload
+unreachable at once; stale entries simply age out through LRU eviction
+(LocMemCache) or their timeout. What is cached is ``response.data``, so
+hits skip the database and DRF serialization but are still rendered in
+whichever format the client negotiated.
+"""
+
+import hashlib
+import threading
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .conditional import catalog_version
+
+
+class CacheCounters:
+    """Per-endpoint hit/miss counters for this worker process"""
+
+    def __init__(self):
+        self._counts = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, hit):
+        with self._lock:
+            self._counts[endpoint]["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: dict(counts) for name, counts in self._counts.items()}
+        hits = sum(counts["hits"] for counts in endpoints.values())
+        misses = sum(counts["misses"] for counts in endpoints.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "endpoints": endpoints,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+cache_counters = CacheCounters()
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def cached_response(view, request, handler, *args, timeout=None, **kwargs):
+    """Serve ``handler``'s payload from the catalog cache when possible"""
+    # updated_at guards against version numbers being reused after a
+    # database restore
+    version, updated_at = catalog_version(request)
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    key = f"catalog:{version}.{updated_at.timestamp()}:{url}"
+    endpoint = f"{view.basename}-{view.action}"
+
+    data = _cache().get(key)
+    if data is not None:
+        cache_counters.record(endpoint, hit=True)
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+        return response
+
+    cache_counters.record(endpoint, hit=False)
+    response = handler(request, *args, **kwargs)
+    if response.status_code == 200:
+        _cache().set(
+            key,
+            response.data,
+            timeout if timeout is not None else getattr(settings, "CATALOG_CACHE_TIMEOUT", 300),
+        )
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def catalog_cached(timeout=None):
+    """Decorator for extra read-only viewset actions (e.g. featured)"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            return cached_response(
+                self, request, lambda *a, **kw: method(self, *a, **kw), *args,
+                timeout=timeout, **kwargs
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class CatalogCacheMixin:
+    """Caches list and retrieve payloads of a catalog viewset"""
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(self, request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(self, request, super().retrieve, *args, **kwargs)
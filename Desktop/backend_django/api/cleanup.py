@@ -0,0 +1,201 @@
+"""
+Deferred removal of uploaded files.
+
+Deleting a song, album or user records its files (audio, image and image
+derivatives) in the MediaCleanup queue within the deleting transaction:
+one entry per row, or per batch for set-based deletes (api/deletion.py).
+After commit, ``media_cleanup`` removes them on a background thread, so a
+delete never waits on the file system. A file is only removed once no
+remaining row references it: synthetic catalogs and imports reuse upload
+names, and identical images share their content-hashed derivatives. A
+derivative removed just as a new row reused it is rebuilt for that row:
+the image pipeline checks its files again after recording them, and the
+cleanup checks the references again after removing. Once started, the
+thread also drains the queue every MEDIA_CLEANUP_INTERVAL seconds, retrying
+failed removals; ``manage.py cleanup_media`` drains it on demand, e.g. for
+entries left by a crash.
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from .images import IMAGE_MODELS, SOURCE_KEY, VARIANTS, image_pipeline
+from .models import Album, MediaCleanup, Song, User, on_commit_once
+
+
+logger = logging.getLogger(__name__)
+
+# Models with uploaded files and their FileField columns
+FILE_COLUMNS = {Song: ("audio_url", "image_url"), Album: ("image_url",), User: ("image_url",)}
+
+
+def media_paths(*names, variants=None):
+    """Storage names of a row's files: its FileField values plus its image derivatives"""
+    paths = [name for name in names if name]
+    paths.extend(path for key, path in (variants or {}).items() if key != SOURCE_KEY and path)
+    return paths
+
+
+def instance_media(instance):
+    columns = FILE_COLUMNS.get(type(instance), ())
+    return media_paths(
+        *(getattr(instance, column).name for column in columns),
+        variants=getattr(instance, "image_variants", None),
+    )
+
+
+def queue_media(paths, using=None):
+    """Queue ``paths`` for removal once the current transaction commits"""
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return
+    MediaCleanup.objects.using(using).create(paths=paths)
+    on_commit_once(media_cleanup.wake, using=using)
+
+
+def _derived_from(paths):
+    """Rows whose image variants include one of ``paths``"""
+    condition = Q()
+    for variant in VARIANTS:
+        condition |= Q(**{f"image_variants__{variant}__in": paths})
+    return condition
+
+
+def referenced_paths(paths):
+    """The subset of ``paths`` some song, album or user still references"""
+    paths = set(paths)
+    derived = _derived_from(paths)
+    used = set()
+    for model, columns in FILE_COLUMNS.items():
+        condition = derived
+        for column in columns:
+            condition |= Q(**{f"{column}__in": paths})
+        rows = model._base_manager.filter(condition).values_list(*columns, "image_variants")
+        for *names, variants in rows.iterator():
+            used.update(names)
+            used.update(variants.values())
+    return used & paths
+
+
+def rebuild_derivatives(paths):
+    """
+    Queue new variants, after commit, for rows that started using one of the
+    removed ``paths`` after referenced_paths() was checked
+    """
+    if not paths:
+        return
+    condition = _derived_from(set(paths))
+    for model in IMAGE_MODELS.values():
+        rows = model._base_manager.filter(condition).exclude(image_url="").values_list("pk", "image_url")
+        for pk, name in rows.iterator():
+            transaction.on_commit(
+                lambda model=model, pk=pk, name=name: image_pipeline.submit(model, pk, name)
+            )
+
+
+class MediaCleanupWorker:
+    """
+    Drains the MediaCleanup queue. With an ``interval`` a daemon thread
+    drains it every interval and whenever a delete commits; without one,
+    committed deletes drain it synchronously.
+    """
+
+    def __init__(self, interval=5.0, batch_size=500, max_attempts=5):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    def wake(self):
+        """Drain soon (on the worker thread) or now (without an interval)"""
+        if self.interval:
+            self._ensure_worker()
+            self._wakeup.set()
+            return
+        try:
+            self.drain()
+        except Exception:
+            logger.exception("Failed to remove deleted media")
+
+    def drain(self, storage=None):
+        """Process every queued entry once; returns (files removed, files that failed)"""
+        storage = storage or default_storage
+        removed = failed = 0
+        last = 0
+        while True:
+            # Take the entry off the queue first, so no lock is held while
+            # the storage removes files
+            with transaction.atomic():
+                entry = (
+                    MediaCleanup.objects.select_for_update(skip_locked=True)
+                    .filter(id__gt=last, attempts__lt=self.max_attempts)
+                    .order_by("id")
+                    .first()
+                )
+                if entry is None:
+                    return removed, failed
+                last = entry.id
+                MediaCleanup.objects.filter(pk=entry.pk).delete()
+
+            chunks = []
+            errors = []
+            for start in range(0, len(entry.paths), self.batch_size):
+                chunk = entry.paths[start:start + self.batch_size]
+                in_use = referenced_paths(chunk)
+                gone = []
+                for path in chunk:
+                    if path in in_use:
+                        continue
+                    try:
+                        storage.delete(path)
+                    except OSError:
+                        logger.warning("Could not remove %s", path, exc_info=True)
+                        errors.append(path)
+                    else:
+                        gone.append(path)
+                chunks.append(gone)
+                removed += len(gone)
+
+            with transaction.atomic():
+                for gone in chunks:
+                    rebuild_derivatives(gone)
+                if errors:
+                    # Requeued under the same id, so this drain doesn't retry it
+                    entry.paths = errors
+                    entry.attempts += 1
+                    entry.save(force_insert=True)
+            failed += len(errors)
+
+    def _ensure_worker(self):
+        # is_alive() is False in a forked child, so each worker process
+        # starts its own cleanup thread on first use.
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="media-cleanup", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Failed to remove deleted media")
+
+
+media_cleanup = MediaCleanupWorker(
+    interval=getattr(settings, "MEDIA_CLEANUP_INTERVAL", 5.0),
+    batch_size=getattr(settings, "MEDIA_CLEANUP_BATCH_SIZE", 500),
+)
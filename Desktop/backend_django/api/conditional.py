@@ -0,0 +1,44 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import CatalogVersion
+
+
+def catalog_version(request):
+    """CatalogVersion.current(), looked up at most once per request"""
+    if not hasattr(request, "_catalog_version"):
+        request._catalog_version = CatalogVersion.current()
+    return request._catalog_version
+
+
+class CatalogConditionalMixin:
+    """
+    Conditional GET for catalog viewsets.
+
+    Validators come from CatalogVersion (one primary-key lookup), so a
+    revalidation that ends in 304 Not Modified never loads or serializes
+    songs and albums. Any song/album write, including deletes, bumps the
+    version and therefore changes the ETag.
+    """
+
+    def catalog_validators(self, request):
+        version, updated_at = catalog_version(request)
+        return quote_etag(f"catalog-{version}"), int(updated_at.timestamp())
+
+    def finalize_conditional(self, request, handler, *args, **kwargs):
+        etag, last_modified = self.catalog_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.finalize_conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.finalize_conditional(request, super().retrieve, *args, **kwargs)
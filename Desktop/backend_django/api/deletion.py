@@ -0,0 +1,159 @@
+"""
+Set-based deletes for songs and albums.
+
+Django's delete collector loads every song of a deleted album (and every
+play, stats and similarity row under it) into memory, then sends the delete
+signals row by row. delete_songs() and delete_albums() instead work through
+the rows in batches of DELETE_BATCH_SIZE ids. Each batch takes one DELETE
+per dependent table plus one for the rows themselves. The side effects of
+the per-row signals in api/signals.py are applied once at the end: album
+and artist counts, catalog version, platform stats, search index and
+sampling pool. Each batch's files are queued as one entry for the media
+cleanup worker (api/cleanup.py) in the same transaction and removed after
+commit.
+"""
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.deletion import Collector, RestrictedError
+
+from .cleanup import media_paths, queue_media
+from .models import Album, Artist, CatalogVersion, PlatformStats, Song
+from .sampling import song_pool
+from .search import search_index
+
+
+SONG_COLUMNS = ("id", "title", "artist", "artist_ref_id", "album_id", "audio_url", "image_url", "image_variants")
+ALBUM_COLUMNS = ("id", "title", "artist", "artist_ref_id", "image_url", "image_variants")
+
+
+def _batches(queryset, columns, batch_size):
+    """values_list() rows of ``queryset`` in primary key order, ``batch_size`` at a time"""
+    rows = queryset.order_by("pk").values_list(*columns)
+    last = None
+    while True:
+        batch = list((rows if last is None else rows.filter(pk__gt=last))[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1][0]
+
+
+def _delete_dependents(model, ids, using, skip=()):
+    """Apply the on_delete of every relation pointing at rows ``ids``, one statement each"""
+    for relation in model._meta.related_objects:
+        related = relation.related_model
+        if relation.many_to_many or related in skip:
+            continue
+        name = relation.field.name
+        rows = related._base_manager.using(using).filter(**{f"{name}__in": ids})
+        if relation.on_delete is models.CASCADE:
+            # Single DELETE via the collector's fast path when the rows have no
+            # signals or cascades of their own; the full collector otherwise
+            rows.delete()
+        elif relation.on_delete is models.SET_NULL:
+            rows.update(**{name: None})
+        elif relation.on_delete is models.RESTRICT:
+            # Nothing here deletes the restricting rows through another path
+            if rows.exists():
+                raise RestrictedError(
+                    f"Cannot delete some {model.__name__} rows because they are referenced "
+                    f"through restricted foreign key '{related.__name__}.{name}'",
+                    set(rows),
+                )
+        elif relation.on_delete is not models.DO_NOTHING:
+            # PROTECT raises ProtectedError; SET_DEFAULT and SET() schedule a
+            # field update that the collector applies as one UPDATE
+            if getattr(relation.on_delete, "lazy_sub_objs", False) or rows.exists():
+                collector = Collector(using)
+                relation.on_delete(collector, relation.field, rows, using)
+                collector.delete()
+
+
+class _Deletion:
+    """Rows deleted so far, and the signal side effects owed for them"""
+
+    def __init__(self, using, batch_size):
+        self.using = using
+        self.batch_size = batch_size
+        self.album_ids = set()
+        self.deleted_album_ids = set()
+        self.artist_ids = set()
+        self.song_ids = []
+        self.documents = []
+
+    def songs(self, queryset):
+        deleted = 0
+        for batch in _batches(queryset, SONG_COLUMNS, self.batch_size):
+            ids = [row[0] for row in batch]
+            _delete_dependents(Song, ids, self.using)
+            Song._base_manager.using(self.using).filter(pk__in=ids)._raw_delete(self.using)
+            paths = []
+            for song_id, title, artist, artist_id, album_id, audio, image, variants in batch:
+                self.album_ids.add(album_id)
+                self.artist_ids.add(artist_id)
+                self.documents.append(("songs", song_id, (title, artist)))
+                paths.extend(media_paths(audio, image, variants=variants))
+            queue_media(paths, self.using)
+            self.song_ids.extend(ids)
+            deleted += len(ids)
+        return deleted
+
+    def albums(self, queryset):
+        deleted = 0
+        for batch in _batches(queryset, ALBUM_COLUMNS, self.batch_size):
+            ids = [row[0] for row in batch]
+            self.songs(Song._base_manager.using(self.using).filter(album_id__in=ids))
+            _delete_dependents(Album, ids, self.using, skip=(Song,))
+            Album._base_manager.using(self.using).filter(pk__in=ids)._raw_delete(self.using)
+            paths = []
+            for album_id, title, artist, artist_id, image, variants in batch:
+                self.artist_ids.add(artist_id)
+                self.documents.append(("albums", album_id, (title, artist)))
+                paths.extend(media_paths(image, variants=variants))
+            queue_media(paths, self.using)
+            self.deleted_album_ids.update(ids)
+            deleted += len(ids)
+        return deleted
+
+    def finish(self):
+        using = self.using
+        album_ids = self.album_ids - self.deleted_album_ids - {None}
+        if album_ids:
+            Album.objects.using(using).filter(id__in=album_ids).recount_songs()
+        artist_ids = self.artist_ids - {None}
+        if artist_ids:
+            Artist.objects.using(using).filter(id__in=artist_ids).recount()
+        if not (self.song_ids or self.deleted_album_ids):
+            return
+        CatalogVersion.mark_changed(using)
+        PlatformStats.invalidate(using)
+
+        song_ids, documents = self.song_ids, self.documents
+
+        def update_indexes():
+            if song_ids:
+                song_pool.discard_many(song_ids)
+            for kind, doc_id, old in documents:
+                search_index.update(kind, doc_id, old, None)
+
+        transaction.on_commit(update_indexes, using=using)
+
+
+def _delete(queryset, method, batch_size):
+    using = queryset.db
+    with transaction.atomic(using=using):
+        deletion = _Deletion(using, batch_size or getattr(settings, "DELETE_BATCH_SIZE", 1000))
+        deleted = getattr(deletion, method)(queryset)
+        deletion.finish()
+    return deleted
+
+
+def delete_songs(queryset, batch_size=None):
+    """Delete the songs in ``queryset`` without loading them; returns how many were deleted"""
+    return _delete(queryset, "songs", batch_size)
+
+
+def delete_albums(queryset, batch_size=None):
+    """Delete the albums in ``queryset`` and their songs; returns how many albums were deleted"""
+    return _delete(queryset, "albums", batch_size)
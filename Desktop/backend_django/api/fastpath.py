@@ -0,0 +1,242 @@
+"""
+Fast serialization path for read-only catalog lists.
+
+A ValuesSerializer is compiled from an existing ModelSerializer: it fetches
+exactly the serializer's columns with ``.values()`` (following dotted
+sources such as ``album.title`` with a join instead of one query per row)
+and turns each row into the same dict the serializer would produce, without
+building model instances or running DRF's per-field machinery. Only plain
+fields are supported; anything else is rejected when the plan is compiled,
+so output stays identical to the serializer it mirrors (see api/tests.py).
+"""
+
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri, iri_to_uri
+from rest_framework import ISO_8601, fields as drf_fields, relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .images import image_storage
+from .serializers import ImageVariantField
+
+
+# Serializer fields whose representation of a database value is the value itself
+IDENTITY_FIELDS = (
+    drf_fields.BooleanField,
+    drf_fields.CharField,
+    drf_fields.IntegerField,
+    drf_fields.ReadOnlyField,
+    relations.PrimaryKeyRelatedField,
+)
+# Serializer fields whose own to_representation() is cheap and context-free
+DELEGATED_FIELDS = (
+    drf_fields.DateField,
+    drf_fields.DateTimeField,
+    drf_fields.FloatField,
+)
+# Paths urljoin() would rewrite: dot segments and empty segments
+UNSAFE_PATH = re.compile(r"(^|/)\.\.?(/|$)|//")
+
+
+class ValuesSerializer:
+    """Serializes ``.values()`` rows exactly like ``serializer_class`` serializes instances"""
+
+    def __init__(self, serializer_class, fields=None):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.fields = None if fields is None else frozenset(fields)
+        self._plan = None
+        self._subsets = {}
+
+    @property
+    def plan(self):
+        """[(output name, values() key, kind, converter, null-guard keys)], built lazily"""
+        if self._plan is None:
+            self._plan = [
+                self._compile(field)
+                for field in self.serializer_class().fields.values()
+                if self.fields is None or field.field_name in self.fields
+            ]
+        return self._plan
+
+    def subset(self, fields):
+        """ValuesSerializer producing only ``fields`` (cached per field set)"""
+        key = frozenset(fields)
+        subset = self._subsets.get(key)
+        if subset is None:
+            subset = self._subsets[key] = ValuesSerializer(self.serializer_class, key)
+        return subset
+
+    def _compile(self, field):
+        if field.write_only:
+            raise ImproperlyConfigured(f"{field.field_name}: write-only fields are not supported")
+        attrs = field.source_attrs
+        key = "__".join(attrs)
+        # A null foreign key along a dotted source makes DRF skip the field
+        guards = ["__".join(attrs[: i + 1]) for i in range(len(attrs) - 1)]
+
+        if isinstance(field, ImageVariantField):
+            return field.field_name, key, "variant", field, guards
+        if isinstance(field, drf_fields.FileField):
+            model_field = self.model._meta.get_field(key)
+            return field.field_name, key, "file", model_field.storage, guards
+        if isinstance(field, drf_fields.DateTimeField) and _is_default_datetime(field):
+            return field.field_name, key, "datetime", None, guards
+        if isinstance(field, DELEGATED_FIELDS):
+            return field.field_name, key, "call", field.to_representation, guards
+        if isinstance(field, IDENTITY_FIELDS):
+            return field.field_name, key, "value", None, guards
+        raise ImproperlyConfigured(
+            f"{self.serializer_class.__name__}.{field.field_name}: "
+            f"{type(field).__name__} has no fast path"
+        )
+
+    @property
+    def columns(self):
+        keys = []
+        for _, key, _, _, guards in self.plan:
+            keys.extend(column for column in (*guards, key) if column not in keys)
+        return keys
+
+    def rows(self, queryset, extra=()):
+        """``queryset.values()`` with the serializer's columns (plus ``extra``)"""
+        columns = self.columns
+        return queryset.values(*columns, *(column for column in extra if column not in columns))
+
+    def serialize(self, rows, request=None):
+        """List of dicts, as ``serializer_class(instances, many=True).data`` would be"""
+        absolute_url = _absolute_url_builder(request)
+        iso_datetime = _iso_datetime()
+        steps = []
+        for name, key, kind, converter, guards in self.plan:
+            if kind == "file":
+                converter = _file_url(converter, absolute_url)
+            elif kind == "datetime":
+                converter = iso_datetime
+            elif kind == "variant":
+                converter = _variant_url(
+                    converter.variant(request), _file_url(image_storage(self.model), absolute_url)
+                )
+            steps.append((name, key, converter, guards))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, key, converter, guards in steps:
+                if guards and any(row[guard] is None for guard in guards):
+                    continue
+                value = row[key]
+                item[name] = value if value is None or converter is None else converter(value)
+            data.append(item)
+        return data
+
+
+def _is_default_datetime(field):
+    """No per-field format or timezone: DRF renders ISO 8601 in the current zone"""
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    return (
+        output_format is not None
+        and output_format.lower() == ISO_8601
+        and not hasattr(field, "timezone")
+    )
+
+
+def _iso_datetime():
+    """DateTimeField.to_representation() with the current timezone looked up once"""
+    field_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+    fallback = drf_fields.DateTimeField().to_representation
+
+    def iso_datetime(value):
+        if field_timezone is None or not timezone.is_aware(value):
+            return fallback(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return iso_datetime
+
+
+def _storage_url(storage):
+    """storage.url, skipping urljoin() for local files when it can't change the result"""
+    base_url = getattr(storage, "base_url", None)
+    if (
+        not isinstance(storage, FileSystemStorage)
+        or storage.__class__.url is not FileSystemStorage.url  # default_storage is a LazyObject
+        or not base_url
+        or not base_url.startswith("/")
+        or not base_url.endswith("/")
+        or UNSAFE_PATH.search(base_url)
+        or "?" in base_url
+        or "#" in base_url
+    ):
+        return storage.url
+
+    def url(name):
+        path = filepath_to_uri(name).lstrip("/")
+        if UNSAFE_PATH.search(path):
+            return storage.url(name)
+        return base_url + path
+
+    return url
+
+
+def _file_url(storage, absolute_url):
+    """FileField.to_representation() for a stored file name"""
+    storage_url = _storage_url(storage)
+
+    def file_url(name):
+        return absolute_url(storage_url(name)) if name else None
+
+    return file_url
+
+
+def _variant_url(variant, file_url):
+    """ImageVariantField.to_representation() for one variant"""
+
+    def variant_url(variants):
+        return file_url(variants.get(variant))
+
+    return variant_url
+
+
+def _absolute_url_builder(request):
+    """request.build_absolute_uri(), short-circuited for plain root-relative paths"""
+    if request is None:
+        return lambda url: url
+    prefix = request.build_absolute_uri("/")[:-1]
+
+    def absolute_url(url):
+        if url.startswith("/") and not url.startswith("//") and "/./" not in url and "/../" not in url:
+            return iri_to_uri(prefix + url)
+        return request.build_absolute_uri(url)
+
+    return absolute_url
+
+
+class ValuesListMixin:
+    """
+    Serves ``list`` through ``values_serializer`` (a ValuesSerializer) when
+    the action's serializer is the one it mirrors.
+    """
+
+    values_serializer = None
+
+    def get_values_serializer(self):
+        return self.values_serializer
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = self.get_values_serializer()
+        if values_serializer is None or self.get_serializer_class() is not values_serializer.serializer_class:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self.paginator, "ordering", ())
+        rows = values_serializer.rows(queryset, extra=[field.lstrip("-") for field in ordering])
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.serialize(page, request))
+        return Response(values_serializer.serialize(rows, request))
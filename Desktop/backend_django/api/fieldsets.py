@@ -0,0 +1,155 @@
+"""
+Sparse fieldsets: ``?fields=id,title`` and ``?exclude=audio_url``.
+
+SparseFieldsetMixin trims the serializer to the selected fields and pushes
+the same selection down to the database: the queryset loads only the
+columns those fields read (``.only()``), joins only the relations a dotted
+source such as ``album.title`` actually needs, and catalog lists served by
+the ``.values()`` fast path (api/fastpath.py) select just those columns.
+"""
+
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+
+FIELDS_PARAM = "fields"
+EXCLUDE_PARAM = "exclude"
+
+
+@lru_cache(maxsize=None)
+def readable_fields(serializer_class):
+    """{field name: source attrs} of the fields ``serializer_class`` outputs"""
+    return {
+        name: tuple(field.source_attrs)
+        for name, field in serializer_class().fields.items()
+        if not field.write_only
+    }
+
+
+def _param_names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def selected_fields(request, available):
+    """
+    Field names kept by ``?fields=`` / ``?exclude=`` in serializer order, or
+    None when the request doesn't ask for a sparse fieldset.
+    """
+    fields = _param_names(request, FIELDS_PARAM)
+    exclude = _param_names(request, EXCLUDE_PARAM)
+    if fields is None and exclude is None:
+        return None
+
+    errors = {}
+    for param, names in ((FIELDS_PARAM, fields), (EXCLUDE_PARAM, exclude)):
+        unknown = [name for name in names or () if name not in available]
+        if unknown:
+            errors[param] = f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}"
+    if errors:
+        raise ValidationError(errors)
+
+    kept = [
+        name for name in available
+        if (fields is None or name in fields) and (exclude is None or name not in exclude)
+    ]
+    if not kept:
+        raise ValidationError({FIELDS_PARAM: "At least one field must be selected."})
+    return kept
+
+
+def _columns(model, attrs):
+    """
+    (column path, forward relations to join) read by a field with source
+    ``attrs``, or None when the source isn't a plain chain of model fields.
+    """
+    if not attrs:
+        return None
+    joins = []
+    for i, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.many_to_many:
+            return None
+        if i < len(attrs) - 1:
+            if not (field.many_to_one or field.one_to_one):
+                return None
+            joins.append("__".join(attrs[: i + 1]))
+            model = field.related_model
+    return "__".join(attrs), joins
+
+
+def restrict_queryset(queryset, sources, extra=()):
+    """
+    ``queryset`` loading only the columns (and joins) behind ``sources``;
+    unchanged when any source can't be mapped to model fields.
+    """
+    columns = [queryset.model._meta.pk.name, *extra]
+    joins = []
+    for attrs in sources:
+        resolved = _columns(queryset.model, attrs)
+        if resolved is None:
+            return queryset
+        column, relations = resolved
+        columns.append(column)
+        joins.extend(relation for relation in relations if relation not in joins)
+    # A deferred foreign key can't be traversed by select_related()
+    columns.extend(joins)
+    queryset = queryset.select_related(None)
+    if joins:
+        # select_related() without arguments would follow every foreign key
+        queryset = queryset.select_related(*joins)
+    return queryset.only(*dict.fromkeys(columns))
+
+
+class SparseFieldsetMixin:
+    """
+    ``?fields=`` / ``?exclude=`` for the actions in ``sparse_actions``.
+    Place it before ValuesListMixin so the fast path sees the selection.
+    """
+
+    sparse_actions = ("list", "retrieve", "batch")
+
+    def sparse_fields(self):
+        """Selected field names for this request, or None for the full serializer"""
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = None
+            if self.action in self.sparse_actions:
+                available = readable_fields(self.get_serializer_class())
+                self._sparse_fields = selected_fields(self.request, list(available))
+        return self._sparse_fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.sparse_fields()
+        if fields is not None:
+            target = getattr(serializer, "child", serializer)
+            for name in list(target.fields):
+                if name not in fields:
+                    target.fields.pop(name)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.sparse_fields()
+        if fields is None:
+            return queryset
+        available = readable_fields(self.get_serializer_class())
+        ordering = []
+        if self.action == "list":
+            # Keyset pagination reads its ordering fields from every page row
+            ordering = [field.lstrip("-") for field in getattr(self.paginator, "ordering", ())]
+        return restrict_queryset(queryset, [available[name] for name in fields], extra=ordering)
+
+    def get_values_serializer(self):
+        values_serializer = super().get_values_serializer()
+        fields = self.sparse_fields()
+        if values_serializer is None or fields is None:
+            return values_serializer
+        return values_serializer.subset(fields)
@@ -0,0 +1,163 @@
+"""
+Image derivatives for user, album and song images.
+
+List pages shouldn't download full-size uploads, so every uploaded image
+gets fixed-size variants: ``thumb`` and ``medium``, each as JPEG and WebP.
+Variants are stored next to the originals under content-hashed names
+(``derived/ab/<sha256 prefix>-thumb.webp``). Re-processing the same bytes,
+or two rows sharing one upload, reuses the files already stored. The row's
+``image_variants`` maps each variant to its file name, plus the
+``source`` name the variants were made from; an image that couldn't be
+processed records only its ``source``, so it isn't retried on every save.
+
+After an upload commits, ``image_pipeline`` reads the original and writes
+the variants on a background thread. Decoding and resizing run in a
+process pool, so the GIL is never held on the request path. Rows saved
+without signals (imports, generate_catalog) are covered by ``manage.py
+generate_image_derivatives``.
+"""
+
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import Album, Song, User
+from .workers import MediaWorkers
+
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels; images are only ever scaled down
+DERIVATIVE_SIZES = {"thumb": 160, "medium": 640}
+DERIVATIVE_FORMATS = {
+    "jpg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+VARIANTS = [f"{size}.{ext}" for size in DERIVATIVE_SIZES for ext in DERIVATIVE_FORMATS]
+DERIVATIVE_DIR = "derived"
+SOURCE_KEY = "source"
+IMAGE_MODELS = {"users": User, "albums": Album, "songs": Song}
+
+IMAGE_FORMAT_PARAM = "image_format"
+DEFAULT_IMAGE_FORMAT = "webp"
+
+
+def variant_key(size, image_format):
+    return f"{size}.{image_format}"
+
+
+def requested_format(request):
+    """Derivative format asked for with ?image_format=jpeg|webp (WebP by default)"""
+    params = getattr(request, "query_params", None) or getattr(request, "GET", {})
+    value = params.get(IMAGE_FORMAT_PARAM, DEFAULT_IMAGE_FORMAT).lower()
+    return "jpg" if value in ("jpg", "jpeg") else DEFAULT_IMAGE_FORMAT
+
+
+def render_derivatives(data):
+    """
+    {variant: encoded bytes} for the image in ``data``. Pure Pillow, so it
+    can run in a worker process.
+    """
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (max(DERIVATIVE_SIZES.values()),) * 2)  # Cheap JPEG downscale on decode
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        for size, edge in DERIVATIVE_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            for ext, (image_format, options) in DERIVATIVE_FORMATS.items():
+                output = resized
+                if image_format == "JPEG" and has_alpha:
+                    output = Image.new("RGB", resized.size, (255, 255, 255))
+                    output.paste(resized, mask=resized.getchannel("A"))
+                buffer = io.BytesIO()
+                output.save(buffer, image_format, **options)
+                rendered[variant_key(size, ext)] = buffer.getvalue()
+    return rendered
+
+
+def derivative_names(digest):
+    """Content-addressed storage names of every variant"""
+    return {variant: f"{DERIVATIVE_DIR}/{digest[:2]}/{digest}-{variant}" for variant in VARIANTS}
+
+
+def image_storage(model):
+    return model._meta.get_field("image_url").storage
+
+
+def build_variants(storage, name, render=render_derivatives):
+    """
+    ``image_variants`` for the image stored as ``name``. Variants already in
+    storage (same content hash) are reused instead of rendered again.
+    """
+    with storage.open(name, "rb") as source:
+        data = source.read()
+    names = derivative_names(hashlib.sha256(data).hexdigest()[:32])
+    missing = [variant for variant, path in names.items() if not storage.exists(path)]
+    if missing:
+        rendered = render(data)
+        for variant in missing:
+            names[variant] = storage.save(names[variant], ContentFile(rendered[variant]))
+    return {SOURCE_KEY: name, **names}
+
+
+def missing_variants(storage, variants):
+    """Derivatives named in ``variants`` that are no longer in storage"""
+    return [path for key, path in variants.items() if key != SOURCE_KEY and not storage.exists(path)]
+
+
+class ImagePipeline:
+    """Derivative generation on MediaWorkers pools (inline with ``workers=0``)"""
+
+    def __init__(self, workers=2):
+        self.pool = MediaWorkers(workers, "image-pipeline")
+
+    def build(self, model, name):
+        """``image_variants`` for ``name``, or None when the image can't be processed"""
+        try:
+            return build_variants(
+                image_storage(model), name, lambda data: self.pool.compute(render_derivatives, data)
+            )
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Missing files and undecodable uploads (UnidentifiedImageError is an OSError)
+            logger.warning("Could not generate derivatives of %s", name, exc_info=True)
+            return None
+
+    def process(self, model, pk, name):
+        """
+        Build the variants of row ``pk`` and record them (or the failed
+        attempt) unless its image changed meanwhile
+        """
+        variants = self.build(model, name)
+        recorded = self._record(model, pk, name, variants)
+        if recorded and variants and missing_variants(image_storage(model), variants):
+            # media_cleanup removed a shared derivative between build() reusing
+            # it and the update. The row references it now, so a rebuilt file stays.
+            variants = self.build(model, name)
+            self._record(model, pk, name, variants)
+        return variants
+
+    def _record(self, model, pk, name, variants):
+        return model.objects.filter(pk=pk, image_url=name).update(
+            image_variants=variants if variants is not None else {SOURCE_KEY: name}
+        )
+
+    def submit(self, model, pk, name):
+        """Queue process(); call once the row is committed"""
+        return self.pool.submit(self.process, model, pk, name)
+
+    def map(self, model, names):
+        """build() for many images in parallel; results in the order of ``names``"""
+        return self.pool.map(lambda name: self.build(model, name), names)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+image_pipeline = ImagePipeline(workers=getattr(settings, "IMAGE_WORKERS", 2))
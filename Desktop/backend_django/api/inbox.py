@@ -0,0 +1,120 @@
+"""
+Maintenance of the Conversation (inbox) summary table.
+
+Every message touches two rows: the sender's view of the conversation and
+the receiver's, whose unread count goes up. Reads and deletes recompute the
+affected row from the (sender, receiver, id) message index.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+from .models import Conversation, Message
+
+
+def record_message(message):
+    """Update both participants' inbox rows for a newly created message"""
+    sender_id, receiver_id = message.sender_id, message.receiver_id
+    with transaction.atomic():
+        Conversation.objects.bulk_create(
+            [
+                Conversation(user_id=sender_id, peer_id=receiver_id),
+                Conversation(user_id=receiver_id, peer_id=sender_id),
+            ],
+            ignore_conflicts=True,
+        )
+        # Messages can commit out of id order: never replace a newer latest message
+        latest = {"last_message": message, "last_message_at": message.created_at}
+        newer = Q(last_message__isnull=True) | Q(last_message_id__lt=message.id)
+        Conversation.objects.filter(newer, user_id=sender_id, peer_id=receiver_id).update(**latest)
+        if receiver_id != sender_id:
+            received = Conversation.objects.filter(user_id=receiver_id, peer_id=sender_id)
+            unread = F("unread_count") + 1
+            received.filter(newer).update(unread_count=unread, **latest) or received.update(
+                unread_count=unread
+            )
+
+
+def mark_read(user, peer, up_to=None):
+    """
+    Mark messages from ``peer`` to ``user`` as read (up to message id
+    ``up_to`` when given) and return the number of messages marked.
+    """
+    unread = Message.objects.filter(sender=peer, receiver=user, read_at__isnull=True)
+    if up_to is not None:
+        unread = unread.filter(id__lte=up_to)
+    with transaction.atomic():
+        marked = unread.update(read_at=timezone.now())
+        if marked:
+            refresh_conversation(user.id, peer.id)
+    return marked
+
+
+def refresh_conversation(user_id, peer_id):
+    """Recompute one inbox row from the messages table (deletes it when empty)"""
+    between = Message.objects.filter(
+        Q(sender_id=user_id, receiver_id=peer_id) | Q(sender_id=peer_id, receiver_id=user_id)
+    )
+    latest = between.order_by("-id").first()
+    if latest is None:
+        Conversation.objects.filter(user_id=user_id, peer_id=peer_id).delete()
+        return
+
+    unread = Message.objects.filter(
+        sender_id=peer_id, receiver_id=user_id, read_at__isnull=True
+    ).count()
+    Conversation.objects.update_or_create(
+        user_id=user_id,
+        peer_id=peer_id,
+        defaults={
+            "last_message": latest,
+            "last_message_at": latest.created_at,
+            "unread_count": unread,
+        },
+    )
+
+
+def rebuild_conversations(batch_size=1000):
+    """Rebuild the whole inbox table from messages with aggregate queries"""
+    summaries = {}
+    pairs = (
+        Message.objects.order_by()
+        .values("sender_id", "receiver_id")
+        .annotate(
+            last_id=Max("id"),
+            unread=Count("id", filter=Q(read_at__isnull=True)),
+        )
+    )
+    for pair in pairs.iterator():
+        sender_id, receiver_id = pair["sender_id"], pair["receiver_id"]
+        for user_id, peer_id in ((sender_id, receiver_id), (receiver_id, sender_id)):
+            summary = summaries.setdefault((user_id, peer_id), {"last_id": 0, "unread": 0})
+            summary["last_id"] = max(summary["last_id"], pair["last_id"])
+        # Unread messages count against the receiver only
+        summaries[(receiver_id, sender_id)]["unread"] += pair["unread"]
+
+    # Look the latest messages up batch_size ids at a time (bounded IN lists)
+    last_ids = sorted({summary["last_id"] for summary in summaries.values()})
+    created_at = {}
+    for start in range(0, len(last_ids), batch_size):
+        created_at.update(
+            Message.objects.filter(id__in=last_ids[start:start + batch_size]).values_list("id", "created_at")
+        )
+
+    with transaction.atomic():
+        Conversation.objects.all().delete()
+        Conversation.objects.bulk_create(
+            [
+                Conversation(
+                    user_id=user_id,
+                    peer_id=peer_id,
+                    last_message_id=summary["last_id"],
+                    last_message_at=created_at[summary["last_id"]],
+                    unread_count=summary["unread"],
+                )
+                for (user_id, peer_id), summary in summaries.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(summaries)
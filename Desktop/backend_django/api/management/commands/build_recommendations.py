@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api.recommendations import build_neighbors, sync_interactions
+
+
+class Command(BaseCommand):
+    help = 'Builds item-item song similarities used by the made-for-you endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rebuild from the whole play history instead of only new plays',
+        )
+        parser.add_argument('--top-k', type=int, default=20, help='Neighbours stored per song')
+        parser.add_argument('--block-size', type=int, default=512, help='Songs per similarity block')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        touched = sync_interactions(full=options['full'])
+        self.stdout.write(f'Folded new plays for {len(touched)} songs')
+
+        if options['full']:
+            song_ids = None
+        elif touched:
+            song_ids = touched
+        else:
+            self.stdout.write(self.style.SUCCESS('No new plays, recommendations are up to date'))
+            return
+
+        built = build_neighbors(
+            song_ids, top_k=options['top_k'], block_size=options['block_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt neighbours for {built} songs in {time.perf_counter() - start:.1f}s'
+            )
+        )
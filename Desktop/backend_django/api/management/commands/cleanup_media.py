@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.cleanup import MediaCleanupWorker
+from api.models import MediaCleanup
+
+
+class Command(BaseCommand):
+    help = 'Removes the files of deleted songs, albums and users still queued for cleanup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Files checked per reference query')
+        parser.add_argument(
+            '--retry', action='store_true',
+            help='Also retry entries that already failed the maximum number of times',
+        )
+
+    def handle(self, *args, **options):
+        worker = MediaCleanupWorker(interval=0, batch_size=options['batch_size'])
+        if options['retry']:
+            MediaCleanup.objects.filter(attempts__gte=worker.max_attempts).update(attempts=0)
+        removed, failed = worker.drain()
+        self.stdout.write(self.style.SUCCESS(
+            f'{removed} files removed, {failed} failed, {MediaCleanup.objects.count()} still queued'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# (index name, table, column); CONCURRENTLY keeps the tables writable
+TRIGRAM_INDEXES = [
+    ('songs_title_trgm', 'songs', 'title'),
+    ('songs_artist_trgm', 'songs', 'artist'),
+    ('albums_title_trgm', 'albums', 'title'),
+    ('albums_artist_trgm', 'albums', 'artist'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Installs pg_trgm and the trigram GIN indexes used for fuzzy matches '
+        'in /api/search/ (PostgreSQL only; safe to re-run)'
+    )
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Trigram search indexes require PostgreSQL')
+
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for name, table, column in TRIGRAM_INDEXES:
+                self.stdout.write(f'Creating {name}...')
+                cursor.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                    f'ON {table} USING gin ({column} gin_trgm_ops)'
+                )
+
+        self.stdout.write(self.style.SUCCESS('Search indexes are in place'))
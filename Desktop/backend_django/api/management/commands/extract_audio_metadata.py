@@ -0,0 +1,86 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from api.audio import AudioPipeline
+from api.models import Song, SongWaveform
+
+
+class Command(BaseCommand):
+    help = (
+        'Reads duration/bitrate/codec and computes waveform peaks for songs uploaded '
+        'before extraction existed (or written without signals), in parallel worker processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Audio worker processes (0 = run in this process)',
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='Songs per database batch')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Re-analyze every song and overwrite duration/bitrate/codec read at upload time',
+        )
+
+    def handle(self, *args, **options):
+        songs = Song.objects.exclude(audio_url='').exclude(audio_url__isnull=True)
+        if not options['force']:
+            songs = songs.annotate(waveform_source=F('waveform__source')).filter(
+                Q(waveform_source__isnull=True)
+                | ~Q(waveform_source=F('audio_url'))
+                | Q(bitrate__isnull=True)
+            )
+        rows = songs.order_by('pk').values_list('pk', 'audio_url', 'bitrate')
+
+        pipeline = AudioPipeline(workers=options['workers'])
+        try:
+            self.backfill(rows, pipeline, options['batch_size'], options['force'])
+        finally:
+            pipeline.shutdown()
+
+    def backfill(self, rows, pipeline, batch_size, force):
+        start = time.perf_counter()
+        analyzed = failed = 0
+        batch = []
+
+        def flush():
+            nonlocal analyzed, failed
+            results = pipeline.map([name for _, name, _ in batch])
+            songs, waveforms = [], []
+            for (pk, name, bitrate), result in zip(batch, results):
+                if result is None:
+                    continue
+                if force or bitrate is None:
+                    songs.append(Song(
+                        pk=pk, duration=result['duration'],
+                        bitrate=result['bitrate'], codec=result['codec'],
+                    ))
+                waveforms.append(SongWaveform(song_id=pk, peaks=result['peaks'], source=name))
+            # One UPDATE (and one catalog version bump) and one upsert per batch
+            with transaction.atomic():
+                Song.objects.bulk_update(songs, ['duration', 'bitrate', 'codec'])
+                SongWaveform.objects.bulk_create(
+                    waveforms, update_conflicts=True, unique_fields=['song'],
+                    update_fields=['peaks', 'source', 'updated_at'],
+                )
+            analyzed += len(waveforms)
+            failed += len(batch) - len(waveforms)
+            batch.clear()
+
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+                self.stdout.write(f'  {analyzed} analyzed, {failed} failed')
+        if batch:
+            flush()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{analyzed} songs analyzed, {failed} failed in {elapsed:.1f}s '
+            f'({analyzed / elapsed if elapsed else 0:,.1f} songs/s)'
+        ))
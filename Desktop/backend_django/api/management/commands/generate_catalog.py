@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from api.inbox import rebuild_conversations
+from api.models import Album, Artist, Message, Song
+from api.stats import reconcile_stats
+from api.synthetic import USER_PASSWORD, default_workers, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a deterministic synthetic catalog (artists, albums, songs, '
+        'users and message threads with skewed popularity) into an empty '
+        'catalog, for load testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--songs', type=int, default=1000000)
+        parser.add_argument('--albums', type=int, default=50000)
+        parser.add_argument('--artists', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--messages', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--workers', type=int,
+            help='Writer processes (default: CPU count on PostgreSQL, 1 elsewhere)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per COPY/transaction')
+
+    def handle(self, *args, **options):
+        if options['artists'] < 1:
+            raise CommandError('--artists must be at least 1')
+        for model in (Song, Album, Artist, Message):
+            if model.objects.exists():
+                raise CommandError(
+                    f'{model._meta.db_table} is not empty; generate into a fresh database'
+                )
+
+        workers = options['workers'] or default_workers()
+        self.stdout.write(f'Seed {options["seed"]}, {workers} worker(s)')
+        start = time.perf_counter()
+        reported = {}
+
+        def progress(table, done, total):
+            # Report roughly every 10% per table
+            step = max(total // 10, 1)
+            if done == total or done // step > reported.get(table, 0):
+                reported[table] = done // step
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'  {table}: {done}/{total} ({elapsed:.1f}s)')
+
+        counts = generate(
+            songs=options['songs'],
+            albums=options['albums'],
+            artists=options['artists'],
+            users=options['users'],
+            messages=options['messages'],
+            seed=options['seed'],
+            workers=workers,
+            chunk_size=options['chunk_size'],
+            progress=progress,
+        )
+
+        self.stdout.write('Rebuilding inbox and stats...')
+        rebuild_conversations()
+        reconcile_stats()
+
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s): '
+            + ', '.join(f'{count} {table}' for table, count in counts.items())
+            + f'. Synthetic users sign in with password "{USER_PASSWORD}".'
+        ))
@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.images import IMAGE_MODELS, SOURCE_KEY, ImagePipeline, image_storage, missing_variants
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates thumbnail/medium/WebP derivatives for images uploaded before the '
+        'pipeline existed (or written without signals), in parallel worker processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models', default=','.join(IMAGE_MODELS),
+            help=f'Comma-separated subset of {",".join(IMAGE_MODELS)}',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Image worker processes (0 = run in this process)',
+        )
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows per database batch')
+        parser.add_argument(
+            '--force', action='store_true',
+            help=(
+                'Also re-check rows whose variants, or a failed attempt, are recorded '
+                '(missing files are regenerated)'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        labels = [label.strip() for label in options['models'].split(',') if label.strip()]
+        unknown = set(labels) - set(IMAGE_MODELS)
+        if unknown:
+            raise CommandError(f'Unknown models: {", ".join(sorted(unknown))}')
+
+        pipeline = ImagePipeline(workers=options['workers'])
+        try:
+            for label in labels:
+                self.backfill(label, pipeline, options['batch_size'], options['force'])
+        finally:
+            pipeline.shutdown()
+
+    def backfill(self, label, pipeline, batch_size, force):
+        model = IMAGE_MODELS[label]
+        rows = (
+            model.objects.exclude(image_url='').exclude(image_url__isnull=True)
+            .order_by('pk').values_list('pk', 'image_url', 'image_variants')
+        )
+        start = time.perf_counter()
+        generated = failed = 0
+        batch = []
+
+        def flush():
+            nonlocal generated, failed
+            results = pipeline.map(model, [name for _, name in batch])
+            # Failures record just the source, so saves don't retry them
+            updates = [
+                model(pk=pk, image_variants=variants if variants is not None else {SOURCE_KEY: name})
+                for (pk, name), variants in zip(batch, results)
+            ]
+            # One UPDATE (and one catalog version bump) per batch
+            with transaction.atomic():
+                model.objects.bulk_update(updates, ['image_variants'])
+            # Shared derivatives media cleanup removed before the update are rebuilt
+            storage = image_storage(model)
+            for (pk, name), variants in zip(batch, results):
+                if variants and missing_variants(storage, variants):
+                    pipeline.process(model, pk, name)
+            processed = sum(variants is not None for variants in results)
+            generated += processed
+            failed += len(batch) - processed
+            batch.clear()
+
+        for pk, name, variants in rows.iterator(chunk_size=batch_size):
+            if force or variants.get(SOURCE_KEY) != name:
+                batch.append((pk, name))
+            if len(batch) >= batch_size:
+                flush()
+                self.stdout.write(f'  {label}: {generated} generated, {failed} failed')
+        if batch:
+            flush()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {generated} images processed, {failed} failed in {elapsed:.1f}s '
+            f'({generated / elapsed if elapsed else 0:,.1f} images/s)'
+        ))
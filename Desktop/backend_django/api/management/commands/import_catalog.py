@@ -0,0 +1,238 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import Album, Artist, Song
+
+# Natural keys: albums are (title, artist), songs are (title, artist, album).
+# Artists are matched through Artist rows so lookups use the artist_ref index.
+KINDS = {'songs': Song, 'albums': Album}
+# Columns an import writes, by model
+FIELDS = {
+    Song: ['title', 'artist', 'duration', 'image_url', 'audio_url', 'artist_ref', 'album_id'],
+    Album: ['title', 'artist', 'release_year', 'image_url', 'artist_ref'],
+}
+MAX_REPORTED_ERRORS = 20
+
+
+def read_rows(path, file_format):
+    """Yield (row, error) pairs from a CSV or JSONL file without loading it"""
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if file_format == 'csv':
+            for row in csv.DictReader(stream):
+                yield row, None
+        else:
+            for line in stream:
+                if line.strip():
+                    try:
+                        yield json.loads(line), None
+                    except ValueError as exc:
+                        yield None, f'invalid JSON ({exc})'
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def clean_song(row):
+    title = (row.get('title') or '').strip()
+    artist = (row.get('artist') or '').strip()
+    if not title or not artist:
+        raise ValueError('title and artist are required')
+    return {
+        'title': title,
+        'artist': artist,
+        'duration': int(row.get('duration') or 0),
+        'image_url': row.get('image_url') or '',
+        'audio_url': row.get('audio_url') or '',
+        'album_title': (row.get('album_title') or '').strip(),
+        # A blank album artist means the song's own, like a missing one
+        'album_artist': (row.get('album_artist') or '').strip() or artist,
+    }
+
+
+def clean_album(row):
+    title = (row.get('title') or '').strip()
+    artist = (row.get('artist') or '').strip()
+    if not title or not artist:
+        raise ValueError('title and artist are required')
+    return {
+        'title': title,
+        'artist': artist,
+        'release_year': int(row.get('release_year') or 0),
+        'image_url': row.get('image_url') or '',
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams songs or albums from a CSV/JSONL file into the catalog with '
+        'chunked bulk writes, optionally upserting by natural key '
+        '(albums: title + artist, songs: title + artist + album). '
+        'Running workers pick the new rows up for featured/search within '
+        'their refresh interval.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file ("-" reads JSONL from stdin)')
+        parser.add_argument('--kind', choices=sorted(KINDS), required=True)
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Defaults to the file extension (.csv, otherwise JSONL)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per transaction')
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='Update rows whose natural key already exists instead of adding duplicates',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        kind = options['kind']
+        clean = clean_song if kind == 'songs' else clean_album
+        write = self.write_songs if kind == 'songs' else self.write_albums
+
+        self.totals = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        self.errors = 0
+        start = time.perf_counter()
+        rows = self.clean_rows(read_rows(path, file_format), clean)
+
+        for number, chunk in enumerate(chunked(rows, options['chunk_size']), start=1):
+            with transaction.atomic():
+                write(chunk, options['upsert'])
+            if number % 10 == 0:
+                self.report(start)
+        self.report(start)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {kind}: {self.totals["created"]} created, {self.totals["updated"]} updated, '
+            f'{self.totals["unchanged"]} unchanged, {self.totals["skipped"]} skipped, '
+            f'{self.errors} invalid rows'
+        ))
+
+    def clean_rows(self, rows, clean):
+        for line, (row, error) in enumerate(rows, start=1):
+            try:
+                if error:
+                    raise ValueError(error)
+                yield clean(row)
+            except (TypeError, ValueError, AttributeError) as exc:
+                self.errors += 1
+                if self.errors <= MAX_REPORTED_ERRORS:
+                    self.stderr.write(f'Row {line}: {exc}')
+
+    def report(self, start):
+        done = sum(self.totals.values())
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{done} rows in {elapsed:.1f}s ({done / elapsed if elapsed else 0:,.0f} rows/s)'
+        )
+
+    @staticmethod
+    def _dedupe(rows, key):
+        """Last row wins when a chunk repeats a natural key"""
+        return list({key(row): row for row in rows}.values())
+
+    def write_albums(self, rows, upsert):
+        artists = Artist.objects.resolve(row['artist'] for row in rows)
+        for row in rows:
+            row['artist_ref'] = artists[Artist.normalize_name(row['artist'])]
+
+        existing = {}
+        if upsert:
+            rows = self._dedupe(rows, lambda row: (row['title'], row['artist_ref'].pk))
+            matches = Album.objects.filter(
+                artist_ref__in=[row['artist_ref'] for row in rows],
+                title__in=[row['title'] for row in rows],
+            )
+            existing = {(album.title, album.artist_ref_id): album for album in matches}
+
+        self._upsert(Album, rows, existing, lambda row: (row['title'], row['artist_ref'].pk))
+
+    def write_songs(self, rows, upsert):
+        artists = Artist.objects.resolve(
+            name for row in rows for name in (row['artist'], row['album_artist'])
+        )
+        for row in rows:
+            row['artist_ref'] = artists[Artist.normalize_name(row['artist'])]
+
+        # Resolve the chunk's albums with one query
+        album_keys = {
+            (row['album_title'], artists[Artist.normalize_name(row['album_artist'])].pk)
+            for row in rows if row['album_title']
+        }
+        albums = {}
+        if album_keys:
+            candidates = Album.objects.filter(
+                artist_ref__in={artist_id for _, artist_id in album_keys},
+                title__in={title for title, _ in album_keys},
+            ).only('id', 'title', 'artist_ref')
+            albums = {(album.title, album.artist_ref_id): album.pk for album in candidates}
+
+        resolved = []
+        for row in rows:
+            row['album_id'] = None
+            if row['album_title']:
+                key = (row['album_title'], artists[Artist.normalize_name(row['album_artist'])].pk)
+                if key not in albums:
+                    self.totals['skipped'] += 1
+                    continue
+                row['album_id'] = albums[key]
+            resolved.append(row)
+
+        def key(row):
+            return row['title'], row['artist_ref'].pk, row['album_id']
+
+        existing = {}
+        if upsert:
+            resolved = self._dedupe(resolved, key)
+            matches = Song.objects.filter(
+                artist_ref__in=[row['artist_ref'] for row in resolved],
+                title__in=[row['title'] for row in resolved],
+            )
+            existing = {(song.title, song.artist_ref_id, song.album_id): song for song in matches}
+
+        self._upsert(Song, resolved, existing, key)
+
+    def _upsert(self, model, rows, existing, key):
+        fields = FIELDS[model]
+        # Natural-key columns never change on update; bulk_update skips auto_now
+        update_fields = [
+            field for field in fields if field not in ('title', 'artist', 'artist_ref', 'album_id')
+        ] + ['updated_at']
+        now = timezone.now()
+        to_create, to_update = [], []
+        for row in rows:
+            values = {field: row[field] for field in fields}
+            current = existing.get(key(row))
+            if current is None:
+                to_create.append(model(**values))
+            elif all(getattr(current, field) == values[field] for field in update_fields[:-1]):
+                # Re-importing an unchanged row costs no write
+                self.totals['unchanged'] += 1
+            else:
+                for field in update_fields[:-1]:
+                    setattr(current, field, values[field])
+                current.updated_at = now
+                to_update.append(current)
+
+        if to_create:
+            model.objects.bulk_create(to_create)
+        if to_update:
+            model.objects.bulk_update(to_update, update_fields)
+        self.totals['created'] += len(to_create)
+        self.totals['updated'] += len(to_update)
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from api.models import Album, Artist, Song
+from api.stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Links songs and albums to deduplicated Artist rows built from their '
+        'artist names. Run once after upgrading an existing database; new '
+        'writes are linked automatically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows linked per transaction (by id range)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model in (Song, Album):
+            max_id = model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+            linked = 0
+            for start in range(0, max_id + 1, batch_size):
+                rows = list(
+                    model.objects.filter(
+                        id__gte=start, id__lt=start + batch_size, artist_ref__isnull=True
+                    ).only('id', 'artist')
+                )
+                if not rows:
+                    continue
+                with transaction.atomic():
+                    artists = Artist.objects.resolve(row.artist for row in rows)
+                    for row in rows:
+                        row.artist_ref = artists.get(Artist.normalize_name(row.artist or ''))
+                    # bulk_update also recounts the artists involved
+                    model.objects.bulk_update(rows, ['artist_ref'], batch_size=1000)
+                linked += len(rows)
+                self.stdout.write(f'{model._meta.verbose_name_plural}: linked {linked}')
+
+        Artist.objects.recount()
+        unused, _ = Artist.objects.filter(songs_count=0, albums_count=0).delete()
+        reconcile_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'{Artist.objects.count()} artists; removed {unused} without songs or albums'
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.inbox import rebuild_conversations
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the inbox (conversation summary) table from all messages'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_conversations()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} conversations'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from api.models import Album
+
+
+class Command(BaseCommand):
+    help = 'Detects and repairs drift in the denormalized Album.songs_count column'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report drifted albums, do not repair them',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Albums checked per statement (by id range)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Album.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+        drifted_total = 0
+        for start in range(0, max_id + 1, batch_size):
+            albums = Album.objects.filter(id__gte=start, id__lt=start + batch_size)
+            with transaction.atomic():
+                drifted = list(
+                    albums.with_songs_count_drift().values_list(
+                        'id', 'songs_count', 'actual_songs_count'
+                    )
+                )
+                if not drifted:
+                    continue
+                drifted_total += len(drifted)
+                for album_id, stored, actual in drifted[:20]:
+                    self.stdout.write(f'  Album {album_id}: stored {stored}, actual {actual}')
+                if not options['dry_run']:
+                    Album.objects.filter(id__in=[row[0] for row in drifted]).recount_songs()
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Found {drifted_total} drifted albums'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {drifted_total} drifted albums'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from api.stats import STATS_FIELDS, get_platform_stats, reconcile_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the platform stats row behind /api/stats/ from the tables'
+
+    def handle(self, *args, **kwargs):
+        stats = reconcile_stats()
+        for field in STATS_FIELDS:
+            self.stdout.write(f'{field}: {getattr(stats, field)}')
+        totals = get_platform_stats()
+        if totals['total_artists'] != stats.total_artists:
+            self.stdout.write(f'total_artists (approximate): {totals["total_artists"]}')
+        self.stdout.write(self.style.SUCCESS('Platform stats reconciled'))
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Runs the pub/sub relay that fans messages out across worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address', default=None,
+            help='host:port to listen on (defaults to PUBSUB_RELAY_ADDRESS)',
+        )
+
+    def handle(self, *args, **options):
+        host, _, port = (options['address'] or settings.PUBSUB_RELAY_ADDRESS).rpartition(':')
+        self.subscribers = set()
+        self.stdout.write(f'Pub/sub relay listening on {host or "127.0.0.1"}:{port}')
+        asyncio.run(self.serve(host or '127.0.0.1', int(port)))
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        try:
+            async for line in reader:
+                try:
+                    envelope = json.loads(line)
+                except ValueError:
+                    continue
+                if envelope.get('subscribe'):
+                    self.subscribers.add(writer)
+                    continue
+                for subscriber in list(self.subscribers):
+                    subscriber.write(line)
+                await asyncio.gather(
+                    *(self.drain(subscriber) for subscriber in list(self.subscribers))
+                )
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    async def drain(self, writer):
+        try:
+            await writer.drain()
+        except ConnectionError:
+            self.subscribers.discard(writer)
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from api.models import Album
+
+
+class Command(BaseCommand):
+    help = (
+        'Pre-populates the catalog response cache (song/album lists, album '
+        'details, featured). Only useful with a shared cache backend '
+        '(CATALOG_CACHE_URL); a local-memory cache lives in this process only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default=settings.ALLOWED_HOSTS[0],
+            help='Host the API is served under (part of the cache key via pagination links)',
+        )
+        parser.add_argument('--secure', action='store_true', help='Warm https:// URLs')
+        parser.add_argument('--pages', type=int, default=5, help='List pages to warm per endpoint')
+        parser.add_argument('--albums', type=int, default=100, help='Most recent album details to warm')
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=options['host'])
+        secure = options['secure']
+        warmed = 0
+
+        def fetch(url):
+            nonlocal warmed
+            response = client.get(url, secure=secure)
+            if response.status_code == 200:
+                warmed += response.get('X-Cache') == 'MISS'
+                return response.json()
+            self.stderr.write(f'{url}: HTTP {response.status_code}')
+            return None
+
+        for name in ('song-list', 'album-list', 'artist-list'):
+            url = reverse(name)
+            for _ in range(options['pages']):
+                page = fetch(url)
+                if not page or not page.get('next'):
+                    break
+                url = page['next']
+
+        album_ids = Album.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        for album_id in album_ids[: options['albums']]:
+            fetch(reverse('album-detail', args=[album_id]))
+
+        fetch(reverse('song-featured'))
+
+        self.stdout.write(self.style.SUCCESS(f'Warmed {warmed} cache entries'))
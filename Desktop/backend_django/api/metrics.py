@@ -0,0 +1,154 @@
+"""
+Per-view request metrics for this worker process (see api/middleware.py).
+
+Every thread records into its own shard, so the request path never takes
+a lock; GET /api/metrics/ merges the shards when scraped and renders them
+in the Prometheus text exposition format. Shards of threads that have
+exited are folded into one, so servers that recycle threads don't
+accumulate them. Series are labelled with the
+URL name and DRF action of the view that handled the request.
+"""
+
+import threading
+from bisect import bisect_left
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Series:
+    __slots__ = ("buckets", "count", "seconds", "queries", "sql_seconds", "statuses")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statuses = {}
+
+
+class RequestMetrics:
+    """Latency histograms, status counts and SQL totals per (view, action, method)"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []  # (owning thread, shard)
+        self._retired = {}  # Totals of the shards of exited threads
+        self._lock = threading.Lock()  # Only taken when a thread records for the first time
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_exited()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_exited(self):
+        """Fold the shards of exited threads into ``_retired``; call with the lock held"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._shards = live
+
+    def observe(self, view, action, method, status, seconds, queries, sql_seconds):
+        shard = self._shard()
+        key = (view, action, method)
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = _Series()
+        series.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series.count += 1
+        series.seconds += seconds
+        series.queries += queries
+        series.sql_seconds += sql_seconds
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        """Merge every thread's shard into {key: _Series}"""
+        merged = {}
+        with self._lock:
+            self._retire_exited()
+            _merge(merged, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _merge(merged, shard)
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._retired.clear()
+            for _, shard in self._shards:
+                shard.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("http_requests_total", "counter", "Requests handled, by response status.")
+        for (view, action, method), series in snapshot:
+            for status, count in sorted(series.statuses.items()):
+                labels = _labels(view=view, action=action, method=method, status=status)
+                lines.append(f"http_requests_total{{{labels}}} {count}")
+
+        family("http_request_duration_seconds", "histogram", "Request latency.")
+        for (view, action, method), series in snapshot:
+            labels = _labels(view=view, action=action, method=method)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), series.buckets):
+                cumulative += count
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {series.seconds:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {series.count}")
+
+        family("db_queries_total", "counter", "SQL statements executed while handling requests.")
+        for (view, action, method), series in snapshot:
+            labels = _labels(view=view, action=action, method=method)
+            lines.append(f"db_queries_total{{{labels}}} {series.queries}")
+
+        family("db_query_duration_seconds_total", "counter", "Time spent executing SQL.")
+        for (view, action, method), series in snapshot:
+            labels = _labels(view=view, action=action, method=method)
+            lines.append(f"db_query_duration_seconds_total{{{labels}}} {series.sql_seconds:.6f}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _merge(totals, shard):
+    """Add the series of ``shard`` into ``totals``"""
+    # dict.copy() is atomic under the GIL, so owners can keep writing
+    for key, series in shard.copy().items():
+        total = totals.get(key)
+        if total is None:
+            total = totals[key] = _Series()
+        total.buckets = [a + b for a, b in zip(total.buckets, series.buckets)]
+        total.count += series.count
+        total.seconds += series.seconds
+        total.queries += series.queries
+        total.sql_seconds += series.sql_seconds
+        for status, count in series.statuses.copy().items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+
+
+def _labels(**labels):
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return ",".join(f'{name}="{value}"' for name, value in escaped)
+
+
+request_metrics = RequestMetrics()
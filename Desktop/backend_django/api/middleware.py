@@ -0,0 +1,93 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import request_metrics
+
+
+logger = logging.getLogger(__name__)
+
+# SQL statements kept per request for the slow-request log
+MAX_LOGGED_QUERIES = 50
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook counting (and optionally keeping) SQL"""
+
+    def __init__(self, keep_sql=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if self.statements is not None and len(self.statements) < MAX_LOGGED_QUERIES:
+                self.statements.append((elapsed, sql))
+
+
+def view_labels(request):
+    """(URL name, DRF action or view function name) of the resolved view"""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched", ""
+    actions = getattr(match.func, "actions", None)
+    if actions:
+        action = actions.get(request.method.lower(), "")
+    else:
+        action = getattr(match.func, "__name__", "")
+    return match.view_name or match.route, action
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, status, SQL count and SQL time of every request into
+    api.metrics.request_metrics, and logs requests slower than
+    SLOW_REQUEST_MS together with their SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "METRICS_ENABLED", True)
+        self.slow_seconds = getattr(settings, "SLOW_REQUEST_MS", 0) / 1000
+        # connections.all() re-reads DATABASES on every call
+        self.aliases = list(connections)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(keep_sql=bool(self.slow_seconds))
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in self.aliases:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view, action = view_labels(request)
+        request_metrics.observe(
+            view, action, request.method, response.status_code,
+            elapsed, recorder.count, recorder.seconds,
+        )
+        if self.slow_seconds and elapsed >= self.slow_seconds:
+            self.log_slow(request, response, elapsed, recorder)
+        return response
+
+    def log_slow(self, request, response, elapsed, recorder):
+        statements = "".join(
+            f"\n  {seconds * 1000:.1f}ms {sql}" for seconds, sql in recorder.statements
+        )
+        logger.warning(
+            "Slow request: %s %s -> %s in %.0fms, %d queries (%.0fms SQL)%s",
+            request.method, request.get_full_path(), response.status_code,
+            elapsed * 1000, recorder.count, recorder.seconds * 1000, statements,
+        )
@@ -1,13 +1,36 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 if TYPE_CHECKING:
     from django.db.models.manager import RelatedManager
 
 
+def on_commit_once(func, using=None):
+    """
+    transaction.on_commit(func), but ``func`` runs once per commit however
+    many times it was scheduled. Every call registers a callback sharing one
+    token, so callbacks dropped by a (savepoint) rollback don't matter.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    pending = connection.__dict__.setdefault("_on_commit_once", {})
+    token = pending.setdefault(func, [False])
+
+    def run():
+        if token[0]:
+            return
+        token[0] = True
+        if pending.get(func) is token:
+            del pending[func]
+        func()
+
+    transaction.on_commit(run, using=using)
+
+
 class User(AbstractUser):
     """
     Custom User model extending Django's AbstractUser.
@@ -17,6 +40,8 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     full_name = models.CharField(max_length=255)
     image_url = models.ImageField(upload_to="user_images/", blank=True, null=True)
+    # Thumbnail/medium/WebP file names by variant, filled by api/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # Override username to make email the primary identifier
     USERNAME_FIELD = "email"
@@ -25,12 +50,315 @@ class User(AbstractUser):
     class Meta:
         db_table = "users"
         ordering = ["-date_joined"]
+        indexes = [
+            models.Index(fields=["-date_joined", "-id"]),
+        ]
 
     def __str__(self):
         return self.email
 
 
-class Album(models.Model):
+class CatalogVersion(models.Model):
+    """
+    Single-row counter bumped (once per transaction) whenever songs or
+    albums are created, changed or deleted. Used as a cheap validator for
+    conditional GETs on the catalog endpoints.
+    """
+
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "catalog_version"
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
+
+    @classmethod
+    def current(cls):
+        """Return (version, updated_at) with one primary-key lookup"""
+        row = cls.objects.filter(pk=1).values_list("version", "updated_at").first()
+        if row is None:
+            row = (0, cls.objects.get_or_create(pk=1)[0].updated_at)
+        return row
+
+    @classmethod
+    def bump(cls):
+        updated = cls.objects.filter(pk=1).update(
+            version=models.F("version") + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(pk=1, defaults={"version": 1})
+
+    @classmethod
+    def mark_changed(cls, using=None):
+        """Schedule a single bump when the current transaction commits"""
+        on_commit_once(cls.bump, using=using)
+
+
+class PlatformStats(models.Model):
+    """
+    Single-row running totals behind GET /api/stats/. Kept up to date by
+    signals and periodically reconciled against the tables (api/stats.py);
+    bulk writes, which bypass signals, clear ``reconciled_at`` to force it.
+    """
+
+    total_songs = models.BigIntegerField(default=0)
+    total_albums = models.BigIntegerField(default=0)
+    total_users = models.BigIntegerField(default=0)
+    total_artists = models.BigIntegerField(default=0)
+    # HyperLogLog registers, used when STATS_ARTIST_COUNT = "approximate"
+    artist_sketch = models.BinaryField(null=True, editable=False)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "platform_stats"
+        verbose_name_plural = "Platform stats"
+
+    def __str__(self):
+        return "Platform stats"
+
+    @classmethod
+    def increment(cls, field, delta=1, using=None):
+        cls.objects.using(using).filter(pk=1).update(**{field: models.F(field) + delta})
+
+    @classmethod
+    def invalidate(cls, using=None):
+        """Make the next read reconcile the totals"""
+        cls.objects.using(using).filter(pk=1).update(reconciled_at=None)
+
+
+class CountersMixin:
+    """
+    For models with counters maintained by F() updates (``COUNTERS``): a
+    plain save() of an existing row leaves them out of the UPDATE, so the
+    possibly stale values loaded with the instance can't overwrite
+    increments made since. Pass ``update_fields`` to write them explicitly.
+    """
+
+    COUNTERS = ()
+
+    def save(self, *args, **kwargs):
+        full_update = not (args or self._state.adding or kwargs.get("force_insert"))
+        if full_update and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
+
+class CatalogQuerySet(models.QuerySet):
+    """Bumps the catalog version for bulk writes, which bypass model signals"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        CatalogVersion.mark_changed(self.db)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        CatalogVersion.mark_changed(self.db)
+        return updated
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        CatalogVersion.mark_changed(self.db)
+        return updated
+
+    update.alters_data = True
+
+    def delete(self):
+        deleted = super().delete()
+        CatalogVersion.mark_changed(self.db)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class ArtistQuerySet(CatalogQuerySet):
+    def resolve(self, names):
+        """
+        Map artist names to Artist rows, creating the missing ones.
+        Keys are normalized names (see Artist.normalize_name).
+        """
+        names = {Artist.normalize_name(name) for name in names if name and name.strip()}
+        artists = self.in_bulk(names, field_name="name")
+        missing = names - artists.keys()
+        if missing:
+            self.bulk_create([Artist(name=name) for name in missing], ignore_conflicts=True)
+            artists.update(self.in_bulk(missing, field_name="name"))
+        return artists
+
+    def recount(self):
+        """Recompute songs_count / albums_count of these artists in one UPDATE"""
+
+        def total(model):
+            actual = (
+                model.objects.filter(artist_ref=models.OuterRef("pk"))
+                .order_by()
+                .values("artist_ref")
+                .annotate(total=models.Count("id"))
+                .values("total")
+            )
+            return Coalesce(models.Subquery(actual), 0)
+
+        return self.update(songs_count=total(Song), albums_count=total(Album))
+
+
+class Artist(CountersMixin, models.Model):
+    """
+    Performing artist credited on songs and albums.
+
+    Songs and albums link to it through ``artist_ref``, which is kept in
+    step with their ``artist`` name by the signals in api/signals.py and by
+    ArtistCreditQuerySet for bulk writes. The name column stays the write
+    interface (admin forms, API payloads) until clients send artist ids.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    # Maintained by Song/Album signals and bulk operations
+    songs_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Number of Songs"
+    )
+    albums_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Number of Albums"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ArtistQuerySet.as_manager()
+
+    COUNTERS = ("songs_count", "albums_count")
+
+    class Meta:
+        db_table = "artists"
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        # resolve() looks names up normalized: a stored "Queen " would be duplicated
+        self.name = self.normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def normalize_name(name):
+        """Collapse whitespace so "Queen " and "Queen" are one artist"""
+        return " ".join(name.split())
+
+
+class ArtistCreditQuerySet(CatalogQuerySet):
+    """
+    Bulk writes on songs and albums bypass the model signals, so link them
+    to Artist rows here, recount the artists involved and flag the platform
+    stats for reconciliation.
+    """
+
+    def _artist_ids(self):
+        return set(
+            self.exclude(artist_ref__isnull=True)
+            .order_by()
+            .values_list("artist_ref_id", flat=True)
+            .distinct()
+        )
+
+    @staticmethod
+    def _link_artists(objs):
+        artists = Artist.objects.resolve(obj.artist for obj in objs)
+        for obj in objs:
+            obj.artist_ref = artists.get(Artist.normalize_name(obj.artist or ""))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            self._link_artists([obj for obj in objs if obj.artist_ref_id is None])
+            created = super().bulk_create(objs, *args, **kwargs)
+            Artist.objects.filter(id__in={obj.artist_ref_id for obj in created}).recount()
+        PlatformStats.invalidate(self.db)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if not {"artist", "artist_ref", "artist_ref_id"} & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        fields = list(fields)
+        with transaction.atomic(using=self.db):
+            if "artist" in fields:
+                self._link_artists(objs)
+                fields.append("artist_ref")
+            artist_ids = self.filter(pk__in=[obj.pk for obj in objs])._artist_ids()
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            artist_ids |= {obj.artist_ref_id for obj in objs}
+            Artist.objects.filter(id__in=artist_ids).recount()
+        PlatformStats.invalidate(self.db)
+        return updated
+
+    def update(self, **kwargs):
+        if not {"artist", "artist_ref", "artist_ref_id"} & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            if "artist" in kwargs:
+                kwargs["artist_ref"] = Artist.objects.resolve([kwargs["artist"]]).get(
+                    Artist.normalize_name(kwargs["artist"] or "")
+                )
+            artist_ids = self._artist_ids()
+            updated = super().update(**kwargs)
+            new_artist = kwargs.get("artist_ref", kwargs.get("artist_ref_id"))
+            artist_ids.add(getattr(new_artist, "pk", new_artist))
+            Artist.objects.filter(id__in=artist_ids).recount()
+        PlatformStats.invalidate(self.db)
+        return updated
+
+    update.alters_data = True
+
+    def delete(self):
+        # Imported here: api.stats imports the models
+        from .stats import release_artists
+
+        with transaction.atomic(using=self.db):
+            artist_ids = self._artist_ids()
+            if self.model is Album:
+                artist_ids |= Song.objects.using(self.db).filter(album__in=self)._artist_ids()
+            deleted = super().delete()
+            # The per-row delete signals leave the artist counts and total to this
+            Artist.objects.using(self.db).filter(id__in=artist_ids).recount()
+            release_artists(artist_ids, self.db)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class AlbumQuerySet(ArtistCreditQuerySet):
+    def recount_songs(self):
+        """Recompute the denormalized songs_count of these albums in one UPDATE"""
+        actual = (
+            Song.objects.filter(album=models.OuterRef("pk"))
+            .order_by()
+            .values("album")
+            .annotate(total=models.Count("id"))
+            .values("total")
+        )
+        return self.update(songs_count=Coalesce(models.Subquery(actual), 0))
+
+    def with_songs_count_drift(self):
+        """Albums whose stored songs_count disagrees with their songs"""
+        actual = (
+            Song.objects.filter(album=models.OuterRef("pk"))
+            .order_by()
+            .values("album")
+            .annotate(total=models.Count("id"))
+            .values("total")
+        )
+        return self.annotate(
+            actual_songs_count=Coalesce(models.Subquery(actual), 0)
+        ).exclude(songs_count=models.F("actual_songs_count"))
+
+
+class Album(CountersMixin, models.Model):
     """
     Album model representing music albums/collections.
     Contains array of Song references (one-to-many relationship).
@@ -38,23 +366,92 @@ class Album(models.Model):
 
     title = models.CharField(max_length=255)
     artist = models.CharField(max_length=255)
+    artist_ref = models.ForeignKey(
+        Artist, on_delete=models.PROTECT, related_name="albums", null=True, blank=True, editable=False
+    )
     image_url = models.ImageField(upload_to="album_images/")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     release_year = models.IntegerField()
+    # Maintained by Song signals and SongQuerySet bulk operations
+    songs_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Number of Songs"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AlbumQuerySet.as_manager()
+
+    COUNTERS = ("songs_count",)
+
     class Meta:
         db_table = "albums"
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["artist"]),
-            models.Index(fields=["-created_at"]),
+            models.Index(fields=["-created_at", "-id"]),
         ]
 
     def __str__(self):
         return f"{self.title} by {self.artist}"
 
 
+class SongQuerySet(ArtistCreditQuerySet):
+    """
+    Keeps Album.songs_count correct for bulk operations, which bypass the
+    per-instance signals in api/signals.py.
+    """
+
+    def _album_ids(self):
+        return set(
+            self.exclude(album__isnull=True).order_by().values_list("album_id", flat=True).distinct()
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            album_ids = {obj.album_id for obj in created if obj.album_id is not None}
+            if album_ids:
+                Album.objects.filter(id__in=album_ids).recount_songs()
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if "album" not in fields and "album_id" not in fields:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            album_ids = self.filter(pk__in=[obj.pk for obj in objs])._album_ids()
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            album_ids |= {obj.album_id for obj in objs if obj.album_id is not None}
+            if album_ids:
+                Album.objects.filter(id__in=album_ids).recount_songs()
+        return updated
+
+    def update(self, **kwargs):
+        if "album" not in kwargs and "album_id" not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            album_ids = self._album_ids()
+            updated = super().update(**kwargs)
+            new_album = kwargs.get("album", kwargs.get("album_id"))
+            if new_album is not None:
+                album_ids.add(getattr(new_album, "pk", new_album))
+            if album_ids:
+                Album.objects.filter(id__in=album_ids).recount_songs()
+        return updated
+
+    update.alters_data = True
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            album_ids = self._album_ids()
+            deleted = super().delete()
+            if album_ids:
+                Album.objects.filter(id__in=album_ids).recount_songs()
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Song(models.Model):
     """
     Song model representing individual songs.
@@ -64,22 +461,38 @@ class Song(models.Model):
 
     title = models.CharField(max_length=255)
     artist = models.CharField(max_length=255)
+    artist_ref = models.ForeignKey(
+        Artist, on_delete=models.PROTECT, related_name="songs", null=True, blank=True, editable=False
+    )
     image_url = models.ImageField(upload_to="song_images/")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     audio_url = models.FileField(upload_to="songs/")
-    duration = models.IntegerField(help_text="Duration in seconds")
+    duration = models.IntegerField(
+        default=0, blank=True, help_text="Duration in seconds (read from the uploaded file)"
+    )
+    # Filled from the audio headers on upload (see api/audio.py)
+    bitrate = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, help_text="Average bitrate in kbps"
+    )
+    codec = models.CharField(max_length=32, blank=True, editable=False)
     album = models.ForeignKey(
         Album, on_delete=models.CASCADE, related_name="songs", null=True, blank=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SongQuerySet.as_manager()
+
     class Meta:
         db_table = "songs"
+        # Related managers (album.songs.add/remove) must go through SongQuerySet
+        base_manager_name = "objects"
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["artist"]),
-            models.Index(fields=["-created_at"]),
+            models.Index(fields=["-created_at", "-id"]),
             models.Index(fields=["album"]),
+            # Artist pages list an artist's songs newest first
+            models.Index(fields=["artist_ref", "-created_at", "-id"]),
         ]
 
     def __str__(self):
@@ -99,6 +512,7 @@ class Message(models.Model):
         User, on_delete=models.CASCADE, related_name="received_messages"
     )
     content = models.TextField()
+    read_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -106,11 +520,203 @@ class Message(models.Model):
         db_table = "messages"
         ordering = ["created_at"]
         indexes = [
-            models.Index(fields=["sender", "receiver"]),
-            models.Index(fields=["created_at"]),
+            # Serves both directions of a conversation, ordered by id
+            models.Index(fields=["sender", "receiver", "id"]),
+            models.Index(fields=["created_at", "id"]),
         ]
 
     def __str__(self) -> str:
         sender_email = self.sender.email if self.sender else "unknown"
         receiver_email = self.receiver.email if self.receiver else "unknown"
         return f"Message from {sender_email} to {receiver_email}"
+
+
+class Conversation(models.Model):
+    """
+    Inbox entry: one row per (user, peer) pair summarising their messages.
+    Maintained by the Message signals (see api/inbox.py) so the inbox is a
+    single indexed read instead of a scan over messages.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations")
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message = models.ForeignKey(
+        Message, on_delete=models.SET_NULL, related_name="+", null=True, blank=True
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "conversations"
+        ordering = ["-last_message_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "peer"], name="unique_conversation"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-last_message_at", "-id"]),
+        ]
+
+    def __str__(self):
+        return f"Conversation of user {self.user_id} with user {self.peer_id}"
+
+
+class PlayEvent(models.Model):
+    """
+    A single song play. Rows are written in batches by the play buffer
+    (see api/plays.py), never one insert per request.
+    """
+
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="plays")
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name="plays", null=True, blank=True
+    )
+    played_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "play_events"
+        ordering = ["-played_at"]
+        indexes = [
+            models.Index(fields=["played_at"]),
+            models.Index(fields=["user", "played_at"]),
+        ]
+
+    def __str__(self):
+        return f"Play of song {self.song_id} at {self.played_at}"
+
+
+class SongPlayStats(models.Model):
+    """
+    Per-song play counters maintained incrementally on each buffer flush.
+
+    ``trending_score`` is the log of the sum of exponentially decayed play
+    weights, expressed relative to a fixed epoch so that adding plays never
+    requires rescoring other songs: ordering by it is ordering by decayed
+    popularity "now".
+    """
+
+    song = models.OneToOneField(
+        Song, on_delete=models.CASCADE, primary_key=True, related_name="play_stats"
+    )
+    play_count = models.BigIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+    last_played_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "song_play_stats"
+        indexes = [
+            models.Index(fields=["-trending_score"]),
+        ]
+
+    def __str__(self):
+        return f"Stats for song {self.song_id}: {self.play_count} plays"
+
+
+class SongWaveform(models.Model):
+    """
+    Downsampled peak envelope of a song's audio for the player scrubber:
+    ``peaks`` packs one unsigned byte (0-127) per point. ``source`` is the
+    audio file it was computed from, so a replaced upload is recomputed.
+    """
+
+    song = models.OneToOneField(
+        Song, on_delete=models.CASCADE, primary_key=True, related_name="waveform"
+    )
+    peaks = models.BinaryField()
+    source = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "song_waveforms"
+
+    def __str__(self):
+        return f"Waveform of song {self.song_id} ({len(self.peaks)} points)"
+
+
+class UserSongInteraction(models.Model):
+    """
+    Aggregated listening history (one row per user and song), folded in
+    from PlayEvent by the recommendation builder.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="song_interactions")
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="user_interactions")
+    play_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "user_song_interactions"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "song"], name="unique_user_song_interaction"),
+        ]
+        indexes = [
+            models.Index(fields=["song"]),
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id} played song {self.song_id} {self.play_count} times"
+
+
+class SongNeighbor(models.Model):
+    """
+    Precomputed item-item similarity: the top-K most similar songs per song.
+    """
+
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="neighbors")
+    neighbor = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="neighbor_of")
+    score = models.FloatField()
+
+    class Meta:
+        db_table = "song_neighbors"
+        constraints = [
+            models.UniqueConstraint(fields=["song", "neighbor"], name="unique_song_neighbor"),
+        ]
+        indexes = [
+            models.Index(fields=["song", "-score"]),
+        ]
+
+    def __str__(self):
+        return f"Song {self.song_id} ~ song {self.neighbor_id} ({self.score:.3f})"
+
+
+class RecommendationState(models.Model):
+    """
+    Single-row high-water mark of the recommendation builder: the last
+    PlayEvent id folded into UserSongInteraction. Only advanced in the
+    transaction that folds the plays, so a failed run is simply redone.
+    """
+
+    last_event_id = models.BigIntegerField(default=0)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "recommendation_state"
+
+    def __str__(self):
+        return f"Recommendations synced up to play {self.last_event_id}"
+
+    @classmethod
+    def lock(cls):
+        """The state row, locked until the end of the current transaction"""
+        cls.objects.get_or_create(pk=1)
+        return cls.objects.select_for_update().get(pk=1)
+
+
+class MediaCleanup(models.Model):
+    """
+    Queue of uploaded files left behind by deleted rows: one entry per
+    deleted row, or per batch of a set-based delete, listing storage names.
+    Entries are added in the deleting transaction, so a rolled back delete
+    leaves none, and drained after commit by the media cleanup worker (see
+    api/cleanup.py).
+    """
+
+    paths = models.JSONField(default=list)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "media_cleanup_queue"
+        ordering = ["id"]
+        verbose_name_plural = "Media cleanup queue"
+
+    def __str__(self):
+        return f"Remove {len(self.paths)} files"
@@ -0,0 +1,158 @@
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on a composite key such as (-created_at, -id).
+
+    DRF's CursorPagination positions on the first ordering field only and
+    falls back to OFFSET to step over ties. Here the cursor carries every
+    ordering value, so each page is a single index range scan with no
+    COUNT(*) and no OFFSET, and rows inserted concurrently never shift pages.
+    The ordering must end in a unique field (the id tie-breaker). NULLs of
+    nullable fields sort after every value, in both directions.
+    A malformed cursor is a 400.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        # (name, descending, nulls_last) in the direction of this page
+        model = queryset.model
+        ordering = [
+            (
+                field.lstrip("-"),
+                field.startswith("-") != reverse,
+                model._meta.get_field(field.lstrip("-")).null and not reverse,
+            )
+            for field in self.ordering
+        ]
+        queryset = queryset.order_by(*(self._order_by(model, *field) for field in ordering))
+        if self.cursor is not None:
+            values = self._decode_position(model, self.cursor.position)
+            queryset = queryset.filter(self._after(ordering, values))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=False, position=self._get_position(self.page[-1]))
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=True, position=self._get_position(self.page[0]))
+        return self.encode_cursor(cursor)
+
+    def decode_cursor(self, request):
+        try:
+            return super().decode_cursor(request)
+        except NotFound:
+            raise ParseError(self.invalid_cursor_message)
+
+    @staticmethod
+    def _order_by(model, name, descending, nulls_last):
+        if not model._meta.get_field(name).null:
+            return f"-{name}" if descending else name
+        expression = F(name)
+        nulls = {"nulls_last": True} if nulls_last else {"nulls_first": True}
+        return expression.desc(**nulls) if descending else expression.asc(**nulls)
+
+    def _get_position(self, instance):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip("-")
+            # Pages may hold model instances or .values() rows
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return json.dumps(values, separators=(",", ":"))
+
+    def _decode_position(self, model, position):
+        try:
+            raw_values = json.loads(position)
+            if len(raw_values) != len(self.ordering):
+                raise ValueError(position)
+            return [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, raw_values)
+            ]
+        except Exception:
+            raise ParseError(self.invalid_cursor_message)
+
+    @staticmethod
+    def _equal(name, value):
+        return Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+
+    @staticmethod
+    def _beyond(name, descending, nulls_last, value, inclusive=False):
+        """Rows past ``value`` (or at it, when ``inclusive``) on one field"""
+        if value is None:
+            # NULLs are one block: last (nothing beyond) or first (every value)
+            if nulls_last:
+                return Q(**{f"{name}__isnull": True}) if inclusive else Q(pk__in=[])
+            return Q() if inclusive else Q(**{f"{name}__isnull": False})
+        lookup = ("lt" if descending else "gt") + ("e" if inclusive else "")
+        condition = Q(**{f"{name}__{lookup}": value})
+        return condition | Q(**{f"{name}__isnull": True}) if nulls_last else condition
+
+    @classmethod
+    def _after(cls, ordering, values):
+        """
+        Rows strictly after ``values`` in ``ordering`` (lexicographic).
+        The leading bound on the first field lets the database use the
+        composite index as a range scan.
+        """
+        clauses = []
+        for i, field in enumerate(ordering):
+            equal = [cls._equal(name, value) for (name, _, _), value in zip(ordering[:i], values[:i])]
+            clauses.append(reduce(and_, equal, cls._beyond(*field, values[i])))
+
+        bound = cls._beyond(*ordering[0], values[0], inclusive=True)
+        return bound & reduce(or_, clauses)
+
+
+class UserPagination(KeysetPagination):
+    ordering = ("-date_joined", "-id")
+
+
+class ArtistPagination(KeysetPagination):
+    ordering = ("name", "id")
+
+
+class MessagePagination(KeysetPagination):
+    ordering = ("created_at", "id")
+
+
+class ConversationPagination(KeysetPagination):
+    ordering = ("-last_message_at", "-id")
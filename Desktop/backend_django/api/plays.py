@@ -0,0 +1,246 @@
+"""
+Buffered play-event ingestion and incrementally maintained trending scores.
+
+``POST /api/songs/{id}/play/`` only appends to an in-process buffer; a
+background thread flushes the buffer in batches with one bulk insert of
+``PlayEvent`` rows and one set-based UPDATE of ``SongPlayStats`` per chunk
+of songs, so request handling never writes to the database.
+"""
+
+import atexit
+import logging
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .models import PlayEvent, Song, SongPlayStats, User
+
+
+logger = logging.getLogger(__name__)
+
+# Scores are log(sum(exp(rate * (played_at - epoch)))), so a play's weight
+# never changes once recorded and older plays decay relative to newer ones.
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+EMPTY_SCORE = -1e9
+STATS_UPDATE_CHUNK = 500
+
+
+def decay_rate():
+    return math.log(2) / (getattr(settings, "TRENDING_HALF_LIFE_HOURS", 24) * 3600)
+
+
+def play_weight(played_at):
+    """Log-space weight of a single play"""
+    return decay_rate() * (played_at - TRENDING_EPOCH).total_seconds()
+
+
+def logsumexp(values):
+    peak = max(values)
+    return peak + math.log(sum(math.exp(v - peak) for v in values))
+
+
+def _stats_update_sql(connection, rows):
+    """
+    One UPDATE adding ``rows`` of (song_id, plays, score, last_played) to
+    SongPlayStats. Written as SQL because building the equivalent CASE
+    expressions through the ORM cost more than executing them; the score
+    is log(exp(score) + exp(new)), computed so it cannot overflow.
+    last_played_at only moves forward, so a requeued batch or buffers
+    flushing out of order can't set it back.
+    """
+    greatest, least = ("MAX", "MIN") if connection.vendor == "sqlite" else ("GREATEST", "LEAST")
+    table = connection.ops.quote_name(SongPlayStats._meta.db_table)
+    high = f"{greatest}({table}.trending_score, batch.score)"
+    low = f"{least}({table}.trending_score, batch.score)"
+    latest = f"{greatest}({table}.last_played_at, batch.last_played)"  # NULL on SQLite when never played
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+    sql = (
+        f"WITH batch (song_id, plays, score, last_played) AS (VALUES {values}) "
+        f"UPDATE {table} SET "
+        f"play_count = {table}.play_count + batch.plays, "
+        f"trending_score = {high} + LN(1.0 + EXP({greatest}({low} - {high}, -50.0))), "
+        f"last_played_at = COALESCE({latest}, batch.last_played) "
+        f"FROM batch WHERE {table}.song_id = batch.song_id"
+    )
+    return sql, [value for row in rows for value in row]
+
+
+def update_play_stats(events):
+    """
+    Fold (song_id, user_id, played_at) events into SongPlayStats with one
+    UPDATE per chunk of songs instead of one per play.
+    """
+    grouped = defaultdict(list)
+    for song_id, _user_id, played_at in events:
+        grouped[song_id].append(played_at)
+
+    SongPlayStats.objects.bulk_create(
+        [SongPlayStats(song_id=song_id, trending_score=EMPTY_SCORE) for song_id in grouped],
+        ignore_conflicts=True,
+    )
+
+    connection = connections[SongPlayStats.objects.db]
+    rows = [
+        (
+            song_id,
+            len(times),
+            logsumexp([play_weight(t) for t in times]),
+            connection.ops.adapt_datetimefield_value(max(times)),
+        )
+        for song_id, times in grouped.items()
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), STATS_UPDATE_CHUNK):
+            cursor.execute(*_stats_update_sql(connection, rows[start:start + STATS_UPDATE_CHUNK]))
+
+
+class PlayEventBuffer:
+    """
+    Thread-safe in-process buffer of play events.
+
+    With a ``flush_interval`` a daemon thread flushes every interval (or as
+    soon as ``max_size`` events are pending); without one, the recording
+    thread flushes synchronously once ``max_size`` is reached. A failed
+    flush puts its events back, so a database outage delays plays instead of
+    losing them. At most ``max_pending`` events are held: once the buffer is
+    full the recording thread flushes itself, and record() returns False if
+    that doesn't make room either.
+    """
+
+    def __init__(self, max_size=1000, flush_interval=1.0, max_pending=100000):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, max_size)
+        self._events = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._atexit_registered = False
+
+    def __len__(self):
+        return len(self._events)
+
+    def _append(self, event):
+        with self._lock:
+            if len(self._events) >= self.max_pending:
+                return None
+            self._events.append(event)
+            return len(self._events)
+
+    def record(self, song_id, user_id=None, played_at=None):
+        """Buffer a play; False when the buffer is full and can't be flushed"""
+        event = (song_id, user_id, played_at or timezone.now())
+        pending = self._append(event)
+        if pending is None:
+            # Back-pressure: write the backlog on this thread before accepting more
+            try:
+                self.flush()
+            except DatabaseError:
+                return False
+            pending = self._append(event)
+            if pending is None:
+                return False
+
+        if self.flush_interval:
+            self._ensure_worker()
+            if pending >= self.max_size:
+                self._wakeup.set()
+        elif pending >= self.max_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """
+        Write all pending events; returns the number of plays stored. On a
+        database error the events go back into the buffer and the error is
+        raised.
+        """
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+
+        try:
+            try:
+                return self._write(events)
+            except IntegrityError:
+                # A song or user was deleted after the existence check: check again
+                return self._write(events)
+        except DatabaseError:
+            self._requeue(events)
+            raise
+
+    def _requeue(self, events):
+        with self._lock:
+            self._events[:0] = events
+            overflow = len(self._events) - self.max_pending
+            if overflow > 0:
+                del self._events[:overflow]
+        if overflow > 0:
+            logger.error("Play buffer full, dropped the %d oldest plays", overflow)
+
+    def _write(self, events):
+        # Plays for songs or users deleted (or never existing) are dropped
+        # here, so the endpoint itself doesn't need to look them up.
+        existing_songs = set(
+            Song.objects.filter(id__in={event[0] for event in events}).values_list("id", flat=True)
+        )
+        user_ids = {event[1] for event in events if event[1] is not None}
+        existing_users = set(
+            User.objects.filter(id__in=user_ids).values_list("id", flat=True)
+        ) if user_ids else set()
+        events = [
+            event for event in events
+            if event[0] in existing_songs and (event[1] is None or event[1] in existing_users)
+        ]
+        if not events:
+            return 0
+
+        with transaction.atomic():
+            PlayEvent.objects.bulk_create(
+                [
+                    PlayEvent(song_id=song_id, user_id=user_id, played_at=played_at)
+                    for song_id, user_id, played_at in events
+                ],
+                batch_size=1000,
+            )
+            update_play_stats(events)
+        return len(events)
+
+    def _ensure_worker(self):
+        # is_alive() is False in a forked child, so each worker process
+        # starts its own flusher thread on first use.
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(
+                target=self._run, name="play-event-flusher", daemon=True
+            )
+            self._worker.start()
+            if not self._atexit_registered:
+                atexit.register(self.flush)
+                self._atexit_registered = True
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush play events")
+
+
+play_buffer = PlayEventBuffer(
+    max_size=getattr(settings, "PLAY_BUFFER_SIZE", 1000),
+    flush_interval=getattr(settings, "PLAY_FLUSH_INTERVAL", 1.0),
+    max_pending=getattr(settings, "PLAY_BUFFER_MAX_PENDING", 100000),
+)
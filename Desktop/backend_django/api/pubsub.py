@@ -0,0 +1,169 @@
+"""
+Publish/subscribe layer used to push new messages to connected clients.
+
+Publishers are ordinary (sync) Django code; subscribers are coroutines
+running on the ASGI event loop, so delivery hops threads with
+``call_soon_threadsafe`` and never touches the database.
+
+Backends:
+    InMemoryBroker - fan-out within a single process
+    RelayBroker    - fan-out across processes through the relay started by
+                     ``manage.py run_pubsub_relay`` (a local stand-in for an
+                     external broker such as Redis)
+"""
+
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBE_LINE = b'{"subscribe": true}\n'
+
+
+class Subscription:
+    """A channel subscription bound to the event loop that created it"""
+
+    def __init__(self, broker, channel, maxsize=100):
+        self.broker = broker
+        self.channel = channel
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message):
+        """Thread-safe: hand a message to the subscriber's event loop"""
+        try:
+            self._loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Event loop already closed; the subscriber is gone
+            self.close()
+
+    def _put(self, message):
+        if self._queue.full():
+            # Slow consumer: drop the oldest message rather than grow unbounded
+            self._queue.get_nowait()
+        self._queue.put_nowait(message)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """Delivers messages to subscribers in the current process"""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Must be called from a coroutine; returns a Subscription"""
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscriptions.values())
+
+    def publish(self, channel, message):
+        self._dispatch(channel, message)
+
+    def _dispatch(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+
+class RelayBroker(InMemoryBroker):
+    """
+    Publishes through the pub/sub relay so every worker process connected
+    to it (including this one) fans the message out to its own subscribers.
+    The wire format is one JSON object per line: {"channel": ..., "message": ...};
+    a connection that starts with {"subscribe": true} receives every line
+    published to the relay.
+    """
+
+    def __init__(self, address=None):
+        super().__init__()
+        host, _, port = (address or settings.PUBSUB_RELAY_ADDRESS).rpartition(":")
+        self.address = (host or "127.0.0.1", int(port))
+        self._socket = None
+        self._send_lock = threading.Lock()
+        self._reader = None
+
+    def publish(self, channel, message):
+        line = json.dumps({"channel": channel, "message": message}).encode() + b"\n"
+        with self._send_lock:
+            try:
+                self._connection().sendall(line)
+            except OSError:
+                logger.exception("Failed to publish to pub/sub relay at %s:%s", *self.address)
+                self._reset()
+
+    def subscribe(self, channel):
+        self._ensure_reader()
+        return super().subscribe(channel)
+
+    def _connection(self):
+        if self._socket is None:
+            self._socket = socket.create_connection(self.address)
+        return self._socket
+
+    def _reset(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            finally:
+                self._socket = None
+
+    def _ensure_reader(self):
+        if self._reader is None or not self._reader.is_alive():
+            self._reader = threading.Thread(target=self._read_forever, name="pubsub-relay", daemon=True)
+            self._reader.start()
+
+    def _read_forever(self):
+        # A separate connection from the publishing one, so reads never
+        # block publishers; reconnects with a short backoff.
+        while True:
+            try:
+                with socket.create_connection(self.address) as connection:
+                    connection.sendall(SUBSCRIBE_LINE)
+                    for line in connection.makefile("rb"):
+                        try:
+                            envelope = json.loads(line)
+                        except ValueError:
+                            continue
+                        self._dispatch(envelope["channel"], envelope["message"])
+            except OSError:
+                logger.warning("Lost pub/sub relay at %s:%s, reconnecting", *self.address)
+            time.sleep(1)
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+broker = import_string(getattr(settings, "PUBSUB_BACKEND", "api.pubsub.InMemoryBroker"))()
@@ -0,0 +1,79 @@
+"""
+WebSocket push channel for direct messages, served by music_streaming/asgi.py.
+
+    ws://host/ws/messages/?token=<auth token>
+
+After the handshake the server sends {"type": "message", "message": {...}}
+for every message the user sends or receives, using the same payload as
+MessageSerializer. An idle connection is one coroutine and one small queue;
+nothing is read from the database after authentication.
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .authentication import resolve_token
+from .pubsub import broker, user_channel
+
+
+MESSAGES_PATH = "/ws/messages"
+
+
+@sync_to_async
+def authenticate_token(key):
+    close_old_connections()
+    resolved = resolve_token(key)
+    if resolved is None:
+        return None
+    user, _ = resolved
+    return user if user.is_active else None
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI entry point for websocket scopes"""
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+
+    if scope["path"].rstrip("/") != MESSAGES_PATH:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    key = query.get("token", [None])[0]
+    user = await authenticate_token(key) if key else None
+    if user is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    await send({"type": "websocket.accept"})
+    await serve_messages(user.id, receive, send)
+
+
+async def serve_messages(user_id, receive, send):
+    """Forward published messages to an accepted socket until it disconnects"""
+    subscription = broker.subscribe(user_channel(user_id))
+    incoming = asyncio.ensure_future(receive())
+    outgoing = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if incoming in done:
+                if incoming.result()["type"] == "websocket.disconnect":
+                    break
+                # Client frames (e.g. keepalive pings) are ignored
+                incoming = asyncio.ensure_future(receive())
+            if outgoing in done:
+                payload = {"type": "message", "message": outgoing.result()}
+                await send({"type": "websocket.send", "text": json.dumps(payload)})
+                outgoing = asyncio.ensure_future(subscription.get())
+    finally:
+        incoming.cancel()
+        outgoing.cancel()
+        subscription.close()
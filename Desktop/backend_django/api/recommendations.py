@@ -0,0 +1,234 @@
+"""
+Item-item collaborative filtering behind ``GET /api/songs/made-for-you/``.
+
+Offline (``manage.py build_recommendations``):
+    1. New PlayEvent rows are folded into UserSongInteraction, starting
+       after the high-water mark in RecommendationState.
+    2. A sparse user x song matrix of log-scaled play counts is built from
+       UserSongInteraction and cosine similarity between song columns is
+       computed block by block with SciPy.
+    3. The top-K neighbours of each changed song, and of every song sharing
+       a listener with one, are stored in SongNeighbor.
+
+Incremental runs only load the interactions of the listeners of those
+songs, with the column norms of the songs they reach aggregated in SQL, so
+their cost follows the neighbourhood of the new plays rather than the whole
+interaction table.
+
+Online, a user's recommendations are the neighbours of their recently played
+songs, ranked by summed similarity in a single query.
+"""
+
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Ln, Power
+
+from .models import PlayEvent, RecommendationState, Song, SongNeighbor, UserSongInteraction
+
+
+RECENT_PLAYS = 50
+# Ids per ``__in`` lookup while walking the neighbourhood of changed songs
+LOOKUP_CHUNK = 1000
+
+
+def recommend_songs(user, limit):
+    """Return up to ``limit`` songs similar to what ``user`` played recently"""
+    recent = (
+        PlayEvent.objects.filter(user=user).order_by("-played_at").values("song_id")[:RECENT_PLAYS]
+    )
+    return list(
+        Song.objects.filter(neighbor_of__song_id__in=recent)
+        .exclude(id__in=recent)
+        .annotate(recommendation_score=Sum("neighbor_of__score"))
+        .order_by("-recommendation_score")[:limit]
+    )
+
+
+def sync_interactions(full=False, chunk_size=5000):
+    """
+    Fold plays into UserSongInteraction.
+    Incremental runs only read plays after the stored high-water mark;
+    ``full`` rebuilds the table from the whole history. Runs in one
+    transaction that also advances the mark, so concurrent or failed runs
+    never skip or double-count plays.
+    Returns the ids of songs whose interactions changed.
+    """
+    with transaction.atomic():
+        state = RecommendationState.lock()
+        if full:
+            UserSongInteraction.objects.all().delete()
+            since = 0
+        else:
+            since = state.last_event_id
+        until = PlayEvent.objects.aggregate(last=Max("id"))["last"] or since
+
+        new_plays = (
+            PlayEvent.objects.filter(id__gt=since, id__lte=until, user__isnull=False)
+            .order_by()
+            .values("user_id", "song_id")
+            .annotate(plays=Count("id"))
+        )
+
+        touched = set()
+        batch = []
+        for row in new_plays.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                touched |= _merge_interactions(batch)
+                batch = []
+        if batch:
+            touched |= _merge_interactions(batch)
+
+        state.last_event_id = until
+        state.save()
+    return touched
+
+
+def _merge_interactions(rows):
+    existing = {
+        (interaction.user_id, interaction.song_id): interaction
+        for interaction in UserSongInteraction.objects.filter(
+            user_id__in={row["user_id"] for row in rows},
+            song_id__in={row["song_id"] for row in rows},
+        )
+    }
+
+    to_create, to_update = [], []
+    for row in rows:
+        interaction = existing.get((row["user_id"], row["song_id"]))
+        if interaction is None:
+            to_create.append(
+                UserSongInteraction(
+                    user_id=row["user_id"], song_id=row["song_id"], play_count=row["plays"]
+                )
+            )
+        else:
+            interaction.play_count += row["plays"]
+            to_update.append(interaction)
+
+    UserSongInteraction.objects.bulk_create(to_create, batch_size=1000)
+    UserSongInteraction.objects.bulk_update(to_update, ["play_count"], batch_size=1000)
+    return {row["song_id"] for row in rows}
+
+
+def build_neighbors(song_ids=None, top_k=20, block_size=512):
+    """
+    Recompute SongNeighbor rows for ``song_ids`` and every song sharing a
+    listener with one of them, whose similarity to it changed too (all
+    songs when None, which also drops the lists of songs nobody plays).
+    Returns the number of songs whose neighbour lists were written.
+    """
+    # Imported here so web workers serving recommendations don't load SciPy
+    import numpy as np
+    from scipy import sparse
+
+    interactions = UserSongInteraction.objects.order_by()
+    if song_ids is None:
+        rows = [interactions]
+        SongNeighbor.objects.exclude(
+            song_id__in=UserSongInteraction.objects.values("song_id")
+        ).delete()
+    else:
+        # Every listener of a song whose list is rebuilt, so its similarity
+        # to each other song sees all of their common listeners
+        listeners = _related("song_id", song_ids, "user_id")
+        song_ids = _related("user_id", listeners, "song_id")
+        readers = sorted(_related("song_id", song_ids, "user_id"))
+        rows = (
+            interactions.filter(user_id__in=readers[start:start + LOOKUP_CHUNK])
+            for start in range(0, len(readers), LOOKUP_CHUNK)
+        )
+    data = np.fromiter(
+        chain.from_iterable(
+            chain.from_iterable(
+                queryset.values_list("user_id", "song_id", "play_count").iterator(chunk_size=10000)
+                for queryset in rows
+            )
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    if not len(data):
+        return 0
+
+    _, user_index = np.unique(data[:, 0], return_inverse=True)
+    all_song_ids, song_index = np.unique(data[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.log1p(data[:, 2]).astype(np.float32), (user_index, song_index)),
+        shape=(user_index.max() + 1, len(all_song_ids)),
+    )
+
+    # Cosine similarity: normalise song columns, then similarity is X^T X
+    if song_ids is None:
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    else:
+        # Columns of songs outside the targets only hold the loaded listeners
+        norms = np.sqrt(_squared_norms(all_song_ids.tolist()))
+    norms[norms == 0] = 1
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+    by_song = normalized.T.tocsr()
+
+    if song_ids is None:
+        targets = np.arange(len(all_song_ids))
+    else:
+        targets = np.flatnonzero(np.isin(all_song_ids, list(song_ids)))
+
+    for start in range(0, len(targets), block_size):
+        block = targets[start:start + block_size]
+        similarity = (by_song[block] @ normalized).tocsr()
+
+        neighbors = []
+        for row, column in enumerate(block):
+            begin, end = similarity.indptr[row], similarity.indptr[row + 1]
+            columns = similarity.indices[begin:end]
+            scores = similarity.data[begin:end]
+            keep = columns != column
+            columns, scores = columns[keep], scores[keep]
+            if len(scores) > top_k:
+                top = np.argpartition(-scores, top_k)[:top_k]
+                columns, scores = columns[top], scores[top]
+
+            song_id = int(all_song_ids[column])
+            neighbors.extend(
+                SongNeighbor(song_id=song_id, neighbor_id=int(all_song_ids[c]), score=float(s))
+                for c, s in zip(columns, scores)
+            )
+
+        with transaction.atomic():
+            SongNeighbor.objects.filter(song_id__in=all_song_ids[block].tolist()).delete()
+            SongNeighbor.objects.bulk_create(neighbors, batch_size=1000)
+
+    return len(targets)
+
+
+def _related(field, values, column):
+    """Distinct ``column`` values of the interactions whose ``field`` is in ``values``"""
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        found.update(
+            UserSongInteraction.objects.filter(**{f"{field}__in": values[start:start + LOOKUP_CHUNK]})
+            .order_by()
+            .values_list(column, flat=True)
+            .distinct()
+        )
+    return found
+
+
+def _squared_norms(song_ids):
+    """Sum of log1p(play_count)^2 over every listener of each of ``song_ids``"""
+    import numpy as np
+
+    positions = {song_id: index for index, song_id in enumerate(song_ids)}
+    squares = np.zeros(len(song_ids))
+    for start in range(0, len(song_ids), LOOKUP_CHUNK):
+        rows = (
+            UserSongInteraction.objects.filter(song_id__in=song_ids[start:start + LOOKUP_CHUNK])
+            .order_by()
+            .values_list("song_id")
+            .annotate(square=Sum(Power(Ln(F("play_count") + 1.0), 2)))
+        )
+        for song_id, square in rows:
+            squares[positions[song_id]] = square
+    return squares
@@ -0,0 +1,54 @@
+"""
+JSON rendering through orjson when it is installed.
+
+FastJSONRenderer produces the same bytes as DRF's JSONRenderer with the
+default settings (compact, UTF-8, U+2028/2029 escaped): values orjson has no
+native form for - dates, times, Decimals, lazy strings - go through DRF's
+JSONEncoder.default, and anything orjson refuses (non-string keys, huge
+integers) falls back to JSONRenderer.
+
+WaveformRenderer serves packed waveform peaks as raw bytes.
+"""
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not (self.compact and self.strict and not self.ensure_ascii):
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class WaveformRenderer(BaseRenderer):
+    """Packed waveform peaks (api/audio.py) as raw bytes, one per point"""
+
+    media_type = "application/octet-stream"
+    format = "bin"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        # Error responses
+        return JSONRenderer().render(data, renderer_context=renderer_context)
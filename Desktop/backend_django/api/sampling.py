@@ -0,0 +1,183 @@
+"""
+Random song sampling without ORDER BY RANDOM().
+
+The pool keeps every song id in a compact sorted ``array('q')`` (8 bytes
+per song), so drawing k random songs is O(k) followed by a single ``id__in``
+query, regardless of catalog size. Deleted songs go into a small tombstone
+set that draws skip; the array is compacted on reload, or once a quarter of
+it is tombstones.
+"""
+
+import bisect
+import random
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Song
+
+
+POOL_CACHE_KEY = "api:song-pool:ids"
+
+
+class SongSamplingPool:
+    """
+    In-memory pool of song ids used to draw random songs.
+
+    The pool is loaded lazily (from the shared cache when configured,
+    otherwise from the database), kept up to date by the song signals in
+    the current process and fully reloaded after ``ttl`` seconds to pick
+    up changes made by other workers.
+    """
+
+    def __init__(self, cache_alias=None, ttl=300):
+        self.cache_alias = cache_alias
+        self.ttl = ttl
+        self._ids = array("q")  # Sorted, so membership is a binary search
+        self._removed = set()  # Tombstones: discarded ids still in _ids
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids) - len(self._removed)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def _is_stale(self):
+        return self._loaded_at is None or (
+            self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl
+        )
+
+    def _fetch_ids(self):
+        cache = self.cache
+        if cache is not None:
+            data = cache.get(POOL_CACHE_KEY)
+            if data is not None:
+                ids = array("q")
+                ids.frombytes(data)
+                return ids
+
+        ids = array(
+            "q",
+            Song.objects.order_by("id").values_list("id", flat=True).iterator(chunk_size=10000),
+        )
+        if cache is not None:
+            cache.set(POOL_CACHE_KEY, ids.tobytes(), self.ttl)
+        return ids
+
+    def load(self, ids=None):
+        """Replace the pool contents (from ``ids`` or from the backing store)"""
+        if ids is None:
+            ids = self._fetch_ids()
+        else:
+            ids = array("q", ids)
+            if any(ids[i] >= ids[i + 1] for i in range(len(ids) - 1)):
+                ids = array("q", sorted(set(ids)))
+        with self._lock:
+            self._ids = ids
+            self._removed = set()
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a reload on the next draw"""
+        with self._lock:
+            self._loaded_at = None
+        if self.cache is not None:
+            self.cache.delete(POOL_CACHE_KEY)
+
+    def add(self, song_id):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._add(song_id)
+        if self.cache is not None:
+            self.cache.delete(POOL_CACHE_KEY)
+
+    def discard(self, song_id):
+        with self._lock:
+            self._discard(song_id)
+        if self.cache is not None:
+            self.cache.delete(POOL_CACHE_KEY)
+
+    def discard_many(self, song_ids):
+        """discard() for many songs, invalidating the shared cache once"""
+        with self._lock:
+            for song_id in song_ids:
+                self._discard(song_id)
+        if self.cache is not None:
+            self.cache.delete(POOL_CACHE_KEY)
+
+    def _contains(self, song_id):
+        index = bisect.bisect_left(self._ids, song_id)
+        return index < len(self._ids) and self._ids[index] == song_id
+
+    def _add(self, song_id):
+        if song_id in self._removed:
+            self._removed.discard(song_id)
+        elif not self._ids or song_id > self._ids[-1]:
+            self._ids.append(song_id)  # New songs have the highest ids
+        elif not self._contains(song_id):
+            self._ids.insert(bisect.bisect_left(self._ids, song_id), song_id)
+
+    def _discard(self, song_id):
+        if song_id in self._removed or not self._contains(song_id):
+            return
+        self._removed.add(song_id)
+        if len(self._removed) * 4 > len(self._ids):
+            self._compact()
+
+    def _compact(self):
+        removed = self._removed
+        self._ids = array("q", (song_id for song_id in self._ids if song_id not in removed))
+        self._removed = set()
+
+    def draw(self, k):
+        """Return up to k distinct random song ids in O(k)"""
+        if self._is_stale():
+            self.load()
+        with self._lock:
+            ids, removed = self._ids, self._removed
+            k = min(k, len(ids) - len(removed))
+            if k * 4 >= len(ids):
+                # Small pool: sampling the live ids beats redrawing
+                return random.sample([song_id for song_id in ids if song_id not in removed], k)
+            # Tombstones are under a quarter of the array, so redraws stay rare
+            drawn = {}
+            while len(drawn) < k:
+                song_id = ids[random.randrange(len(ids))]
+                if song_id not in removed:
+                    drawn[song_id] = None
+            return list(drawn)
+
+    def sample(self, k, queryset=None):
+        """
+        Return up to k random songs using a single ``id__in`` query.
+        Ids that no longer exist (deleted by another worker) are dropped
+        from the pool and the shortfall is redrawn once.
+        """
+        queryset = queryset if queryset is not None else Song.objects.all()
+        ids = self.draw(k)
+        songs = queryset.in_bulk(ids)
+
+        missing = [song_id for song_id in ids if song_id not in songs]
+        if missing:
+            with self._lock:
+                for song_id in missing:
+                    self._discard(song_id)
+            extra = [song_id for song_id in self.draw(k) if song_id not in songs]
+            songs.update(queryset.in_bulk(extra[: len(missing)]))
+            ids = [song_id for song_id in ids if song_id in songs] + [
+                song_id for song_id in extra if song_id in songs
+            ]
+
+        return [songs[song_id] for song_id in ids[:k]]
+
+
+song_pool = SongSamplingPool(
+    cache_alias=getattr(settings, "SONG_POOL_CACHE_ALIAS", None),
+    ttl=getattr(settings, "SONG_POOL_TTL", 300),
+)
@@ -0,0 +1,444 @@
+"""
+Catalog search with prefix autocomplete.
+
+Songs, albums and artist names are indexed in-process: a sorted vocabulary
+of normalized words, binary-searched for the range of words starting with a
+prefix, and a compact ``array('q')`` posting list of ids per word, kept
+sorted so updates find an id by binary search. A lookup therefore costs
+O(log vocabulary) plus the postings it reads, however large the catalog is.
+
+The index is built on a background thread when first needed; until it is
+ready, searches are answered by the database (pg_trgm, or substring
+matches elsewhere). Candidates are re-checked against the rows loaded for
+the response, so entries made stale by writes in other worker processes
+never show up. The catalog signals patch the index in this process; with
+SEARCH_INDEX_TTL set it is also rebuilt in the background that often, to
+pick up songs written by other processes. On PostgreSQL with the pg_trgm
+extension (``manage.py create_search_indexes``), typo-tolerant trigram
+matches top up short result lists.
+"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.functions import Greatest
+
+from .models import Album, Artist, Song
+
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+KINDS = ("songs", "albums", "artists")
+# Other query words narrow the candidates in memory only when their postings
+# are small enough to put in a set; the rest are checked on the loaded rows.
+INTERSECT_LIMIT = 20000
+CANDIDATE_FACTOR = 4
+TRIGRAM_THRESHOLD = 0.3
+
+
+def tokenize(text):
+    """Lower-cased, accent-stripped words of ``text``"""
+    text = text or ""
+    if text.isascii():
+        return WORD_RE.findall(text.lower())
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return WORD_RE.findall(text.casefold())
+
+
+def matches(tokens, text):
+    """True when every query token is a prefix of some word of ``text``"""
+    words = tokenize(text)
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+class PrefixIndex:
+    """Sorted vocabulary with one sorted posting array of document ids per word"""
+
+    def __init__(self):
+        self._words = []
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._words)
+
+    @classmethod
+    def build(cls, documents):
+        """Bulk-load from (doc_id, text) pairs; much faster than add()"""
+        postings = defaultdict(lambda: array("q"))
+        last = None
+        ordered = True
+        for doc_id, text in documents:
+            ordered = ordered and (last is None or doc_id > last)
+            last = doc_id
+            for word in set(tokenize(text)):
+                postings[word].append(doc_id)
+        if not ordered:
+            postings = {word: array("q", sorted(set(posting))) for word, posting in postings.items()}
+        index = cls()
+        index._postings = dict(postings)
+        index._words = sorted(index._postings)
+        return index
+
+    def add(self, doc_id, text):
+        self._add_words(doc_id, set(tokenize(text)))
+
+    def remove(self, doc_id, text):
+        self._remove_words(doc_id, set(tokenize(text)))
+
+    def replace(self, doc_id, old_text, new_text):
+        """remove() then add(), leaving the postings of words in both alone"""
+        old, new = set(tokenize(old_text)), set(tokenize(new_text))
+        self._remove_words(doc_id, old - new)
+        self._add_words(doc_id, new - old)
+
+    def _add_words(self, doc_id, words):
+        for word in words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = array("q")
+                insort(self._words, word)
+            if not posting or doc_id > posting[-1]:
+                posting.append(doc_id)  # New rows have the highest ids
+                continue
+            position = bisect_left(posting, doc_id)
+            if posting[position] != doc_id:
+                posting.insert(position, doc_id)
+
+    def _remove_words(self, doc_id, words):
+        for word in words:
+            posting = self._postings.get(word)
+            if posting is None:
+                continue
+            position = bisect_left(posting, doc_id)
+            if position == len(posting) or posting[position] != doc_id:
+                continue
+            del posting[position]
+            if not posting:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def _range(self, prefix):
+        start = bisect_left(self._words, prefix)
+        return start, bisect_left(self._words, prefix + "\U0010ffff", start)
+
+    def estimate(self, prefix, cap=INTERSECT_LIMIT):
+        """Number of postings under ``prefix``, counted up to ``cap``"""
+        start, end = self._range(prefix)
+        total = 0
+        for word in self._words[start:end]:
+            total += len(self._postings[word])
+            if total > cap:
+                break
+        return total
+
+    def ids(self, prefix):
+        """Document ids under ``prefix`` in vocabulary order (may repeat)"""
+        start, end = self._range(prefix)
+        for word in self._words[start:end]:
+            yield from self._postings[word]
+
+    def candidates(self, tokens, limit):
+        """Up to ``limit`` distinct ids matching every token as a word prefix"""
+        ranked = list(set(tokens))
+        if len(ranked) > 1:
+            ranked.sort(key=self.estimate)
+        filters = [
+            set(self.ids(token)) for token in ranked[1:] if self.estimate(token) <= INTERSECT_LIMIT
+        ]
+        seen = set()
+        results = []
+        for doc_id in self.ids(ranked[0]):
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            if all(doc_id in ids for ids in filters):
+                results.append(doc_id)
+                if len(results) >= limit:
+                    break
+        return results
+
+
+class ArtistIndex(PrefixIndex):
+    """
+    Artist names, reference-counted over the songs and albums crediting
+    them so the index follows song/album events alone. Names are
+    normalized like Artist.name.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ids = {}
+        self._names = {}
+        self._refs = Counter()
+        self._next_id = 1
+
+    @classmethod
+    def build(cls, counts):
+        index = super().build(enumerate(counts, start=1))
+        for doc_id, (name, refs) in enumerate(counts.items(), start=1):
+            index._ids[name] = doc_id
+            index._names[doc_id] = name
+            index._refs[name] = refs
+        index._next_id = len(counts) + 1
+        return index
+
+    def acquire(self, name):
+        name = Artist.normalize_name(name or "")
+        if not name:
+            return
+        if name not in self._ids:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._ids[name] = doc_id
+            self._names[doc_id] = name
+            self.add(doc_id, name)
+        self._refs[name] += 1
+
+    def release(self, name):
+        name = Artist.normalize_name(name or "")
+        if name not in self._ids:
+            return
+        self._refs[name] -= 1
+        if self._refs[name] <= 0:
+            del self._refs[name]
+            doc_id = self._ids.pop(name)
+            del self._names[doc_id]
+            self.remove(doc_id, name)
+
+    def name(self, doc_id):
+        return self._names.get(doc_id)
+
+
+class SearchIndex:
+    """
+    Process-wide search index over songs, albums and artists.
+
+    Built in a background thread on first use, patched through ``update()``
+    by the catalog signals and, with a ``ttl``, rebuilt in the background
+    once older than ``ttl`` seconds while the previous index keeps serving.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._indexes = None
+        self._loaded_at = None
+        self._pending = None
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._builder = None
+
+    def _build(self):
+        artists = Counter()
+        for model in (Song, Album):
+            rows = model.objects.order_by().values("artist").annotate(refs=Count("id"))
+            for row in rows.iterator():
+                artists[Artist.normalize_name(row["artist"])] += row["refs"]
+
+        def documents(model):
+            rows = model.objects.order_by("id").values_list("id", "title", "artist")
+            for doc_id, title, artist in rows.iterator(chunk_size=10000):
+                yield doc_id, f"{title} {artist}"
+
+        return {
+            "songs": PrefixIndex.build(documents(Song)),
+            "albums": PrefixIndex.build(documents(Album)),
+            "artists": ArtistIndex.build(artists),
+        }
+
+    def load(self):
+        """(Re)build the index, replaying updates that raced the build"""
+        with self._build_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                indexes = self._build()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                for args in self._pending:
+                    self._apply(indexes, *args)
+                self._indexes = indexes
+                self._loaded_at = time.monotonic()
+                self._pending = None
+
+    def _rebuild_in_background(self):
+        try:
+            self.load()
+        except Exception:
+            logger.exception("Search index rebuild failed")
+        finally:
+            connection.close()
+
+    def _ensure_loaded(self):
+        """Start a background build when there is no index yet or it expired"""
+        with self._lock:
+            if self._indexes is not None and (
+                not self.ttl or time.monotonic() - self._loaded_at <= self.ttl
+            ):
+                return
+            # is_alive() is False in a forked child, so each process builds its own
+            if self._builder is not None and self._builder.is_alive():
+                return
+            self._builder = threading.Thread(
+                target=self._rebuild_in_background, name="search-index", daemon=True
+            )
+            self._builder.start()
+
+    def invalidate(self):
+        """Drop the index; the next search starts rebuilding it"""
+        with self._lock:
+            self._indexes = None
+
+    def update(self, kind, doc_id, old, new):
+        """
+        Reflect a committed song/album change. ``old`` and ``new`` are
+        (title, artist) pairs, or None for creates and deletes.
+        """
+        if old == new:
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((kind, doc_id, old, new))
+            if self._indexes is not None:
+                self._apply(self._indexes, kind, doc_id, old, new)
+
+    @staticmethod
+    def _apply(indexes, kind, doc_id, old, new):
+        if old is not None and new is not None:
+            indexes[kind].replace(doc_id, " ".join(old), " ".join(new))
+        elif old is not None:
+            indexes[kind].remove(doc_id, " ".join(old))
+        else:
+            indexes[kind].add(doc_id, " ".join(new))
+        if old is not None:
+            indexes["artists"].release(old[1])
+        if new is not None:
+            indexes["artists"].acquire(new[1])
+
+    def search(self, query, limit=10, kinds=KINDS):
+        """
+        Return {kind: results} with Song / Album / Artist instances whose
+        words start with every word of ``query``.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return {kind: [] for kind in kinds}
+        self._ensure_loaded()
+
+        with self._lock:
+            indexes = self._indexes
+            if indexes is None:
+                candidates = None
+            else:
+                candidates = {
+                    kind: indexes[kind].candidates(tokens, limit * CANDIDATE_FACTOR)
+                    for kind in kinds
+                }
+                artist_names = [
+                    indexes["artists"].name(doc_id) for doc_id in candidates.get("artists", ())
+                ]
+        if candidates is None:
+            return database_search(query, tokens, limit, kinds)
+
+        results = {}
+        for kind, model in (("songs", Song), ("albums", Album)):
+            if kind not in kinds:
+                continue
+            rows = model.objects.in_bulk(candidates[kind])
+            found = [
+                rows[doc_id]
+                for doc_id in candidates[kind]
+                if doc_id in rows and matches(tokens, f"{rows[doc_id].title} {rows[doc_id].artist}")
+            ][:limit]
+            if len(found) < limit and trigram_available():
+                found += fuzzy_search(model, query, limit - len(found), exclude=[row.pk for row in found])
+            results[kind] = found
+
+        if "artists" in kinds:
+            names = [name for name in artist_names if name and matches(tokens, name)]
+            credited = Artist.objects.filter(name__in=names).filter(
+                Q(songs_count__gt=0) | Q(albums_count__gt=0)
+            )
+            artists = {artist.name: artist for artist in credited} if names else {}
+            results["artists"] = [artists[name] for name in names if name in artists][:limit]
+        return results
+
+
+_trigram_available = None
+
+
+def trigram_available():
+    """Whether the database is PostgreSQL with pg_trgm installed"""
+    global _trigram_available
+    if _trigram_available is None:
+        if connection.vendor != "postgresql":
+            _trigram_available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+                _trigram_available = cursor.fetchone()[0]
+    return _trigram_available
+
+
+def database_search(query, tokens, limit, kinds=KINDS):
+    """
+    search() without the in-process index, while it is being built:
+    trigram matches on PostgreSQL with pg_trgm, otherwise rows containing
+    every query word.
+    """
+    results = {}
+    for kind, model in (("songs", Song), ("albums", Album)):
+        if kind not in kinds:
+            continue
+        if trigram_available():
+            results[kind] = fuzzy_search(model, query, limit)
+            continue
+        condition = Q()
+        for token in tokens:
+            condition &= Q(title__icontains=token) | Q(artist__icontains=token)
+        results[kind] = list(model.objects.filter(condition).order_by("pk")[:limit])
+
+    if "artists" in kinds:
+        condition = Q(songs_count__gt=0) | Q(albums_count__gt=0)
+        for token in tokens:
+            condition &= Q(name__icontains=token)
+        results["artists"] = list(Artist.objects.filter(condition)[:limit])
+    return results
+
+
+def fuzzy_search(model, query, limit, exclude=()):
+    """
+    Trigram word-similarity matches on title or artist, best first. The
+    ``%>`` lookups use the GIN indexes from ``create_search_indexes``.
+    """
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    if limit <= 0:
+        return []
+    return list(
+        model.objects.filter(Q(title__trigram_word_similar=query) | Q(artist__trigram_word_similar=query))
+        .exclude(pk__in=exclude)
+        .annotate(
+            similarity=Greatest(
+                TrigramWordSimilarity(query, "title"), TrigramWordSimilarity(query, "artist")
+            )
+        )
+        .filter(similarity__gte=TRIGRAM_THRESHOLD)
+        .order_by("-similarity")[:limit]
+    )
+
+
+search_index = SearchIndex(ttl=getattr(settings, "SEARCH_INDEX_TTL", 0) or None)
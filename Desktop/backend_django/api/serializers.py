@@ -1,5 +1,29 @@
 from rest_framework import serializers
-from .models import User, Song, Album, Message
+from .models import User, Artist, Song, Album, Message, Conversation
+from .images import image_storage, requested_format, variant_key
+
+
+class ImageVariantField(serializers.Field):
+    """
+    URL of a generated derivative of image_url (see api/images.py): WebP
+    unless the request asks for ?image_format=jpeg, None until generated.
+    """
+
+    def __init__(self, size, **kwargs):
+        self.size = size
+        kwargs.update(source='image_variants', read_only=True)
+        super().__init__(**kwargs)
+
+    def variant(self, request):
+        return variant_key(self.size, requested_format(request))
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        name = variants.get(self.variant(request))
+        if not name:
+            return None
+        url = image_storage(self.parent.Meta.model).url(name)
+        return request.build_absolute_uri(url) if request is not None else url
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -13,52 +37,72 @@ class UserSerializer(serializers.ModelSerializer):
 class SongSerializer(serializers.ModelSerializer):
     """Serializer for Song model"""
     album_title = serializers.CharField(source='album.title', read_only=True)
+    artist_id = serializers.IntegerField(source='artist_ref_id', read_only=True)
+    image_thumb_url = ImageVariantField('thumb')
 
     class Meta:
         model = Song
         fields = [
-            'id', 'title', 'artist', 'image_url', 'audio_url',
-            'duration', 'album', 'album_title', 'created_at', 'updated_at'
+            'id', 'title', 'artist', 'artist_id', 'image_url', 'image_thumb_url', 'audio_url',
+            'duration', 'bitrate', 'codec', 'album', 'album_title', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'bitrate', 'codec', 'created_at', 'updated_at']
 
 
 class SongListSerializer(serializers.ModelSerializer):
     """Simplified serializer for song lists (without audio URL)"""
+    artist_id = serializers.IntegerField(source='artist_ref_id', read_only=True)
+    image_thumb_url = ImageVariantField('thumb')
+
     class Meta:
         model = Song
-        fields = ['id', 'title', 'artist', 'image_url', 'duration']
+        fields = ['id', 'title', 'artist', 'artist_id', 'image_url', 'image_thumb_url', 'duration']
 
 
 class AlbumSerializer(serializers.ModelSerializer):
     """Serializer for Album model without songs"""
-    songs_count = serializers.SerializerMethodField()
+    artist_id = serializers.IntegerField(source='artist_ref_id', read_only=True)
+    image_medium_url = ImageVariantField('medium')
 
     class Meta:
         model = Album
         fields = [
-            'id', 'title', 'artist', 'image_url', 'release_year',
+            'id', 'title', 'artist', 'artist_id', 'image_url', 'image_medium_url', 'release_year',
             'songs_count', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
-
-    def get_songs_count(self, obj):
-        return obj.songs.count()
+        read_only_fields = ['id', 'songs_count', 'created_at', 'updated_at']
 
 
 class AlbumDetailSerializer(serializers.ModelSerializer):
     """Detailed serializer for Album with all songs"""
+    artist_id = serializers.IntegerField(source='artist_ref_id', read_only=True)
     songs = SongSerializer(many=True, read_only=True)
 
     class Meta:
         model = Album
         fields = [
-            'id', 'title', 'artist', 'image_url', 'release_year',
+            'id', 'title', 'artist', 'artist_id', 'image_url', 'release_year',
             'songs', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class ArtistSerializer(serializers.ModelSerializer):
+    """Serializer for Artist model with song and album counts"""
+    class Meta:
+        model = Artist
+        fields = ['id', 'name', 'songs_count', 'albums_count']
+
+
+class ArtistDetailSerializer(serializers.ModelSerializer):
+    """Detailed serializer for Artist with their albums"""
+    albums = AlbumSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Artist
+        fields = ['id', 'name', 'songs_count', 'albums_count', 'albums', 'created_at']
+
+
 class MessageSerializer(serializers.ModelSerializer):
     """Serializer for Message model"""
     sender_email = serializers.EmailField(source='sender.email', read_only=True)
@@ -71,9 +115,19 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'sender', 'sender_email', 'sender_name',
             'receiver', 'receiver_email', 'receiver_name',
-            'content', 'created_at', 'updated_at'
+            'content', 'read_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'read_at', 'created_at', 'updated_at']
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    """Serializer for inbox entries (one per conversation partner)"""
+    peer = UserSerializer(read_only=True)
+    last_message = MessageSerializer(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'peer', 'last_message', 'last_message_at', 'unread_count']
 
 
 class StatsSerializer(serializers.Serializer):
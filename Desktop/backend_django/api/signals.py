@@ -0,0 +1,338 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .models import Album, Artist, CatalogVersion, Message, PlatformStats, Song, User
+from .sampling import song_pool
+from .search import search_index
+from .authentication import invalidate_tokens
+from .audio import audio_pipeline, read_metadata
+from .cleanup import instance_media, queue_media
+from .images import SOURCE_KEY, image_pipeline
+from . import inbox, stats
+
+
+@receiver(post_save, sender=Song)
+def add_song_to_pool(sender, instance, created, **kwargs):
+    """Make newly created songs available to random sampling"""
+    if created:
+        song_id = instance.pk
+        transaction.on_commit(lambda: song_pool.add(song_id))
+
+
+@receiver(post_delete, sender=Song)
+def remove_song_from_pool(sender, instance, **kwargs):
+    """Stop sampling songs once their deletion is committed"""
+    song_id = instance.pk
+    transaction.on_commit(lambda: song_pool.discard(song_id))
+
+
+# ==================== CATALOG VERSION ====================
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Artist)
+def mark_catalog_changed(sender, using=None, **kwargs):
+    """Invalidate catalog validators (ETag / Last-Modified) on any change"""
+    CatalogVersion.mark_changed(using)
+
+
+# ==================== ALBUM SONG COUNTS ====================
+
+
+def _adjust_songs_count(album_id, delta):
+    if album_id is not None:
+        Album.objects.filter(pk=album_id).update(songs_count=F("songs_count") + delta)
+
+
+def _link_artist(instance, previous_name):
+    """Point artist_ref at the Artist named by the (possibly changed) artist field"""
+    if instance.artist_ref_id is None or previous_name != instance.artist:
+        instance.artist_ref = Artist.objects.resolve([instance.artist]).get(
+            Artist.normalize_name(instance.artist or "")
+        )
+
+
+@receiver(pre_save, sender=Song)
+def remember_previous_song(sender, instance, **kwargs):
+    """
+    Record the stored album, title and artist so post_save handlers can
+    detect album reassignment, reindex for search and track artists, and
+    link the song to its Artist row
+    """
+    previous = None
+    if instance.pk is not None and not instance._state.adding:
+        previous = (
+            Song.objects.filter(pk=instance.pk)
+            .values_list("album_id", "title", "artist", "artist_ref_id")
+            .first()
+        )
+    instance._previous_album_id = previous[0] if previous else None
+    instance._previous_fields = previous[1:3] if previous else None
+    instance._previous_artist_id = previous[3] if previous else None
+    _link_artist(instance, previous[2] if previous else None)
+
+
+@receiver(post_save, sender=Song)
+def update_album_songs_count(sender, instance, created, **kwargs):
+    """Keep Album.songs_count in step with song creation and reassignment"""
+    previous = getattr(instance, "_previous_album_id", None)
+    if created:
+        _adjust_songs_count(instance.album_id, 1)
+    elif previous != instance.album_id:
+        _adjust_songs_count(previous, -1)
+        _adjust_songs_count(instance.album_id, 1)
+
+
+@receiver(post_delete, sender=Song)
+def decrement_album_songs_count(sender, instance, origin=None, **kwargs):
+    """
+    Decrement on single song deletes. Queryset deletes recount in
+    SongQuerySet.delete, and album deletes cascade to the album itself.
+    """
+    if isinstance(origin, Song):
+        _adjust_songs_count(instance.album_id, -1)
+
+
+# ==================== INBOX ====================
+
+
+@receiver(post_save, sender=Message)
+def add_message_to_inbox(sender, instance, created, **kwargs):
+    """Bump both participants' conversation rows for a new message"""
+    if created:
+        inbox.record_message(instance)
+
+
+@receiver(post_delete, sender=Message)
+def remove_message_from_inbox(sender, instance, origin=None, **kwargs):
+    """
+    Recompute the affected conversation rows when messages are deleted.
+    Deleting a user cascades to their conversations, so nothing to do then.
+    """
+    origin_model = getattr(origin, "model", type(origin))
+    if origin_model is not Message:
+        return
+    inbox.refresh_conversation(instance.sender_id, instance.receiver_id)
+    if instance.receiver_id != instance.sender_id:
+        inbox.refresh_conversation(instance.receiver_id, instance.sender_id)
+
+
+# ==================== ARTIST COUNTS ====================
+
+ARTIST_COUNTERS = {Song: "songs_count", Album: "albums_count"}
+
+
+def _adjust_artist_count(artist_id, field, delta):
+    if artist_id is not None:
+        Artist.objects.filter(pk=artist_id).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Album)
+def update_artist_counts(sender, instance, created, **kwargs):
+    """Keep Artist.songs_count / albums_count in step with credits"""
+    previous = None if created else getattr(instance, "_previous_artist_id", None)
+    if previous != instance.artist_ref_id:
+        _adjust_artist_count(previous, ARTIST_COUNTERS[sender], -1)
+        _adjust_artist_count(instance.artist_ref_id, ARTIST_COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Album)
+def decrement_artist_counts(sender, instance, origin=None, **kwargs):
+    """Cascaded deletes also send this per row; queryset deletes recount instead"""
+    if not isinstance(origin, QuerySet):
+        _adjust_artist_count(instance.artist_ref_id, ARTIST_COUNTERS[sender], -1)
+
+
+@receiver(post_save, sender=Artist)
+def propagate_artist_rename(sender, instance, created, **kwargs):
+    """Keep the songs' and albums' artist name columns in step with Artist.name"""
+    if not created:
+        for model in (Song, Album):
+            model.objects.filter(artist_ref=instance).exclude(artist=instance.name).update(
+                artist=instance.name
+            )
+
+
+# ==================== SEARCH ====================
+
+
+@receiver(pre_save, sender=Album)
+def remember_previous_album(sender, instance, **kwargs):
+    """
+    Record the stored title and artist so post_save can reindex and track
+    artists, and link the album to its Artist row
+    """
+    previous = None
+    if instance.pk is not None and not instance._state.adding:
+        previous = (
+            Album.objects.filter(pk=instance.pk)
+            .values_list("title", "artist", "artist_ref_id")
+            .first()
+        )
+    instance._previous_fields = previous[:2] if previous else None
+    instance._previous_artist_id = previous[2] if previous else None
+    _link_artist(instance, previous[1] if previous else None)
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Album)
+def index_for_search(sender, instance, created, **kwargs):
+    """Patch the search index once the save is committed"""
+    kind = "songs" if sender is Song else "albums"
+    doc_id = instance.pk
+    old = None if created else getattr(instance, "_previous_fields", None)
+    new = (instance.title, instance.artist)
+    transaction.on_commit(lambda: search_index.update(kind, doc_id, old, new))
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Album)
+def remove_from_search(sender, instance, **kwargs):
+    """Drop deleted songs and albums from the search index on commit"""
+    kind = "songs" if sender is Song else "albums"
+    doc_id = instance.pk
+    old = (instance.title, instance.artist)
+    transaction.on_commit(lambda: search_index.update(kind, doc_id, old, None))
+
+
+# ==================== PLATFORM STATS ====================
+
+STATS_COUNTERS = {Song: "total_songs", Album: "total_albums", User: "total_users"}
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=User)
+def count_created(sender, instance, created, using=None, **kwargs):
+    """Keep the platform totals in step with new songs, albums and users"""
+    if created:
+        PlatformStats.increment(STATS_COUNTERS[sender], 1, using)
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=User)
+def count_deleted(sender, instance, using=None, **kwargs):
+    PlatformStats.increment(STATS_COUNTERS[sender], -1, using)
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Album)
+def track_artist_on_save(sender, instance, created, **kwargs):
+    """Count an artist when their first song/album appears or the last one moves away"""
+    previous = None if created else getattr(instance, "_previous_artist_id", None)
+    stats.record_artist_change(instance, previous, instance.artist_ref_id)
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Album)
+def track_artist_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Uncount artists left without songs/albums. A delete sends this per row
+    after each model's rows are gone (an album's before or after its
+    songs', depending on the database), so each artist is checked once per
+    model and uncounted at most once per delete. Queryset deletes are
+    handled by ArtistCreditQuerySet.delete.
+    """
+    if isinstance(origin, QuerySet):
+        return
+    state = origin if origin is not None else instance
+    if not hasattr(state, "_artists_checked"):
+        state._artists_checked, state._artists_released = set(), set()
+    artist_id = instance.artist_ref_id
+    if (sender, artist_id) in state._artists_checked or artist_id in state._artists_released:
+        return
+    state._artists_checked.add((sender, artist_id))
+    if stats.release_artists([artist_id]):
+        state._artists_released.add(artist_id)
+
+
+# ==================== AUTH CACHE ====================
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Logout deletes the token: stop accepting its cached resolution"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """Password changes, deactivation and profile edits refresh the cached user"""
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return  # Every login saves last_login; the cached copy may lag there
+    invalidate_tokens(Token.objects.filter(user_id=instance.pk).values_list("key", flat=True))
+
+
+# ==================== IMAGE DERIVATIVES ====================
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Album)
+@receiver(pre_save, sender=Song)
+def drop_stale_image_variants(sender, instance, **kwargs):
+    """Variants of a replaced or removed image must not outlive it"""
+    if instance.image_variants.get(SOURCE_KEY) != (instance.image_url.name or None):
+        instance.image_variants = {}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Song)
+def generate_image_variants(sender, instance, **kwargs):
+    """Thumbnails and WebP versions of a new image, made in the background after commit"""
+    name = instance.image_url.name
+    if name and not instance.image_variants:
+        pk = instance.pk
+        transaction.on_commit(lambda: image_pipeline.submit(sender, pk, name))
+
+
+# ==================== AUDIO ====================
+
+
+@receiver(pre_save, sender=Song)
+def read_audio_metadata(sender, instance, raw=False, **kwargs):
+    """Duration, bitrate and codec of a new upload, from its headers"""
+    upload = instance.audio_url
+    if raw or not upload or upload._committed:
+        return
+    upload.file.seek(0)
+    metadata = read_metadata(upload.file)
+    upload.file.seek(0)
+    if metadata is not None:
+        instance.duration = metadata["duration"]
+        instance.bitrate = metadata["bitrate"]
+        instance.codec = metadata["codec"]
+    instance._audio_uploaded = True
+
+
+@receiver(post_save, sender=Song)
+def compute_song_waveform(sender, instance, **kwargs):
+    """Waveform peaks of a new upload, computed in the background after commit"""
+    if instance.__dict__.pop("_audio_uploaded", False):
+        pk, name = instance.pk, instance.audio_url.name
+        transaction.on_commit(lambda: audio_pipeline.submit(pk, name))
+
+
+# ==================== MEDIA CLEANUP ====================
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Song)
+def queue_deleted_media(sender, instance, using=None, **kwargs):
+    """
+    Files of rows deleted through the collector; delete_songs() and
+    delete_albums() (api/deletion.py) queue theirs per batch.
+    """
+    queue_media(instance_media(instance), using)
@@ -0,0 +1,145 @@
+"""
+Audio streaming with HTTP Range support.
+
+Responses are FileResponse objects positioned at the start of the requested
+range with an explicit Content-Length, so WSGI servers that implement
+``wsgi.file_wrapper`` with sendfile (gunicorn) send the bytes straight from
+the page cache. With AUDIO_STREAM_OFFLOAD set, Django only emits an
+X-Accel-Redirect / X-Sendfile header and the front proxy serves the file
+(and the Range) itself.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.http import http_date, parse_http_date_safe
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    """File-like view of ``length`` bytes of ``file`` starting at ``start``"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def fileno(self):
+        # sendfile() implementations start at the descriptor's current offset
+        # and send Content-Length bytes, which is exactly this range
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single "bytes=" range, None when the
+    header should be ignored (absent, malformed or multi-range) and raise
+    ValueError when the range is unsatisfiable.
+    """
+    match = RANGE_RE.match(header or "")
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _etag(stat):
+    return f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def _range_applies(request, etag, last_modified):
+    """If-Range: only honour Range when the client's validator still matches"""
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def stream_file_field(request, field_file):
+    """Serve a FileField's file honouring Range / If-Range"""
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        # Remote storage: let the storage backend serve it
+        return HttpResponseRedirect(field_file.url)
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return HttpResponse(status=404)
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    etag = _etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    offload = getattr(settings, "AUDIO_STREAM_OFFLOAD", None)
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        if offload == "x-accel-redirect":
+            prefix = settings.AUDIO_ACCEL_REDIRECT_PREFIX.rstrip("/")
+            # nginx percent-decodes the URI, so names with spaces, %, ?, # or
+            # non-ASCII characters must be escaped to reach the same file
+            response["X-Accel-Redirect"] = f"{prefix}/{quote(field_file.name, safe='/')}"
+        else:
+            response["X-Sendfile"] = path
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    size = stat.st_size
+    try:
+        byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if byte_range is not None and not _range_applies(request, etag, last_modified):
+        byte_range = None
+
+    start, end = byte_range or (0, size - 1)
+    length = max(end - start + 1, 0)
+    response = FileResponse(
+        FileRange(open(path, "rb"), start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+    )
+    response.block_size = STREAM_BLOCK_SIZE
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
@@ -0,0 +1,355 @@
+"""
+Deterministic synthetic catalog for scale and performance testing.
+
+``generate()`` fills an empty catalog with artists, albums, songs, users
+and direct messages whose shapes resemble production: artist popularity
+and user activity follow Zipf distributions, most songs belong to albums,
+and messages form threads between small, popularity-biased friend circles.
+
+Every row is derived from (seed, table, chunk), with explicit primary
+keys, so the same seed and chunk size always produce the same database
+regardless of how many worker processes wrote it. Rows are streamed with COPY on
+PostgreSQL (executemany elsewhere) in parallel forked workers; the
+denormalized counters, inbox and stats are rebuilt once at the end.
+"""
+
+import csv
+import io
+import math
+import multiprocessing
+import random
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+
+from .models import Album, Artist, CatalogVersion, Message, Song, User
+
+
+# Fixed anchor so timestamps don't depend on the day the fixture was built
+ANCHOR = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+HISTORY = timedelta(days=5 * 365)
+MESSAGE_HISTORY = timedelta(days=365)
+ZIPF_EXPONENT = 1.1
+ALBUM_SHARE = 0.8
+USER_PASSWORD = "synthetic-password"
+EMAIL_DOMAIN = "synthetic.example"
+
+SYLLABLES = (
+    "la", "mo", "ri", "ven", "tar", "sol", "ka", "ne", "dor", "mi", "sa", "lu",
+    "zen", "bra", "tho", "el", "quin", "ro", "va", "ly", "om", "shi", "per", "an",
+)
+WORDS = (
+    "love", "night", "fire", "river", "dream", "heart", "city", "light", "gold",
+    "summer", "shadow", "echo", "wild", "blue", "storm", "home", "midnight",
+    "road", "stars", "ocean", "electric", "silver", "rain", "dance", "velvet",
+    "ghost", "paper", "neon", "sugar", "thunder", "garden", "highway", "winter",
+)
+
+# Set in the parent before each phase's pool forks, read by the workers
+_context = {}
+
+
+def zipf_cum_weights(n, exponent=ZIPF_EXPONENT):
+    """Cumulative Zipf weights for rng.choices / bisect over n ranks"""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def pick(rng, cum_weights):
+    """Weighted index draw (what rng.choices does, without building a list)"""
+    return bisect_left(cum_weights, rng.random() * cum_weights[-1])
+
+
+def phrase(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).title()
+
+
+def artist_names(seed, count):
+    """Unique pronounceable names, e.g. "Venmo Kari" """
+    rng = random.Random(f"{seed}:artists")
+    names, seen = [], set()
+    while len(names) < count:
+        parts = [
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))).title()
+            for _ in range(rng.choice((1, 2, 2, 2, 3)))
+        ]
+        name = " ".join(parts)
+        if name in seen:
+            name = f"{name} {len(names)}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def timestamp(rng, end=ANCHOR, span=HISTORY):
+    return end - span * rng.random() ** 0.5  # skewed towards recent
+
+
+def album_artists(seed, albums, artists):
+    """Artist index of every album, Zipf-skewed towards popular artists"""
+    rng = random.Random(f"{seed}:album-artists")
+    weights = zipf_cum_weights(artists)
+    return [pick(rng, weights) for _ in range(albums)]
+
+
+# ---- Row generators: (rng, ids range, context) -> tuples in COLUMNS order ----
+
+
+def album_rows(rng, ids, ctx):
+    for album_id in ids:
+        artist = ctx["album_artists"][album_id - ctx["album_base"]]
+        created = timestamp(rng)
+        yield (
+            album_id,
+            phrase(rng, 1, 4),
+            ctx["artist_names"][artist],
+            ctx["artist_base"] + artist,
+            "synthetic/album.jpg",
+            {},
+            min(ANCHOR.year, 1960 + int(65 * rng.random() ** 0.4)),
+            0,
+            created,
+            created,
+        )
+
+
+def song_rows(rng, ids, ctx):
+    albums = len(ctx["album_artists"])
+    for song_id in ids:
+        if albums and rng.random() < ALBUM_SHARE:
+            album = rng.randrange(albums)
+            artist = ctx["album_artists"][album]
+            album_id = ctx["album_base"] + album
+        else:
+            artist = pick(rng, ctx["artist_weights"])
+            album_id = None
+        created = timestamp(rng)
+        yield (
+            song_id,
+            phrase(rng, 1, 5),
+            ctx["artist_names"][artist],
+            ctx["artist_base"] + artist,
+            "synthetic/song.jpg",
+            {},
+            "synthetic/song.mp3",
+            max(60, min(900, int(rng.lognormvariate(math.log(210), 0.3)))),
+            None,
+            "",
+            album_id,
+            created,
+            created,
+        )
+
+
+def user_rows(rng, ids, ctx):
+    for user_id in ids:
+        name = f"{rng.choice(SYLLABLES).title()}{rng.choice(SYLLABLES)} {phrase(rng, 1, 1)}"
+        yield (
+            user_id,
+            ctx["password"],
+            None,
+            False,
+            f"synthetic{user_id}",
+            "",
+            "",
+            f"user{user_id}@{EMAIL_DOMAIN}",
+            False,
+            True,
+            timestamp(rng),
+            name,
+            None,
+            {},
+        )
+
+
+def friends(seed, user, users, weights):
+    """A user's conversation partners, biased towards active users"""
+    rng = random.Random(f"{seed}:friends:{user}")
+    circle = {pick(rng, weights) for _ in range(rng.randint(2, 12))}
+    circle.discard(user)
+    return sorted(circle) or [(user + 1) % users]
+
+
+def message_rows(rng, ids, ctx):
+    users, weights = ctx["users"], ctx["user_weights"]
+    circles = {}
+    span = MESSAGE_HISTORY / ctx["messages"]
+    start = ANCHOR - MESSAGE_HISTORY
+    for message_id in ids:
+        sender = pick(rng, weights)
+        if sender not in circles:
+            circles[sender] = friends(ctx["seed"], sender, users, weights)
+        receiver = rng.choice(circles[sender])
+        if rng.random() < 0.5:
+            sender, receiver = receiver, sender
+        position = message_id - ctx["message_base"]
+        created = start + span * position
+        # The most recent few percent of messages are still unread
+        read_at = None
+        if position < ctx["messages"] * 0.97:
+            read_at = created + timedelta(minutes=rng.randint(1, 600))
+        yield (
+            message_id,
+            ctx["user_base"] + sender,
+            ctx["user_base"] + receiver,
+            phrase(rng, 2, 12).capitalize(),
+            read_at,
+            created,
+            created,
+        )
+
+
+TABLES = {
+    "albums": (Album, album_rows, [
+        "id", "title", "artist", "artist_ref_id", "image_url", "image_variants", "release_year",
+        "songs_count", "created_at", "updated_at",
+    ]),
+    "songs": (Song, song_rows, [
+        "id", "title", "artist", "artist_ref_id", "image_url", "image_variants", "audio_url",
+        "duration", "bitrate", "codec", "album_id", "created_at", "updated_at",
+    ]),
+    "users": (User, user_rows, [
+        "id", "password", "last_login", "is_superuser", "username", "first_name",
+        "last_name", "email", "is_staff", "is_active", "date_joined", "full_name",
+        "image_url", "image_variants",
+    ]),
+    "messages": (Message, message_rows, [
+        "id", "sender_id", "receiver_id", "content", "read_at", "created_at", "updated_at",
+    ]),
+}
+
+
+# ---- Writers ----
+
+# COPY's NULL marker, so that empty strings stay empty strings
+NULL = r"\N"
+
+
+def copy_rows(model, columns, rows):
+    """Stream rows into the table with COPY ... FROM STDIN (PostgreSQL)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            NULL if value is None else value.isoformat() if isinstance(value, datetime) else value
+            for value in row
+        ])
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    sql = (
+        f"COPY {quote(model._meta.db_table)} ({', '.join(quote(c) for c in columns)}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')"
+    )
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(sql, buffer)
+
+
+def insert_rows(model, columns, rows):
+    """Portable fallback: one executemany INSERT per chunk"""
+    fields = [model._meta.get_field(column) for column in columns]
+    quote = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(c) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def write_chunk(task):
+    """Worker entry point: generate and write one chunk of one table"""
+    table, first, last = task
+    model, generate_rows, columns = TABLES[table]
+    rng = random.Random(f"{_context['seed']}:{table}:{first}")
+    write = copy_rows if connection.vendor == "postgresql" else insert_rows
+    with transaction.atomic():
+        write(model, columns, generate_rows(rng, range(first, last), _context))
+    return last - first
+
+
+def default_workers():
+    if connection.vendor != "postgresql":
+        return 1  # SQLite & co. serialize writers anyway
+    return multiprocessing.cpu_count()
+
+
+def _write_table(table, base, count, chunk_size, workers, progress):
+    tasks = [
+        (table, first, min(first + chunk_size, base + count))
+        for first in range(base, base + count, chunk_size)
+    ]
+    written = 0
+    if workers > 1 and len(tasks) > 1:
+        # Forked children must open their own database connections
+        connections.close_all()
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            for done in pool.imap_unordered(write_chunk, tasks):
+                written += done
+                progress(table, written, count)
+    else:
+        for task in tasks:
+            written += write_chunk(task)
+            progress(table, written, count)
+
+
+def _next_id(model):
+    return (model.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+
+
+def generate(
+    songs, albums, artists, users, messages, seed=42, workers=None, chunk_size=10000,
+    progress=lambda table, done, total: None,
+):
+    """Generate the synthetic dataset into an empty catalog; returns the row counts"""
+    workers = workers or default_workers()
+    names = artist_names(seed, artists)
+    artist_base = _next_id(Artist)
+    with transaction.atomic():
+        Artist.objects.bulk_create(
+            [Artist(id=artist_base + i, name=name) for i, name in enumerate(names)],
+            batch_size=chunk_size,
+        )
+    progress("artists", artists, artists)
+
+    _context.clear()
+    _context.update(
+        seed=seed,
+        artist_base=artist_base,
+        artist_names=names,
+        artist_weights=zipf_cum_weights(artists),
+        album_base=_next_id(Album),
+        album_artists=album_artists(seed, albums, artists),
+        user_base=_next_id(User),
+        users=users,
+        user_weights=zipf_cum_weights(users),
+        message_base=_next_id(Message),
+        messages=messages,
+        password=make_password(USER_PASSWORD),
+    )
+    plan = [
+        ("albums", _context["album_base"], albums),
+        ("songs", _next_id(Song), songs),
+        ("users", _context["user_base"], users),
+        ("messages", _context["message_base"], messages if users > 1 else 0),
+    ]
+    for table, base, count in plan:
+        if count:
+            _write_table(table, base, count, chunk_size, workers, progress)
+    _context.clear()
+
+    # Explicit ids leave the sequences behind; COPY skipped every counter
+    models = [Artist, Album, Song, User, Message]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    Album.objects.filter(id__gte=plan[0][1]).recount_songs()
+    Artist.objects.filter(id__gte=artist_base).recount()
+    CatalogVersion.bump()
+    return {"artists": artists, **{table: count for table, _, count in plan}}
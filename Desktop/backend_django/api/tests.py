@@ -1,3 +1,1336 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import math
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import wave
+from collections import Counter
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, models, transaction
+from django.db.models import Count, ProtectedError, Q, RestrictedError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .audio import WAVEFORM_POINTS, AudioPipeline
+from .authentication import _cache_key as _token_cache_key, issue_access_token, resolve_token
+from .cache import cache_counters
+from .cleanup import MediaCleanupWorker, media_cleanup
+from .deletion import delete_albums, delete_songs
+from .fastpath import ValuesSerializer
+from .images import SOURCE_KEY, ImagePipeline, build_variants, image_storage
+from .inbox import rebuild_conversations, record_message
+from .metrics import RequestMetrics, request_metrics
+from .models import (
+    Album, Artist, CatalogVersion, Conversation, MediaCleanup, Message, PlatformStats, PlayEvent, RecommendationState,
+    Song, SongNeighbor, SongPlayStats, SongWaveform, User, UserSongInteraction,
+)
+from .management.commands.run_pubsub_relay import Command as RelayCommand
+from .plays import PlayEventBuffer, logsumexp, play_weight
+from .pubsub import SUBSCRIBE_LINE, InMemoryBroker, RelayBroker, broker, user_channel
+from .realtime import websocket_application
+from .recommendations import build_neighbors, sync_interactions
+from .renderers import FastJSONRenderer
+from .sampling import SongSamplingPool
+from .search import PrefixIndex, SearchIndex, search_index
+from .stats import compute_stats, get_platform_stats, reconcile_stats
+from .serializers import AlbumSerializer, SongListSerializer, SongSerializer
+from .streaming import parse_range
+from .synthetic import generate
+
+
+# ==================== QUERY BUDGET HARNESS ====================
+
+# Literals in the captured SQL: quoted strings and numbers (not inside identifiers)
+SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w.\"])-?\d+(?:\.\d+)?(?![\w\"])")
+SQL_IN_LIST = re.compile(r'IN \(\?(?:, \?)*\)')
+# Statements of one shape per request before it counts as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = 3
+PAGE_SIZES = (1, 10, 50)
+
+
+def query_shape(sql):
+    """``sql`` with its parameters replaced, so per-row repeats compare equal"""
+    return SQL_IN_LIST.sub('IN (...)', SQL_LITERAL.sub('?', sql))
+
+
+def repeated_queries(statements, threshold=N_PLUS_ONE_THRESHOLD):
+    """{shape: count} of the statements repeated ``threshold`` or more times"""
+    shapes = Counter(query_shape(sql) for sql in statements)
+    return {shape: count for shape, count in shapes.items() if count >= threshold}
+
+
+class QueryBudgetMixin:
+    """
+    Runs requests with their SQL captured and asserts that an endpoint stays
+    within its query budget, repeats no query shape per row (N+1) and issues
+    the same number of queries whatever the page size.
+    """
+
+    def capture(self, client, url):
+        # Cached payloads would hide the queries behind them
+        caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200, f'{url}: {response.content[:200]}')
+        return [query['sql'] for query in queries.captured_queries]
+
+    def assertNoNPlusOne(self, url, statements):
+        repeated = repeated_queries(statements)
+        self.assertFalse(
+            repeated,
+            f'{url} repeats queries per row (N+1):\n'
+            + '\n'.join(f'  {count}x {shape}' for shape, count in repeated.items()),
+        )
+
+    def assertQueryBudget(self, client, url, budget, size_param=None, sizes=PAGE_SIZES):
+        # Warm up process-wide state (sampling pool, search index, version row)
+        self.capture(client, url)
+        urls = [url]
+        if size_param:
+            separator = '&' if '?' in url else '?'
+            urls = [f'{url}{separator}{size_param}={size}' for size in sizes]
+
+        counts = {}
+        for sized_url in urls:
+            statements = self.capture(client, sized_url)
+            self.assertNoNPlusOne(sized_url, statements)
+            self.assertLessEqual(
+                len(statements), budget,
+                f'{sized_url} ran {len(statements)} queries (budget {budget}):\n  '
+                + '\n  '.join(statements),
+            )
+            counts[sized_url] = len(statements)
+        self.assertEqual(len(set(counts.values())), 1, f'Query count grows with page size: {counts}')
+
+
+class FastPathParityTests(TestCase):
+    """The .values() fast path must render byte-for-byte what the DRF serializers do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        album = Album.objects.create(
+            title='Déjà Vu', artist='Crosby, Stills & Nash', release_year=1970,
+            image_url='album_images/déjà vu.jpg',
+        )
+        Album.objects.create(title='No Cover', artist='Nobody', release_year=2001, image_url='')
+        Song.objects.create(
+            title='Carry On', artist='Crosby, Stills & Nash', duration=265, album=album,
+            image_url='song_images/carry on.jpg', audio_url='songs/carry on.mp3',
+            image_variants={
+                'source': 'song_images/carry on.jpg',
+                'thumb.jpg': 'derived/ab/abc-thumb.jpg',
+                'thumb.webp': 'derived/ab/abc-thumb.webp',
+            },
+        )
+        Song.objects.create(
+            title='Line\u2028separator "quoted" \\ \t', artist='  Spaced  Out ', duration=1,
+            image_url='song_images/über.png', audio_url='songs/plain.mp3',
+        )
+        Song.objects.create(
+            title='No files', artist='Solo', duration=0, image_url='', audio_url='',
+        )
+
+    def assertParity(self, serializer_class, queryset, request):
+        context = {'request': request} if request else {}
+        expected = JSONRenderer().render(
+            serializer_class(queryset, many=True, context=context).data
+        )
+        fast = ValuesSerializer(serializer_class)
+        actual = FastJSONRenderer().render(fast.serialize(fast.rows(queryset), request))
+        self.assertEqual(actual, expected)
+
+    def test_serializers_match(self):
+        request = RequestFactory().get('/api/songs/')
+        jpeg_request = RequestFactory().get('/api/songs/', {'image_format': 'jpeg'})
+        for request in (request, jpeg_request, None):
+            with self.subTest(request=request):
+                songs = Song.objects.order_by('id')
+                self.assertParity(SongSerializer, songs, request)
+                self.assertParity(SongListSerializer, songs, request)
+                self.assertParity(AlbumSerializer, Album.objects.order_by('id'), request)
+
+    def test_renderer_matches_drf_on_values_orjson_handles_differently(self):
+        now = timezone.now()
+        payloads = [
+            {'at': now, 'day': now.date(), 'time': now.time(), 'price': Decimal('1.50')},
+            {'lazy': gettext_lazy('Songs'), 'text': 'a\u2028b\u2029c "é"', 'nested': [None, True, 1.5]},
+            {1: 'non-string key'},
+            {'huge': 2 ** 70},
+            [],
+        ]
+        for data in payloads:
+            with self.subTest(data=data):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        context = {'indent': 2}
+        self.assertEqual(
+            FastJSONRenderer().render({'a': 1}, renderer_context=context),
+            JSONRenderer().render({'a': 1}, renderer_context=context),
+        )
+
+    def test_list_endpoints_match(self):
+        for url, serializer_class, model in (
+            ('/api/songs/', SongSerializer, Song),
+            ('/api/albums/', AlbumSerializer, Album),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_HOST='localhost')
+                request = response.wsgi_request
+                instances = model.objects.order_by('-created_at', '-id')
+                expected = JSONRenderer().render(
+                    serializer_class(instances, many=True, context={'request': request}).data
+                )
+                self.assertIn(b'"results":' + expected, response.content)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        album = Album.objects.create(title='Album', artist='Artist', release_year=2000)
+        Song.objects.create(title='With album', artist='Artist', duration=1, album=album)
+        Song.objects.create(title='Single', artist='Artist', duration=2)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_HOST='localhost')
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_fields_and_exclude(self):
+        response, queries = self.get('/api/songs/?fields=title,duration')
+        self.assertEqual(
+            json.loads(response.content)['results'],
+            [{'title': 'Single', 'duration': 2}, {'title': 'With album', 'duration': 1}],
+        )
+        self.assertNotIn('albums', ' '.join(queries))
+
+        response, _ = self.get('/api/songs/?exclude=audio_url,image_url,image_thumb_url,bitrate,codec,created_at,updated_at')
+        self.assertEqual(
+            list(json.loads(response.content)['results'][1]),
+            ['id', 'title', 'artist', 'artist_id', 'duration', 'album', 'album_title'],
+        )
+
+    def test_joins_only_selected_relations(self):
+        song = Song.objects.get(title='With album')
+        response, queries = self.get(f'/api/songs/{song.id}/?fields=album_title')
+        self.assertEqual(json.loads(response.content), {'album_title': 'Album'})
+        self.assertEqual(len([sql for sql in queries if 'songs' in sql]), 1)
+        self.assertNotIn('"songs"."audio_url"', ' '.join(queries))
+
+    def test_unknown_field(self):
+        response, _ = self.get('/api/albums/?fields=id,nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nope', json.loads(response.content)['fields'])
+
+
+class BatchTests(TestCase):
+    def test_order_missing_and_single_query(self):
+        album = Album.objects.create(title='Album', artist='Artist', release_year=2000)
+        first, second = (
+            Song.objects.create(title=title, artist='Artist', duration=1, album=album)
+            for title in ('First', 'Second')
+        )
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/api/songs/batch/?fields=id,album_title',
+                {'ids': [second.id, 0, first.id, second.id]},
+                content_type='application/json', HTTP_HOST='localhost',
+            )
+        self.assertEqual(json.loads(response.content), {
+            'results': [
+                {'id': second.id, 'album_title': 'Album'},
+                {'id': first.id, 'album_title': 'Album'},
+            ],
+            'missing': [0],
+        })
+
+    def test_invalid_ids(self):
+        for query in ('', '?ids=1,x', '?ids=' + ','.join(map(str, range(101)))):
+            with self.subTest(query=query):
+                response = self.client.get('/api/albums/batch/' + query, HTTP_HOST='localhost')
+                self.assertEqual(response.status_code, 400)
+
+
+def wav_file(seconds, rate=8000):
+    """Mono 16-bit WAV whose amplitude ramps up linearly"""
+    frames = seconds * rate
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(rate)
+        audio.writeframes(b''.join(
+            struct.pack('<h', int(32767 * i / frames * math.sin(i / 5))) for i in range(frames)
+        ))
+    return buffer.getvalue()
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class AudioTests(TemporaryMediaMixin, TestCase):
+
+    def test_upload_fills_metadata_and_waveform(self):
+        song = Song.objects.create(
+            title='Song', artist='Artist',
+            audio_url=SimpleUploadedFile('song.wav', wav_file(3), content_type='audio/wav'),
+        )
+        song.refresh_from_db()
+        self.assertEqual((song.duration, song.bitrate, song.codec), (3, 128, 'pcm'))
+
+        AudioPipeline(workers=0).process(song.id, song.audio_url.name)
+        response = self.client.get(f'/api/songs/{song.id}/waveform/', HTTP_HOST='localhost')
+        peaks = json.loads(response.content)['peaks']
+        self.assertEqual(len(peaks), WAVEFORM_POINTS)
+        self.assertEqual(max(peaks), 127)
+        self.assertLess(peaks[10], peaks[500], 'amplitude ramps up')
+
+        response = self.client.get(f'/api/songs/{song.id}/waveform/?format=bin', HTTP_HOST='localhost')
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(list(response.content), peaks)
+        response = self.client.get(
+            f'/api/songs/{song.id}/waveform/?format=bin',
+            HTTP_HOST='localhost', HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_waveform_of_replaced_audio_is_not_served(self):
+        song = Song.objects.create(title='Song', artist='Artist', audio_url='songs/new.wav')
+        SongWaveform.objects.create(song=song, peaks=b'\x01', source='songs/old.wav')
+        response = self.client.get(f'/api/songs/{song.id}/waveform/', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 404)
+
+
+class ImageTests(TemporaryMediaMixin, TestCase):
+    def make_album(self, title='Album'):
+        image = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(image, 'PNG')
+        return Album.objects.create(
+            title=title, artist='Artist', release_year=2000,
+            image_url=SimpleUploadedFile('cover.png', image.getvalue(), content_type='image/png'),
+        )
+
+    def derivatives(self, album):
+        album.refresh_from_db()
+        return [path for key, path in album.image_variants.items() if key != SOURCE_KEY]
+
+    def test_pipeline_rebuilds_a_shared_derivative_removed_before_it_was_recorded(self):
+        storage = image_storage(Album)
+        first, second = self.make_album(), self.make_album('Reissue')
+        ImagePipeline(workers=0).process(Album, first.id, first.image_url.name)
+        paths = self.derivatives(first)
+
+        def reuse_then_cleanup(*args, **kwargs):
+            # media_cleanup removes the shared files after build() found them
+            variants = build_variants(*args, **kwargs)
+            if build.call_count == 1:
+                for path in paths:
+                    storage.delete(path)
+            return variants
+
+        with mock.patch('api.images.build_variants', side_effect=reuse_then_cleanup) as build:
+            ImagePipeline(workers=0).process(Album, second.id, second.image_url.name)
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(self.derivatives(second), paths)
+        self.assertTrue(all(storage.exists(path) for path in paths))
+
+    def test_cleanup_rebuilds_a_derivative_reused_during_removal(self):
+        storage = image_storage(Album)
+        album = self.make_album()
+        ImagePipeline(workers=0).process(Album, album.id, album.image_url.name)
+        paths = self.derivatives(album)
+        MediaCleanup.objects.create(paths=paths)
+
+        # The album reused the files after the cleanup found them unreferenced
+        with mock.patch('api.cleanup.referenced_paths', return_value=set()), \
+                mock.patch('api.cleanup.image_pipeline', ImagePipeline(workers=0)):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(MediaCleanupWorker(interval=0).drain(), (len(paths), 0))
+        self.assertEqual(self.derivatives(album), paths)
+        self.assertTrue(all(storage.exists(path) for path in paths))
+
+    def test_failed_derivation_is_recorded_and_not_retried_on_save(self):
+        album = Album.objects.create(
+            title='Album', artist='Artist', release_year=2000,
+            image_url=SimpleUploadedFile('cover.jpg', b'not an image', content_type='image/jpeg'),
+        )
+        name = album.image_url.name
+        self.assertIsNone(ImagePipeline(workers=0).process(Album, album.id, name))
+        album.refresh_from_db()
+        self.assertEqual(album.image_variants, {SOURCE_KEY: name})
+
+        with mock.patch('api.signals.image_pipeline.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                album.title = 'Renamed'
+                album.save()
+        submit.assert_not_called()
+
+    def test_worker_processes_are_not_forked_from_the_web_process(self):
+        pipeline = ImagePipeline(workers=1)
+        self.addCleanup(pipeline.shutdown)
+        self.assertNotEqual(pipeline.pool.compute(os.getpid), os.getpid())
+        _, processes = pipeline.pool._executors()
+        self.assertIn(processes._mp_context.get_start_method(), ('forkserver', 'spawn'))
+
+
+class StreamingTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.body = bytes(range(256)) * 4
+        self.song = self.make_song('songs/track.mp3')
+
+    def make_song(self, name):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as audio:
+            audio.write(self.body)
+        return Song.objects.create(title='Song', artist='Artist', audio_url=name)
+
+    def stream(self, **headers):
+        return self.client.get(f'/api/songs/{self.song.id}/stream/', HTTP_HOST='localhost', **headers)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999), 'suffix range')
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+        self.assertEqual(parse_range('bytes=500-', 1000), (500, 999), 'open-ended range')
+        self.assertEqual(parse_range('bytes=900-5000', 1000), (900, 999))
+        for header in (None, '', 'bytes=-', 'items=0-1', 'bytes=0-1,5-6'):
+            self.assertIsNone(parse_range(header, 1000), header)
+        for header in ('bytes=1000-', 'bytes=5-2', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 1000)
+
+    def test_partial_content(self):
+        response = self.stream(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+
+        response = self.stream(HTTP_RANGE='bytes=-4')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.body[-4:])
+
+    def test_unsatisfiable_range(self):
+        response = self.stream(HTTP_RANGE=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_multi_range_and_stale_if_range_get_the_whole_file(self):
+        etag = self.stream()['ETag']
+        for headers in (
+            {'HTTP_RANGE': 'bytes=0-1,5-6'},
+            {'HTTP_RANGE': 'bytes=0-1', 'HTTP_IF_RANGE': '"stale"'},
+        ):
+            response = self.stream(**headers)
+            self.assertEqual(response.status_code, 200, headers)
+            self.assertEqual(response['Content-Length'], str(len(self.body)))
+            self.assertNotIn('Content-Range', response)
+            self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(self.stream(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag).status_code, 206)
+
+    @override_settings(AUDIO_STREAM_OFFLOAD='x-accel-redirect', AUDIO_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_accel_redirect_escapes_the_name(self):
+        self.song = self.make_song('songs/Café del Mar #1 100%?.mp3')
+        response = self.stream()
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected/songs/Caf%C3%A9%20del%20Mar%20%231%20100%25%3F.mp3'
+        )
+
+
+class DeletionTests(TemporaryMediaMixin, TestCase):
+    def make_album(self, songs):
+        album = Album.objects.create(title='Album', artist='Artist', release_year=2000)
+        for i in range(songs):
+            song = Song.objects.create(
+                title=f'Song {i}', artist='Artist', album=album,
+                audio_url=SimpleUploadedFile(f'{i}.mp3', b'audio'),
+            )
+            PlayEvent.objects.create(song=song, played_at=timezone.now())
+        return album
+
+    def test_album_delete_queries_do_not_grow_with_songs(self):
+        counts = []
+        for songs in (2, 12):
+            album = self.make_album(songs)
+            with CaptureQueriesContext(connection) as queries:
+                delete_albums(Album.objects.filter(pk=album.pk))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Song.objects.exists())
+        self.assertFalse(PlayEvent.objects.exists())
+        self.assertEqual(
+            Artist.objects.values_list('songs_count', 'albums_count').get(name='Artist'), (0, 0)
+        )
+
+    def test_files_removed_after_commit_unless_shared(self):
+        album = self.make_album(2)
+        shared, removed = album.songs.order_by('id').values_list('audio_url', flat=True)
+        Song.objects.create(title='Single', artist='Artist', audio_url=shared)
+        admin = User.objects.create_user(username='admin', email=settings.ADMIN_EMAIL, password='x')
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        with mock.patch.object(media_cleanup, 'wake') as wake:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.delete(f'/api/albums/{album.id}/', HTTP_HOST='localhost')
+                wake.assert_not_called()
+        wake.assert_called_once_with()
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Album.objects.exists())
+        self.assertEqual(MediaCleanup.objects.get().paths, [shared, removed])
+
+        self.assertEqual(MediaCleanupWorker(interval=0).drain(), (1, 0))
+        storage = Song._meta.get_field('audio_url').storage
+        self.assertTrue(storage.exists(shared))
+        self.assertFalse(storage.exists(removed))
+        self.assertFalse(MediaCleanup.objects.exists())
+
+    def test_files_are_removed_outside_the_queue_lock_and_failures_requeued(self):
+        entry = MediaCleanup.objects.create(paths=['gone.mp3', 'stuck.mp3'])
+        storage = mock.Mock()
+
+        def delete(path):
+            # The entry is taken off the queue before any file is touched
+            self.assertFalse(MediaCleanup.objects.exists())
+            if path == 'stuck.mp3':
+                raise OSError('busy')
+
+        storage.delete.side_effect = delete
+        with self.assertLogs('api.cleanup', 'WARNING'):
+            self.assertEqual(MediaCleanupWorker(interval=0).drain(storage), (1, 1))
+        self.assertEqual(storage.delete.call_count, 2)
+        retry = MediaCleanup.objects.get()
+        self.assertEqual((retry.pk, retry.paths, retry.attempts), (entry.pk, ['stuck.mp3'], 1))
+
+    def test_song_delete_recounts_album(self):
+        album = self.make_album(3)
+        delete_songs(Song.objects.filter(album=album, title='Song 0'))
+        album.refresh_from_db()
+        self.assertEqual(album.songs_count, 2)
+
+    def test_protected_and_restricted_dependents_block_the_delete(self):
+        album = self.make_album(2)
+        relation = PlayEvent._meta.get_field('song').remote_field
+        for on_delete, error in ((models.PROTECT, ProtectedError), (models.RESTRICT, RestrictedError)):
+            with self.subTest(on_delete=on_delete.__name__), mock.patch.object(relation, 'on_delete', on_delete):
+                with self.assertRaises(error):
+                    delete_albums(Album.objects.filter(pk=album.pk))
+                self.assertEqual(Song.objects.filter(album=album).count(), 2)
+                self.assertEqual(PlayEvent.objects.count(), 2)
+
+
+class ConditionalTests(TestCase):
+    def setUp(self):
+        self.song = Song.objects.create(title='Song', artist='Artist', duration=180)
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/songs/', HTTP_HOST='localhost', **headers)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_song_writes_change_the_etag(self):
+        writes = [
+            lambda: Song.objects.create(title='New', artist='Artist', duration=60),
+            lambda: Song.objects.filter(pk=self.song.pk).update(title='Renamed'),
+            lambda: self.song.delete(),
+            lambda: delete_songs(Song.objects.all()),
+        ]
+        for write in writes:
+            etag = self.get()['ETag']
+            version = CatalogVersion.current()[0]
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertEqual(CatalogVersion.current()[0], version + 1)
+            self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_one_bump_per_transaction_even_after_a_rollback(self):
+        version = CatalogVersion.current()[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        Song.objects.create(title='Rolled back', artist='Artist', duration=60)
+                        raise ValueError
+                except ValueError:
+                    pass
+                Song.objects.create(title='A', artist='Artist', duration=60)
+                Song.objects.create(title='B', artist='Artist', duration=60)
+        self.assertEqual(CatalogVersion.current()[0], version + 1)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        cache_counters.reset()
+        self.song = Song.objects.create(title='Song', artist='Artist', duration=180)
+
+    def get(self, url):
+        return self.client.get(url, HTTP_HOST='localhost')
+
+    def test_miss_then_hit(self):
+        first = self.get('/api/songs/')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.get('/api/songs/')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(len(queries), 1, 'only the catalog version is read')
+        self.assertEqual(first.content, second.content)
+        snapshot = cache_counters.snapshot()
+        self.assertEqual((snapshot['hits'], snapshot['misses'], snapshot['hit_ratio']), (1, 1, 0.5))
+        self.assertEqual(snapshot['endpoints']['song-list'], {'hits': 1, 'misses': 1})
+
+    def test_catalog_write_invalidates(self):
+        self.get(f'/api/songs/{self.song.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Song.objects.filter(pk=self.song.pk).update(title='Renamed')
+        response = self.get(f'/api/songs/{self.song.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['title'], 'Renamed')
+
+    def test_query_strings_get_their_own_entries(self):
+        urls = ['/api/songs/', '/api/songs/?fields=id', '/api/songs/?fields=title', '/api/songs/?page_size=1']
+        self.assertEqual([self.get(url)['X-Cache'] for url in urls], ['MISS'] * len(urls))
+        self.assertEqual(list(self.get('/api/songs/?fields=id').json()['results'][0]), ['id'])
+        self.assertEqual(list(self.get('/api/songs/?fields=title').json()['results'][0]), ['title'])
+
+
+class AuthenticationTests(TestCase):
+    def setUp(self):
+        self.cache = caches[settings.AUTH_CACHE_ALIAS]
+        self.cache.clear()
+        self.user = User.objects.create_user(
+            username='listener', email='listener@example.com', password='secret'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def is_cached(self, key=None):
+        return self.cache.get(_token_cache_key(key or self.token.key)) is not None
+
+    def check(self, authorization):
+        return self.client.get('/api/admin/check/', HTTP_HOST='localhost', HTTP_AUTHORIZATION=authorization)
+
+    def test_resolution_is_cached_without_the_password_hash(self):
+        self.assertEqual(resolve_token(self.token.key)[0], self.user)
+        with self.assertNumQueries(0):
+            user, _ = resolve_token(self.token.key)
+        self.assertEqual(user.email, self.user.email)
+        _, values = self.cache.get(_token_cache_key(self.token.key))
+        self.assertNotIn('password', values)
+        self.assertNotIn(self.user.password, repr(values))
+
+    def test_writes_that_change_access_evict_the_cached_user(self):
+        def change_password():
+            self.user.set_password('changed')
+            self.user.save()
+
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        for write in (self.token.delete, change_password, deactivate):
+            key = Token.objects.get_or_create(user=self.user)[0].key
+            resolve_token(key)
+            self.assertTrue(self.is_cached(key))
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertFalse(self.is_cached(key))
+
+    def test_login_keeps_the_cached_user(self):
+        resolve_token(self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.user)
+        self.assertTrue(self.is_cached())
+
+    def test_signed_tokens(self):
+        access = issue_access_token(self.user)
+        self.assertEqual(self.check(f'Bearer {access}').status_code, 403, 'authenticated, not an admin')
+
+        tampered = access[:-2] + ('aa' if not access.endswith('aa') else 'bb')
+        response = self.check(f'Bearer {tampered}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            response = self.check(f'Bearer {access}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Access token expired.')
+
+
+class PaginationTests(TestCase):
+    def walk(self, client, url):
+        """Ids of every page following next links, then back through previous links"""
+        pages = []
+        while url:
+            body = client.get(url, HTTP_HOST='localhost').json()
+            pages.append([row['id'] for row in body['results']])
+            url, previous = body['next'], body['previous']
+        backwards = []
+        while previous:
+            body = client.get(previous, HTTP_HOST='localhost').json()
+            backwards.insert(0, [row['id'] for row in body['results']])
+            previous = body['previous']
+        self.assertEqual(backwards, pages[:-1], 'previous links retrace the same pages')
+        return [row_id for page in pages for row_id in page]
+
+    def test_ties_on_the_leading_key_are_paged_through_once(self):
+        songs = [Song.objects.create(title=f'Song {i}', artist='Artist', duration=60) for i in range(7)]
+        Song.objects.update(created_at=timezone.now())
+        ids = self.walk(self.client, '/api/songs/?page_size=2')
+        self.assertEqual(ids, sorted((song.id for song in songs), reverse=True))
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        page = self.client.get('/api/songs/?page_size=1', HTTP_HOST='localhost')
+        valid = page.json()['next'] or '/api/songs/?cursor=cD0lNUIlNUQ%3D'
+        for url in ('/api/songs/?cursor=garbage', '/api/songs/?cursor=cD0lNUIlNUQ%3D', valid + 'x'):
+            self.assertEqual(self.client.get(url, HTTP_HOST='localhost').status_code, 400, url)
+
+    def test_conversations_without_messages_come_last_once(self):
+        user = User.objects.create_user(username='reader', email='reader@example.com', password='x')
+        peers = [
+            User.objects.create_user(username=f'peer{i}', email=f'peer{i}@example.com', password='x')
+            for i in range(7)
+        ]
+        now = timezone.now()
+        times = [now, now, None, now - timezone.timedelta(hours=1), None, None, now]
+        conversations = [
+            Conversation.objects.create(user=user, peer=peer, last_message_at=at)
+            for peer, at in zip(peers, times)
+        ]
+        client = APIClient()
+        client.force_authenticate(user)
+        ids = self.walk(client, '/api/messages/inbox/?page_size=2')
+
+        expected = sorted(
+            conversations,
+            key=lambda row: (row.last_message_at is None, -(row.last_message_at or now).timestamp(), -row.id),
+        )
+        self.assertEqual(ids, [row.id for row in expected])
+
+
+class QueryShapeTests(TestCase):
+    def test_shapes_ignore_parameters(self):
+        self.assertEqual(
+            query_shape('SELECT "t2"."id" FROM "t2" WHERE "t2"."name" = \'it\'\'s\' AND "t2"."id" IN (1, 2, 3)'),
+            'SELECT "t2"."id" FROM "t2" WHERE "t2"."name" = ? AND "t2"."id" IN (...)',
+        )
+        statements = [f'SELECT * FROM "albums" WHERE "albums"."id" = {pk} LIMIT 21' for pk in range(3)]
+        self.assertEqual(repeated_queries(statements), {'SELECT * FROM "albums" WHERE "albums"."id" = ? LIMIT ?': 3})
+        self.assertEqual(repeated_queries(statements[:2]), {})
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query budgets of the read endpoints, on a generated catalog"""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate(songs=150, albums=12, artists=6, users=12, messages=600, seed=7, workers=1)
+        rebuild_conversations()
+        search_index.load()
+        cls.album = Album.objects.annotate(n=Count('songs')).latest('n')
+        cls.song = cls.album.songs.first()
+        cls.artist = Artist.objects.annotate(n=Count('songs')).latest('n')
+        cls.user = User.objects.annotate(n=Count('sent_messages')).latest('n')
+        cls.peer = (
+            User.objects.exclude(id=cls.user.id)
+            .annotate(n=Count('received_messages', filter=Q(received_messages__sender=cls.user)))
+            .latest('n')
+        )
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.force_authenticate(self.user)
+
+    def test_catalog_budgets(self):
+        for url, budget, size_param in (
+            ('/api/songs/', 2, 'page_size'),
+            (f'/api/songs/{self.song.id}/', 2, None),
+            ('/api/songs/featured/', 2, None),
+            ('/api/songs/trending/', 2, None),
+            ('/api/songs/made-for-you/', 1, None),
+            ('/api/albums/', 2, 'page_size'),
+            (f'/api/albums/{self.album.id}/', 3, None),
+            ('/api/artists/', 2, 'page_size'),
+            (f'/api/artists/{self.artist.id}/', 3, None),
+            (f'/api/artists/{self.artist.id}/songs/', 3, 'page_size'),
+            ('/api/search/?q=a', 3, 'limit'),
+        ):
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.anonymous, url, budget, size_param)
+
+    def test_user_budgets(self):
+        for url, budget, size_param in (
+            ('/api/users/', 1, 'page_size'),
+            (f'/api/users/{self.peer.id}/messages/', 3, 'limit'),
+            ('/api/messages/', 1, 'page_size'),
+            ('/api/messages/inbox/', 1, 'page_size'),
+            ('/api/songs/made-for-you/', 2, None),
+        ):
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.authenticated, url, budget, size_param)
+
+    def test_detector_flags_per_row_queries(self):
+        songs = Song.objects.filter(album__isnull=False)[:5]
+        with CaptureQueriesContext(connection) as queries:
+            [SongSerializer(song).data for song in songs]
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(list(repeated_queries(statements).values()), [5])
+
+
+class SamplingPoolTests(SimpleTestCase):
+    def test_discard_tombstones_until_compaction(self):
+        pool = SongSamplingPool(ttl=None)
+        pool.load([1, 2, 3, 4, 5, 3, 7, 8, 9, 10])
+        pool.discard(2)
+        pool.discard_many([5, 11])
+        pool.add(6)
+        pool.add(6)
+        pool.add(5)
+        self.assertEqual(list(pool._ids), [1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(pool._removed, {2})
+        self.assertEqual(len(pool), 9)
+        self.assertEqual(sorted(pool.draw(20)), [1, 3, 4, 5, 6, 7, 8, 9, 10])
+
+        pool.discard_many([7, 8])
+        self.assertEqual(list(pool._ids), [1, 3, 4, 5, 6, 9, 10], 'a quarter tombstoned compacts')
+        self.assertEqual(pool._removed, set())
+
+    def test_draws_skip_tombstones(self):
+        pool = SongSamplingPool(ttl=None)
+        pool.load(range(1, 1001))
+        pool.discard_many(range(1, 201))
+        for _ in range(50):
+            drawn = pool.draw(6)
+            self.assertEqual(len(set(drawn)), 6)
+            self.assertTrue(all(song_id > 200 for song_id in drawn))
+
+
+class PlayEventBufferTests(TestCase):
+    def setUp(self):
+        self.song = Song.objects.create(title='Song', artist='Artist', duration=180)
+        self.user = User.objects.create_user(username='listener', email='listener@example.com', password='x')
+
+    def test_flush_drops_only_plays_of_missing_songs_and_users(self):
+        buffer = PlayEventBuffer(max_size=100, flush_interval=None)
+        buffer.record(self.song.id, self.user.id)
+        buffer.record(self.song.id)
+        buffer.record(self.song.id + 1000)
+        buffer.record(self.song.id, self.user.id + 1000)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(PlayEvent.objects.count(), 2)
+        self.assertEqual(len(buffer), 0)
+
+    def test_flushes_fold_into_play_stats(self):
+        buffer = PlayEventBuffer(max_size=100, flush_interval=None)
+        times = [timezone.now() - timezone.timedelta(hours=hours) for hours in (30, 5, 1)]
+        buffer.record(self.song.id, played_at=times[0])
+        buffer.flush()
+        buffer.record(self.song.id, played_at=times[1])
+        buffer.record(self.song.id, played_at=times[2])
+        buffer.flush()
+        stats = SongPlayStats.objects.get(song=self.song)
+        self.assertEqual(stats.play_count, 3)
+        self.assertEqual(stats.last_played_at, times[2])
+        self.assertAlmostEqual(stats.trending_score, logsumexp([play_weight(t) for t in times]))
+
+    def test_an_older_batch_flushed_late_keeps_the_latest_play(self):
+        buffer = PlayEventBuffer(max_size=100, flush_interval=None)
+        newer, older = timezone.now(), timezone.now() - timezone.timedelta(hours=2)
+        buffer.record(self.song.id, played_at=newer)
+        buffer.flush()
+        buffer.record(self.song.id, played_at=older)
+        buffer.flush()
+        stats = SongPlayStats.objects.get(song=self.song)
+        self.assertEqual(stats.play_count, 2)
+        self.assertEqual(stats.last_played_at, newer)
+
+    def test_failed_flush_requeues_the_batch(self):
+        buffer = PlayEventBuffer(max_size=100, flush_interval=None)
+        buffer.record(self.song.id)
+        buffer.record(self.song.id)
+        with mock.patch.object(PlayEvent.objects, 'bulk_create', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                buffer.flush()
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(PlayEvent.objects.count(), 2)
+
+    def test_full_buffer_flushes_in_the_caller_then_refuses(self):
+        buffer = PlayEventBuffer(max_size=2, flush_interval=3600, max_pending=2)
+        with mock.patch.object(buffer, '_ensure_worker'):
+            self.assertTrue(buffer.record(self.song.id))
+            self.assertTrue(buffer.record(self.song.id))
+            self.assertTrue(buffer.record(self.song.id))
+            self.assertEqual(PlayEvent.objects.count(), 2)
+            self.assertEqual(len(buffer), 1)
+            buffer.record(self.song.id)
+            with mock.patch.object(PlayEvent.objects, 'bulk_create', side_effect=OperationalError):
+                self.assertFalse(buffer.record(self.song.id))
+        self.assertEqual(len(buffer), 2)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.songs = [
+            Song.objects.create(title=f'Song {i}', artist='Artist', duration=180) for i in range(4)
+        ]
+        self.users = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='x')
+            for i in range(3)
+        ]
+
+    def play(self, user, *songs):
+        PlayEvent.objects.bulk_create(
+            PlayEvent(user=user, song=song, played_at=timezone.now()) for song in songs
+        )
+
+    def neighbors(self, song):
+        return set(SongNeighbor.objects.filter(song=song).values_list('neighbor_id', flat=True))
+
+    def test_incremental_sync_advances_the_mark_and_refreshes_co_listened_songs(self):
+        a, b, c, d = self.songs
+        self.play(self.users[0], a, b)
+        self.play(self.users[1], c, d)
+        build_neighbors(sync_interactions(full=True))
+        self.assertEqual(self.neighbors(c), {d.id})
+
+        # A new listener of b and c: a's list doesn't change, c's gains b
+        self.play(self.users[2], b, c)
+        touched = sync_interactions()
+        self.assertEqual(touched, {b.id, c.id})
+        last_play = PlayEvent.objects.latest('id').id
+        self.assertEqual(RecommendationState.objects.get().last_event_id, last_play)
+        self.assertEqual(sync_interactions(), set())
+        self.assertEqual(build_neighbors(touched), 4)
+        self.assertEqual(self.neighbors(c), {b.id, d.id})
+        self.assertEqual(self.neighbors(a), {b.id})
+
+    def test_incremental_build_matches_a_full_one_and_reads_only_the_neighbourhood(self):
+        users = self.users + [
+            User.objects.create_user(username=f'extra{i}', email=f'extra{i}@example.com', password='x')
+            for i in range(3)
+        ]
+        songs = self.songs + [
+            Song.objects.create(title=f'Other {i}', artist='Artist', duration=180) for i in range(4)
+        ]
+        a, b, c, d, e, f, g, h = songs
+        self.play(users[0], a, a, b, c)
+        self.play(users[1], b, c, c, c, d)
+        self.play(users[2], d, e)
+        self.play(users[3], e, e, f)
+        self.play(users[4], g, h)
+        build_neighbors(sync_interactions(full=True))
+
+        self.play(users[5], a, b, b)
+        touched = sync_interactions()
+        loaded = []
+
+        def fromiter(*args, **kwargs):
+            loaded.append(real_fromiter(*args, **kwargs))
+            return loaded[-1]
+
+        real_fromiter = numpy.fromiter
+        with mock.patch('numpy.fromiter', fromiter):
+            self.assertEqual(build_neighbors(touched), 4)
+        self.assertEqual(
+            set(loaded[0].reshape(-1, 3)[:, 0].tolist()),
+            {users[0].id, users[1].id, users[2].id, users[5].id},
+            'listeners unconnected to the new plays are not read',
+        )
+        incremental = sorted(SongNeighbor.objects.values_list('song_id', 'neighbor_id', 'score'))
+
+        build_neighbors()
+        full = sorted(SongNeighbor.objects.values_list('song_id', 'neighbor_id', 'score'))
+        self.assertEqual([row[:2] for row in incremental], [row[:2] for row in full])
+        for (_, _, got), (_, _, expected) in zip(incremental, full):
+            self.assertAlmostEqual(got, expected, places=5)
+
+    def test_full_rebuild_drops_lists_of_songs_without_plays(self):
+        a, b, c, _ = self.songs
+        self.play(self.users[0], a, b, c)
+        build_neighbors(sync_interactions(full=True))
+        UserSongInteraction.objects.filter(song=c).delete()
+        PlayEvent.objects.filter(song=c).delete()
+        sync_interactions(full=True)
+        build_neighbors()
+        self.assertFalse(SongNeighbor.objects.filter(song=c).exists())
+        self.assertEqual(self.neighbors(a), {b.id})
+
+
+class CounterSaveTests(TestCase):
+    def test_saving_a_loaded_instance_keeps_counters_updated_since(self):
+        album = Album.objects.create(title='Album', artist='Artist', release_year=2024)
+        loaded_album = Album.objects.get(pk=album.pk)
+        loaded_artist = Artist.objects.get(name='Artist')
+        Song.objects.create(title='Song', artist='Artist', album=album, duration=180)
+
+        loaded_album.title = 'Renamed'
+        loaded_album.save()
+        loaded_artist.save()
+        album.refresh_from_db()
+        self.assertEqual((album.title, album.songs_count), ('Renamed', 1))
+        counts = Artist.objects.values_list('songs_count', 'albums_count').get(name='Artist')
+        self.assertEqual(counts, (1, 1))
+
+
+class MessageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', email='me@example.com', password='x')
+        self.peer = User.objects.create_user(username='peer', email='peer@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, count):
+        return [
+            Message.objects.create(
+                sender=self.user if i % 2 else self.peer,
+                receiver=self.peer if i % 2 else self.user,
+                content=f'Message {i}',
+            ).id
+            for i in range(count)
+        ]
+
+    def test_window_between_since_and_before(self):
+        ids = self.send(10)
+        url = f'/api/users/{self.peer.id}/messages/'
+        response = self.client.get(url, {'since': ids[2], 'before': ids[7]})
+        self.assertEqual([message['id'] for message in response.json()], ids[3:7])
+        response = self.client.get(url, {'since': ids[2], 'before': ids[7], 'limit': 2})
+        self.assertEqual([message['id'] for message in response.json()], ids[3:5])
+
+    def test_inbox_keeps_the_newest_message_when_an_older_one_commits_late(self):
+        first, second = self.send(2)
+        record_message(Message.objects.get(id=first))
+        inbox = Conversation.objects.get(user=self.user, peer=self.peer)
+        self.assertEqual(inbox.last_message_id, second)
+        self.assertEqual(Conversation.objects.get(user=self.peer, peer=self.user).last_message_id, second)
+
+    def test_rebuild_looks_up_latest_messages_in_batches(self):
+        third = User.objects.create_user(username='third', email='third@example.com', password='x')
+        self.send(5)
+        Message.objects.create(sender=third, receiver=self.user, content='Hello')
+        Message.objects.create(sender=self.peer, receiver=third, content='Hi')
+        columns = ('user_id', 'peer_id', 'last_message_id', 'last_message_at', 'unread_count')
+        expected = set(Conversation.objects.values_list(*columns))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rebuild_conversations(batch_size=2), 6)
+        lookups = [query['sql'] for query in queries if '"created_at"' in query['sql']]
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(set(Conversation.objects.values_list(*columns)), expected)
+
+    def test_read_with_a_non_object_body_is_rejected(self):
+        response = self.client.post(f'/api/users/{self.peer.id}/messages/read/', [1, 2], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='me', email='me@example.com', password='x')
+        self.peer = User.objects.create_user(username='peer', email='peer@example.com', password='x')
+        self.token = Token.objects.create(user=self.user)
+        patcher = mock.patch('api.realtime.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def open_socket(self, query_string):
+        """Drive the ASGI app with plain queues; returns (inbox, outbox, task)"""
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        await inbox.put({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': '/ws/messages/', 'query_string': query_string}
+        task = asyncio.ensure_future(websocket_application(scope, inbox.get, outbox.put))
+        return inbox, outbox, task
+
+    async def test_missing_or_bad_token_is_rejected(self):
+        for query_string in (b'', b'token=', b'token=wrong'):
+            _, outbox, task = await self.open_socket(query_string)
+            await asyncio.wait_for(task, 5)
+            self.assertEqual(outbox.get_nowait(), {'type': 'websocket.close', 'code': 4401})
+            self.assertTrue(outbox.empty())
+
+    async def test_accepted_socket_receives_its_channel_until_disconnect(self):
+        channel = user_channel(self.user.id)
+        inbox, outbox, task = await self.open_socket(f'token={self.token.key}'.encode())
+        self.assertEqual(await asyncio.wait_for(outbox.get(), 5), {'type': 'websocket.accept'})
+        self.assertEqual(broker.subscriber_count(channel), 1)
+
+        broker.publish(user_channel(self.peer.id), {'id': 1})
+        broker.publish(channel, {'id': 2})
+        sent = await asyncio.wait_for(outbox.get(), 5)
+        self.assertEqual(json.loads(sent['text']), {'type': 'message', 'message': {'id': 2}})
+
+        await inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(broker.subscriber_count(channel), 0)
+
+    def test_new_message_is_published_only_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch('api.views.broker.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = client.post(
+                    '/api/messages/', {'sender': self.user.id, 'receiver': self.peer.id, 'content': 'hi'},
+                    format='json',
+                )
+                self.assertEqual(response.status_code, 201)
+                publish.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        published = {call.args[0]: call.args[1] for call in publish.call_args_list}
+        self.assertEqual(set(published), {user_channel(self.user.id), user_channel(self.peer.id)})
+        self.assertEqual(published[user_channel(self.peer.id)]['id'], response.json()['id'])
+
+    async def test_in_memory_broker_fans_out_and_unsubscribes(self):
+        local = InMemoryBroker()
+        first, second = local.subscribe('user:1'), local.subscribe('user:1')
+        other = local.subscribe('user:2')
+        local.publish('user:1', {'id': 1})
+        self.assertEqual(await asyncio.wait_for(first.get(), 5), {'id': 1})
+        self.assertEqual(await asyncio.wait_for(second.get(), 5), {'id': 1})
+        self.assertTrue(other._queue.empty())
+
+        first.close()
+        self.assertEqual(local.subscriber_count('user:1'), 1)
+        local.publish('user:1', {'id': 2})
+        self.assertEqual(await asyncio.wait_for(second.get(), 5), {'id': 2})
+        self.assertTrue(first._queue.empty())
+        second.close()
+        other.close()
+        self.assertEqual(local.subscriber_count(), 0)
+
+    async def test_relay_round_trips_line_json_envelopes(self):
+        relay = RelayCommand()
+        relay.subscribers = set()
+        handlers = []
+
+        async def handle_client(reader, writer):
+            handlers.append(asyncio.current_task())
+            await relay.handle_client(reader, writer)
+
+        server = await asyncio.start_server(handle_client, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        publisher = RelayBroker(f'127.0.0.1:{port}')
+        try:
+            writer.write(SUBSCRIBE_LINE)
+            await writer.drain()
+            for _ in range(100):
+                if relay.subscribers:
+                    break
+                await asyncio.sleep(0.01)
+
+            publisher._connection().sendall(b'not json\n')
+            publisher.publish('user:7', {'content': 'café\nnext line'})
+            line = await asyncio.wait_for(reader.readline(), 5)
+            self.assertEqual(
+                json.loads(line), {'channel': 'user:7', 'message': {'content': 'café\nnext line'}}
+            )
+        finally:
+            publisher._reset()
+            writer.close()
+            await asyncio.wait_for(asyncio.gather(*handlers), 5)
+            server.close()
+            await server.wait_closed()
+
+
+class SearchTests(TestCase):
+    def test_database_answers_until_the_index_is_built(self):
+        Song.objects.create(title='Bohemian Rhapsody', artist='Queen', duration=354)
+        index = SearchIndex()
+        with mock.patch.object(index, '_ensure_loaded'):
+            results = index.search('que')
+        self.assertEqual([song.title for song in results['songs']], ['Bohemian Rhapsody'])
+        self.assertEqual([artist.name for artist in results['artists']], ['Queen'])
+
+        index.load()
+        results = index.search('que')
+        self.assertEqual([song.title for song in results['songs']], ['Bohemian Rhapsody'])
+        self.assertEqual([artist.name for artist in results['artists']], ['Queen'])
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def test_postings_stay_sorted_through_updates(self):
+        index = PrefixIndex.build([(5, 'Love Song'), (2, 'Love Me Do'), (9, 'Love Love Love')])
+        self.assertEqual(list(index._postings['love']), [2, 5, 9])
+        index.add(7, 'Love Story')
+        index.add(12, 'Love Again')
+        index.add(7, 'Love Story')
+        self.assertEqual(list(index._postings['love']), [2, 5, 7, 9, 12])
+
+        index.remove(5, 'Love Song')
+        index.remove(5, 'Love Song')
+        index.remove(3, 'Love')
+        self.assertEqual(list(index._postings['love']), [2, 7, 9, 12])
+        self.assertNotIn('song', index._postings)
+        self.assertEqual(index.candidates(['lov', 'st'], 10), [7])
+
+        index.replace(7, 'Love Story', 'Love Stories')
+        self.assertEqual(list(index._postings['love']), [2, 7, 9, 12])
+        self.assertNotIn('story', index._postings)
+        self.assertEqual(list(index._postings['stories']), [7])
+
+
+class PlatformStatsTests(TestCase):
+    def totals(self):
+        return PlatformStats.objects.values_list('total_songs', 'total_albums', 'total_artists').get()
+
+    def test_queryset_delete_uncounts_each_artist_once(self):
+        for i in range(3):
+            Song.objects.create(title=f'Solo {i}', artist='Solo', duration=180)
+        Song.objects.create(title='Other', artist='Other', duration=180)
+        reconcile_stats()
+        Song.objects.filter(artist='Solo').delete()
+        self.assertEqual(self.totals(), (1, 0, 1))
+
+    def test_album_delete_uncounts_the_artists_of_its_songs(self):
+        album = Album.objects.create(title='Compilation', artist='Various', release_year=2024)
+        for artist in ('One', 'Two', 'Two'):
+            Song.objects.create(title=f'{artist} song', artist=artist, album=album, duration=180)
+        Song.objects.create(title='Single', artist='One', duration=180)
+        reconcile_stats()
+        album.delete()
+        self.assertEqual(self.totals(), (1, 0, 1))
+
+        Album.objects.create(title='Other', artist='Three', release_year=2024)
+        Album.objects.all().delete()
+        self.assertEqual(self.totals(), (1, 0, 1))
+
+    @override_settings(STATS_ARTIST_COUNT='approximate')
+    def test_approximate_artists_are_folded_into_the_sketch_on_commit(self):
+        Song.objects.create(title='Seed', artist='Seed', duration=180)
+        sketch = reconcile_stats().artist_sketch
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(40):
+                Song.objects.create(title=f'Song {i}', artist=f'Artist {i % 20}', duration=180)
+            Album.objects.create(title='Album', artist='Album artist', release_year=2024)
+            self.assertEqual(bytes(PlatformStats.objects.get().artist_sketch), bytes(sketch))
+        self.assertEqual(get_platform_stats()['total_artists'], compute_stats()['total_artists'])
+        self.assertEqual(compute_stats()['total_artists'], 22)
+
+
+class ArtistTests(TestCase):
+    def test_rename_is_normalized_and_keeps_credits_on_the_same_artist(self):
+        Song.objects.create(title='Song', artist='Queen', duration=180)
+        Album.objects.create(title='Album', artist='Queen', release_year=1975)
+        artist = Artist.objects.get(name='Queen')
+        artist.name = '  Queen   Live '
+        artist.save()
+
+        self.assertEqual(list(Artist.objects.values_list('name', 'songs_count', 'albums_count')), [
+            ('Queen Live', 1, 1),
+        ])
+        songs = Song.objects.values_list('artist', 'artist_ref')
+        self.assertEqual(list(songs), [('Queen Live', artist.id)])
+        Song.objects.create(title='Another', artist='Queen Live', duration=180)
+        self.assertEqual(Artist.objects.get().songs_count, 2)
+
+    def test_queryset_delete_recounts_artists(self):
+        album = Album.objects.create(title='Album', artist='Queen', release_year=1975)
+        for i in range(3):
+            Song.objects.create(title=f'Song {i}', artist='Queen', album=album, duration=180)
+        Song.objects.filter(title__in=['Song 0', 'Song 1']).delete()
+        self.assertEqual(Artist.objects.values_list('songs_count', 'albums_count').get(), (1, 1))
+        Album.objects.all().delete()
+        self.assertEqual(Artist.objects.values_list('songs_count', 'albums_count').get(), (0, 0))
+
+
+class ImportCatalogTests(TestCase):
+    def test_blank_album_artist_falls_back_to_the_song_artist(self):
+        Album.objects.create(title='Album', artist='Queen', release_year=1975)
+        rows = [
+            {'title': 'One', 'artist': 'Queen', 'album_title': 'Album', 'album_artist': '   '},
+            {'title': 'Two', 'artist': 'Queen', 'album_title': 'Album'},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as source:
+            source.write(''.join(json.dumps(row) + '\n' for row in rows))
+            source.flush()
+            call_command(
+                'import_catalog', source.name, kind='songs', stdout=io.StringIO(), stderr=io.StringIO()
+            )
+        self.assertEqual(Album.objects.get().songs.count(), 2)
+
+    def test_upsert_updates_changed_rows_by_natural_key(self):
+        Album.objects.create(title='Same', artist='Queen', release_year=1975)
+        Album.objects.create(title='Changed', artist='Queen', release_year=1975)
+        rows = [
+            {'title': 'Same', 'artist': 'Queen', 'release_year': 1975},
+            {'title': 'Changed', 'artist': 'Queen', 'release_year': 1977},
+            {'title': 'New', 'artist': 'Queen', 'release_year': 1980},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as source:
+            source.write(''.join(json.dumps(row) + '\n' for row in rows))
+            source.flush()
+            out = io.StringIO()
+            call_command('import_catalog', source.name, kind='albums', upsert=True, stdout=out)
+        self.assertIn('1 created, 1 updated, 1 unchanged', out.getvalue())
+        self.assertEqual(
+            dict(Album.objects.values_list('title', 'release_year')), {'Same': 1975, 'Changed': 1977, 'New': 1980}
+        )
+
+
+class RequestMetricsTests(TestCase):
+    def test_shards_of_exited_threads_are_folded(self):
+        metrics = RequestMetrics()
+
+        def record():
+            metrics.observe('song-list', 'list', 'GET', 200, 0.02, 2, 0.001)
+
+        for _ in range(5):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        record()
+
+        series = metrics.snapshot()[('song-list', 'list', 'GET')]
+        self.assertEqual((series.count, series.queries, series.statuses), (6, 12, {200: 6}))
+        self.assertEqual(len(metrics._shards), 1)
+
+    def test_requests_are_recorded_per_view_and_exported(self):
+        Song.objects.create(title='Song', artist='Artist', duration=180)
+        admin = User.objects.create_user(username='admin', email=settings.ADMIN_EMAIL, password='x')
+        client = APIClient()
+        client.force_authenticate(admin)
+        request_metrics.reset()
+        self.assertEqual(client.get('/api/songs/', HTTP_HOST='localhost').status_code, 200)
+        self.assertEqual(client.get('/api/songs/0/', HTTP_HOST='localhost').status_code, 404)
+
+        response = client.get('/api/metrics/', HTTP_HOST='localhost')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        listed = 'view="song-list",action="list",method="GET"'
+        self.assertIn(f'http_requests_total{{{listed},status="200"}} 1', lines)
+        self.assertIn(
+            'http_requests_total{view="song-detail",action="retrieve",method="GET",status="404"} 1', lines
+        )
+        self.assertIn(f'http_request_duration_seconds_bucket{{{listed},le="+Inf"}} 1', lines)
+        counted = next(line for line in lines if line.startswith(f'db_queries_total{{{listed}}}'))
+        self.assertGreater(int(counted.split()[-1]), 0)
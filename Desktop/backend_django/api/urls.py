@@ -7,6 +7,7 @@ router = DefaultRouter()
 router.register(r'users', views.UserViewSet, basename='user')
 router.register(r'songs', views.SongViewSet, basename='song')
 router.register(r'albums', views.AlbumViewSet, basename='album')
+router.register(r'artists', views.ArtistViewSet, basename='artist')
 router.register(r'messages', views.MessageViewSet, basename='message')
 
 urlpatterns = [
@@ -15,5 +16,9 @@ urlpatterns = [
 
     # Custom endpoints
     path('admin/check/', views.check_admin, name='check-admin'),
+    path('auth/access-token/', views.create_access_token, name='access-token'),
+    path('search/', views.search, name='search'),
     path('stats/', views.get_stats, name='stats'),
+    path('stats/cache/', views.get_cache_stats, name='cache-stats'),
+    path('metrics/', views.get_metrics, name='metrics'),
 ]
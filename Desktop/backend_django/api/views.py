@@ -2,20 +2,52 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import F, Q, Count
 from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
-from .models import User, Song, Album, Message
+from .models import User, Artist, Song, SongWaveform, Album, Message, Conversation
 from .serializers import (
     UserSerializer,
     SongSerializer,
     SongListSerializer,
     AlbumSerializer,
     AlbumDetailSerializer,
+    ArtistSerializer,
+    ArtistDetailSerializer,
     MessageSerializer,
+    ConversationSerializer,
     StatsSerializer,
 )
 from .permissions import IsAdminUser
+from .pagination import (
+    ArtistPagination,
+    ConversationPagination,
+    KeysetPagination,
+    MessagePagination,
+    UserPagination,
+)
+from .sampling import song_pool
+from .plays import play_buffer
+from .recommendations import recommend_songs
+from .pubsub import broker, user_channel
+from .inbox import mark_read
+from .streaming import stream_file_field
+from .conditional import CatalogConditionalMixin
+from .cache import CatalogCacheMixin, cache_counters, cached_response, catalog_cached
+from .fastpath import ValuesListMixin, ValuesSerializer
+from .fieldsets import SparseFieldsetMixin
+from .search import KINDS as SEARCH_KINDS, search_index
+from .audio import unpack_peaks
+from .deletion import delete_albums, delete_songs
+from .renderers import FastJSONRenderer, WaveformRenderer
+from .stats import get_platform_stats
+from .metrics import request_metrics
+from .authentication import SignedTokenAuthentication, issue_access_token
 
 
 # ==================== AUTH VIEWS ====================
@@ -33,18 +65,82 @@ def check_admin(request):
     return Response({"error": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def create_access_token(request):
+    """
+    POST /api/auth/access-token/ - Short-lived signed access token, sent as
+    "Authorization: Bearer <access>" and verified without a database lookup.
+    """
+    if isinstance(request.successful_authenticator, SignedTokenAuthentication):
+        # Otherwise a stolen access token could be renewed forever
+        return Response(
+            {"error": "Use your API token or session to get a new access token"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    return Response({
+        "access": issue_access_token(request.user),
+        "token_type": "Bearer",
+        "expires_in": settings.ACCESS_TOKEN_LIFETIME,
+    })
+
+
 # ==================== USER VIEWS ====================
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+MESSAGE_WINDOW = 50
+MAX_MESSAGE_WINDOW = 200
+
+
+def _optional_int(params, name):
+    if not hasattr(params, "get"):
+        raise ValueError("Request body must be a JSON object")
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def _conversation_window(user, other_user, since=None, before=None, limit=MESSAGE_WINDOW):
+    """
+    Messages between two users after ``since`` and/or before ``before`` (or
+    the latest ones), oldest first. With ``since`` the window starts right
+    after it, otherwise it ends right before ``before``.
+    Each direction is read separately with an id-ordered LIMIT on the
+    (sender, receiver, id) index and the two windows are merged, so the
+    cost depends on ``limit`` rather than on the length of the conversation.
+    """
+    messages = []
+    for sender, receiver in ((user, other_user), (other_user, user)):
+        queryset = Message.objects.filter(sender=sender, receiver=receiver).select_related(
+            "sender", "receiver"
+        )
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        if since is not None:
+            queryset = queryset.filter(id__gt=since).order_by("id")
+        else:
+            queryset = queryset.order_by("-id")
+        messages.extend(queryset[:limit])
+
+    messages.sort(key=lambda message: message.id)
+    return messages[:limit] if since is not None else messages[-limit:]
+
+
+class UserViewSet(SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for retrieving users.
     GET /api/users/ - Get all users except the authenticated user
+    GET /api/users/?fields=id,full_name - Only the listed fields (or ?exclude=)
     """
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = UserPagination
 
     def get_queryset(self):
         """Exclude the authenticated user from the results"""
@@ -53,32 +149,111 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=["get"], url_path="messages")
     def get_messages(self, request, pk=None):
         """
-        Get all messages between authenticated user and specified user.
-        GET /api/users/{id}/messages/
+        Get a window of messages between authenticated user and specified user,
+        oldest first.
+        GET /api/users/{id}/messages/ - latest messages
+        GET /api/users/{id}/messages/?since=<message id> - newer messages (polling)
+        GET /api/users/{id}/messages/?before=<message id> - older messages (scrollback)
+        GET /api/users/{id}/messages/?since=<id>&before=<id> - messages between the two (gap fill)
+        Window size is ?limit= (default 50, max 200).
         """
-        other_user = self.get_object()
-        current_user = request.user
-
-        # Bidirectional message query
-        messages = Message.objects.filter(
-            Q(sender=current_user, receiver=other_user)
-            | Q(sender=other_user, receiver=current_user)
-        ).order_by("created_at")
+        try:
+            since = _optional_int(request.query_params, "since")
+            before = _optional_int(request.query_params, "before")
+            limit = _optional_int(request.query_params, "limit") or MESSAGE_WINDOW
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
+        other_user = self.get_object()
+        messages = _conversation_window(
+            request.user, other_user, since, before, max(1, min(limit, MAX_MESSAGE_WINDOW))
+        )
         serializer = MessageSerializer(messages, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=["post"], url_path="messages/read")
+    def read_messages(self, request, pk=None):
+        """
+        Mark messages from specified user as read.
+        POST /api/users/{id}/messages/read/ - body {"up_to": <message id>} is optional
+        """
+        try:
+            up_to = _optional_int(request.data, "up_to")
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        marked = mark_read(request.user, self.get_object(), up_to)
+        return Response({"marked_read": marked})
+
 
 # ==================== SONG VIEWS ====================
 
 
-class SongViewSet(viewsets.ModelViewSet):
+def _batch_ids(request):
+    """Requested ids in order without duplicates: ?ids=1,2,3 or a body {"ids": [1, 2, 3]}"""
+    if request.method == "POST":
+        raw = request.data.get("ids") if hasattr(request.data, "get") else None
+    else:
+        raw = request.query_params.get("ids")
+    if isinstance(raw, str):
+        raw = [value for value in raw.split(",") if value.strip()]
+    if not raw:
+        raise ValueError("ids is required")
+    if not isinstance(raw, list):
+        raise ValueError("ids must be a list of integers")
+
+    try:
+        # str() first so that 1.5 and true are rejected rather than truncated
+        ids = list(dict.fromkeys(int(str(value).strip()) for value in raw))
+    except ValueError:
+        raise ValueError("ids must be integers")
+    max_ids = getattr(settings, "BATCH_MAX_IDS", 100)
+    if len(ids) > max_ids:
+        raise ValueError(f"At most {max_ids} ids per request")
+    return ids
+
+
+def _batch_response(viewset, request):
+    """
+    The requested objects in one ``id__in`` query (through the viewset's
+    .values() fast path), in request order, plus the ids that don't exist.
+    """
+    try:
+        ids = _batch_ids(request)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    values_serializer = viewset.get_values_serializer()
+    queryset = viewset.get_queryset().filter(id__in=ids).order_by()
+    rows = list(values_serializer.rows(queryset, extra=["id"]))
+    found = {row["id"]: item for row, item in zip(rows, values_serializer.serialize(rows, request))}
+    return Response(
+        {
+            "results": [found[pk] for pk in ids if pk in found],
+            "missing": [pk for pk in ids if pk not in found],
+        }
+    )
+
+
+def _fill_with_random(songs, limit):
+    """Top up a ranked song list with random songs when it is too short"""
+    if len(songs) < limit:
+        seen = {song.id for song in songs}
+        songs = songs + [song for song in song_pool.sample(limit) if song.id not in seen]
+    return songs[:limit]
+
+
+class SongViewSet(
+    CatalogConditionalMixin, CatalogCacheMixin, SparseFieldsetMixin, ValuesListMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for managing songs.
+    GET /api/songs/?fields=id,title - Only the listed fields (or ?exclude=), also on detail
     """
 
     queryset = Song.objects.all()
     serializer_class = SongSerializer
+    values_serializer = ValuesSerializer(SongSerializer)
 
     def get_permissions(self):
         """
@@ -99,14 +274,30 @@ class SongViewSet(viewsets.ModelViewSet):
             and self.request.user.email == settings.ADMIN_EMAIL
         ):
             return Song.objects.all().order_by("-created_at")
+        if self.action == "retrieve":
+            # album_title
+            return Song.objects.select_related("album")
         return Song.objects.all()
 
+    @action(detail=False, methods=["get", "post"], permission_classes=[AllowAny])
+    def batch(self, request):
+        """
+        GET /api/songs/batch/?ids=3,1,2 - Several songs in one request, in the order asked
+        POST /api/songs/batch/ - Same with a body {"ids": [3, 1, 2]}, for long lists
+        Unknown ids are listed under "missing"; at most BATCH_MAX_IDS ids per request.
+        """
+        if request.method == "GET":
+            return cached_response(self, request, lambda request: _batch_response(self, request))
+        return _batch_response(self, request)
+
     @action(detail=False, methods=["get"], permission_classes=[AllowAny])
+    @catalog_cached(timeout=settings.FEATURED_CACHE_TIMEOUT)
     def featured(self, request):
         """
         GET /api/songs/featured/ - Get 6 random featured songs
+        The selection is cached briefly and rotates every FEATURED_CACHE_TIMEOUT seconds.
         """
-        songs = Song.objects.order_by("?")[:6]
+        songs = song_pool.sample(6)
         serializer = SongListSerializer(songs, many=True)
         return Response(serializer.data)
 
@@ -118,39 +309,123 @@ class SongViewSet(viewsets.ModelViewSet):
     )
     def made_for_you(self, request):
         """
-        GET /api/songs/made-for-you/ - Get 4 random personalized songs
+        GET /api/songs/made-for-you/ - Get 4 songs similar to the user's recent plays
+        Anonymous users (and users without history) get random songs.
         """
-        songs = Song.objects.order_by("?")[:4]
-        serializer = SongListSerializer(songs, many=True)
+        songs = recommend_songs(request.user, 4) if request.user.is_authenticated else []
+        serializer = SongListSerializer(_fill_with_random(songs, 4), many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"], permission_classes=[AllowAny])
     def trending(self, request):
         """
-        GET /api/songs/trending/ - Get 4 random trending songs
+        GET /api/songs/trending/ - Get the 4 songs with the highest decayed play score
+        Falls back to random songs while there aren't enough plays.
         """
-        songs = Song.objects.order_by("?")[:4]
-        serializer = SongListSerializer(songs, many=True)
+        songs = list(
+            Song.objects.filter(play_stats__isnull=False).order_by(
+                "-play_stats__trending_score"
+            )[:4]
+        )
+        serializer = SongListSerializer(_fill_with_random(songs, 4), many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=["post"], permission_classes=[AllowAny])
+    def play(self, request, pk=None):
+        """
+        POST /api/songs/{id}/play/ - Record a play of a song
+        The play is buffered and written in batches, so this normally never hits
+        the database. 503 when the buffer is full and can't be flushed.
+        """
+        try:
+            song_id = int(pk)
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid song id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.id if request.user.is_authenticated else None
+        if not play_buffer.record(song_id, user_id):
+            return Response(
+                {"error": "Plays are temporarily not being recorded"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"},
+            )
+        return Response({"queued": True}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["get"], permission_classes=[AllowAny])
+    def stream(self, request, pk=None):
+        """
+        GET /api/songs/{id}/stream/ - Stream the song's audio file
+        Supports Range/If-Range (206 Partial Content) so players can seek.
+        """
+        song = get_object_or_404(Song.objects.only("id", "audio_url"), pk=pk)
+        if not song.audio_url:
+            return Response({"error": "Song has no audio file"}, status=status.HTTP_404_NOT_FOUND)
+        return stream_file_field(request, song.audio_url)
+
+    @action(
+        detail=True,
+        methods=["get"],
+        permission_classes=[AllowAny],
+        renderer_classes=[FastJSONRenderer, WaveformRenderer],
+    )
+    def waveform(self, request, pk=None):
+        """
+        GET /api/songs/{id}/waveform/ - Peak envelope of the song's audio for the scrubber
+        Returns {"points": n, "peaks": [0-127, ...]}, or the packed peaks (one byte
+        per point) with ?format=bin / Accept: application/octet-stream.
+        404 until the waveform of the current audio file has been computed.
+        """
+        try:
+            song_id = int(pk)
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid song id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        waveform = (
+            SongWaveform.objects.filter(song_id=song_id, source=F("song__audio_url"))
+            .values_list("peaks", "updated_at")
+            .first()
+        )
+        if waveform is None:
+            return Response({"error": "Waveform not available"}, status=status.HTTP_404_NOT_FOUND)
+
+        peaks, updated_at = waveform
+        renderer_format = request.accepted_renderer.format
+        etag = quote_etag(f"waveform-{song_id}-{updated_at.timestamp():.6f}-{renderer_format}")
+        last_modified = int(updated_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            peaks = bytes(peaks)
+            data = peaks if renderer_format == WaveformRenderer.format else {
+                "points": len(peaks), "peaks": unpack_peaks(peaks),
+            }
+            response = Response(data)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
     def destroy(self, request, *args, **kwargs):
         """
         Delete a song and remove it from album if it belongs to one.
+        Its files are removed in the background once the delete commits.
         """
         song = self.get_object()
-        # Django CASCADE will handle album relationship
-        return super().destroy(request, *args, **kwargs)
+        delete_songs(Song.objects.filter(pk=song.pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 # ==================== ALBUM VIEWS ====================
 
 
-class AlbumViewSet(viewsets.ModelViewSet):
+class AlbumViewSet(
+    CatalogConditionalMixin, CatalogCacheMixin, SparseFieldsetMixin, ValuesListMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for managing albums.
+    GET /api/albums/?fields=id,title - Only the listed fields (or ?exclude=), also on detail
     """
 
     queryset = Album.objects.all()
+    values_serializer = ValuesSerializer(AlbumSerializer)
 
     def get_permissions(self):
         """
@@ -169,13 +444,106 @@ class AlbumViewSet(viewsets.ModelViewSet):
             return AlbumDetailSerializer
         return AlbumSerializer
 
+    @action(detail=False, methods=["get", "post"], permission_classes=[AllowAny])
+    def batch(self, request):
+        """
+        GET /api/albums/batch/?ids=3,1,2 - Several albums in one request, in the order asked
+        POST /api/albums/batch/ - Same with a body {"ids": [3, 1, 2]}, for long lists
+        Unknown ids are listed under "missing"; at most BATCH_MAX_IDS ids per request.
+        """
+        if request.method == "GET":
+            return cached_response(self, request, lambda request: _batch_response(self, request))
+        return _batch_response(self, request)
+
     def destroy(self, request, *args, **kwargs):
         """
-        Delete an album and all its associated songs (CASCADE delete).
+        Delete an album and all its associated songs.
+        Songs go in set-based batches, never loaded one by one, and their
+        files are removed in the background once the delete commits.
         """
         album = self.get_object()
-        # Songs will be deleted automatically due to CASCADE
-        return super().destroy(request, *args, **kwargs)
+        delete_albums(Album.objects.filter(pk=album.pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# ==================== ARTIST VIEWS ====================
+
+
+class ArtistViewSet(CatalogConditionalMixin, CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet for browsing artists.
+    Artists are created from the artist names of songs and albums.
+    """
+
+    permission_classes = [AllowAny]
+    pagination_class = ArtistPagination
+
+    def get_queryset(self):
+        """Only artists credited on at least one song or album"""
+        artists = Artist.objects.filter(Q(songs_count__gt=0) | Q(albums_count__gt=0))
+        if self.action == "retrieve":
+            return artists.prefetch_related("albums")
+        return artists
+
+    def get_serializer_class(self):
+        """Use detailed serializer for retrieve action"""
+        if self.action == "retrieve":
+            return ArtistDetailSerializer
+        return ArtistSerializer
+
+    @action(detail=True, methods=["get"])
+    @catalog_cached()
+    def songs(self, request, pk=None):
+        """
+        GET /api/artists/{id}/songs/ - The artist's songs, newest first (paginated)
+        """
+        artist = get_object_or_404(Artist, pk=pk)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(artist.songs.all(), request, view=self)
+        serializer = SongListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+# ==================== SEARCH VIEWS ====================
+
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def search(request):
+    """
+    GET /api/search/?q=<text> - Songs, albums and artists whose words start with the query words
+    Optional: limit (per type, default 10, max 50), type (comma-separated songs,albums,artists)
+    """
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response(
+            {"error": "Query parameter 'q' is required"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = _optional_int(request.query_params, "limit") or SEARCH_LIMIT
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    kinds = tuple(request.query_params.get("type", ",".join(SEARCH_KINDS)).split(","))
+    if not set(kinds) <= set(SEARCH_KINDS):
+        return Response(
+            {"error": f"type must be a comma-separated subset of {', '.join(SEARCH_KINDS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    results = search_index.search(query, limit, kinds)
+    data = {}
+    if "songs" in results:
+        data["songs"] = SongListSerializer(results["songs"], many=True).data
+    if "albums" in results:
+        data["albums"] = AlbumSerializer(results["albums"], many=True).data
+    if "artists" in results:
+        data["artists"] = ArtistSerializer(results["artists"], many=True).data
+    return Response(data)
 
 
 # ==================== STATS VIEWS ====================
@@ -188,53 +556,80 @@ def get_stats(request):
     GET /api/stats/ - Get platform statistics (Admin only)
     Returns: total_songs, total_albums, total_users, total_artists
     """
-    total_songs = Song.objects.count()
-    total_albums = Album.objects.count()
-    total_users = User.objects.count()
-
-    # Count unique artists from both songs and albums
-    song_artists = Song.objects.values("artist").distinct()
-    album_artists = Album.objects.values("artist").distinct()
+    serializer = StatsSerializer(get_platform_stats())
+    return Response(serializer.data)
 
-    # Combine and get unique count
-    all_artists = set()
-    for artist in song_artists:
-        all_artists.add(artist["artist"])
-    for artist in album_artists:
-        all_artists.add(artist["artist"])
 
-    total_artists = len(all_artists)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def get_cache_stats(request):
+    """
+    GET /api/stats/cache/ - Catalog response cache hit/miss counters (Admin only)
+    Counters are per worker process and reset on restart.
+    """
+    return Response(cache_counters.snapshot())
 
-    stats_data = {
-        "total_songs": total_songs,
-        "total_albums": total_albums,
-        "total_users": total_users,
-        "total_artists": total_artists,
-    }
 
-    serializer = StatsSerializer(stats_data)
-    return Response(serializer.data)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def get_metrics(request):
+    """
+    GET /api/metrics/ - Per-view latency histograms, status counts and SQL
+    totals in Prometheus text format (Admin only). Per worker process.
+    """
+    return HttpResponse(
+        request_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 # ==================== MESSAGE VIEWS ====================
 
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing messages.
+    GET /api/messages/?fields=id,content,sender - Only the listed fields (or ?exclude=)
     """
 
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessagePagination
 
     def get_queryset(self):
         """Only return messages involving the authenticated user"""
         user = self.request.user
-        return Message.objects.filter(Q(sender=user) | Q(receiver=user)).order_by(
-            "created_at"
+        return (
+            Message.objects.filter(Q(sender=user) | Q(receiver=user))
+            .select_related("sender", "receiver")
+            .order_by("created_at")
         )
 
+    @action(detail=False, methods=["get"])
+    def inbox(self, request):
+        """
+        GET /api/messages/inbox/ - Conversations of the authenticated user,
+        most recent first, with the last message and unread count per peer
+        """
+        conversations = Conversation.objects.filter(user=request.user).select_related(
+            "peer", "last_message__sender", "last_message__receiver"
+        )
+        paginator = ConversationPagination()
+        page = paginator.paginate_queryset(conversations, request, view=self)
+        serializer = ConversationSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
-        """Set the sender to the authenticated user"""
-        serializer.save(sender=self.request.user)
+        """
+        Set the sender to the authenticated user and push the message to
+        both participants' open sockets once it is committed.
+        """
+        message = serializer.save(sender=self.request.user)
+        payload = dict(serializer.data)
+        channels = {user_channel(message.sender_id), user_channel(message.receiver_id)}
+
+        def publish():
+            for channel in channels:
+                broker.publish(channel, payload)
+
+        transaction.on_commit(publish)
@@ -0,0 +1,92 @@
+"""
+Background pools for media processing (api/images.py, api/audio.py).
+
+Jobs that read storage or write the database run on a thread pool. The
+CPU-bound decoding inside them runs in worker processes, so request threads
+only enqueue work and the GIL is never held for long. Each process creates
+its pools lazily: they don't survive a fork, e.g. under gunicorn --preload.
+Worker processes start from a forkserver (spawn where that's unavailable),
+never by forking the multi-threaded web process, and set up Django once.
+With ``workers=0`` everything runs inline in the caller.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _setup_worker():
+    # Job functions live in modules that import the models
+    import django
+
+    django.setup()
+
+
+class MediaWorkers:
+    """A thread pool for I/O-bound jobs plus a process pool for their CPU-bound steps"""
+
+    def __init__(self, workers, name):
+        self.workers = workers
+        self.name = name
+        self._threads = None
+        self._processes = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executors(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._threads = ThreadPoolExecutor(2 * self.workers, thread_name_prefix=self.name)
+                self._processes = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context(START_METHOD),
+                    initializer=_setup_worker,
+                )
+                self._pid = os.getpid()
+            return self._threads, self._processes
+
+    def compute(self, fn, *args):
+        """``fn(*args)`` in a worker process (``fn`` must be picklable); waits for the result"""
+        if not self.workers:
+            return fn(*args)
+        _, processes = self._executors()
+        return processes.submit(fn, *args).result()
+
+    def submit(self, fn, *args):
+        """Run ``fn(*args)`` on a pool thread; exceptions are logged"""
+        if not self.workers:
+            return fn(*args)
+        threads, _ = self._executors()
+        return threads.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        close_old_connections()
+        try:
+            return fn(*args)
+        except Exception:
+            logger.exception("%s job failed", self.name)
+        finally:
+            close_old_connections()
+
+    def map(self, fn, items):
+        """``[fn(item) for item in items]`` on the thread pool, in order"""
+        if not self.workers:
+            return [fn(item) for item in items]
+        threads, _ = self._executors()
+        return list(threads.map(fn, items))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._threads.shutdown()
+                self._processes.shutdown()
+            self._pid = None
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     # Third-party apps
     "rest_framework",
     "rest_framework.authtoken",
@@ -61,6 +62,8 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    # First, so latency and SQL counts cover the whole stack
+    "api.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -108,6 +111,42 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# "catalog" holds versioned song/album response payloads (see api/cache.py).
+# LocMemCache evicts least-recently-used entries once MAX_ENTRIES is reached;
+# set CATALOG_CACHE_URL (e.g. redis://localhost:6379/1, needs the redis
+# package) to share it between worker processes.
+
+CATALOG_CACHE_URL = os.getenv("CATALOG_CACHE_URL") or None
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "default",
+    },
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CATALOG_CACHE_URL,
+    }
+    if CATALOG_CACHE_URL
+    else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalog",
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "5000")),
+            "CULL_FREQUENCY": 10,
+        },
+    },
+    # Token -> user resolutions (see api/authentication.py)
+    "auth": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "auth",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -159,14 +198,23 @@ AUTH_USER_MODEL = "api.User"
 
 # Django REST Framework
 REST_FRAMEWORK = {
+    # The first class supplies WWW-Authenticate, so failed requests get 401
+    # (Bearer) instead of SessionAuthentication's 403
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        "api.authentication.SignedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    # Same bytes as JSONRenderer, encoded with orjson when it is installed
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Keyset pagination on (-created_at, -id): no COUNT(*), no OFFSET
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
     "PAGE_SIZE": 20,
 }
 
@@ -187,3 +235,77 @@ CORS_ALLOW_CREDENTIALS = True
 # Admin email for admin privileges
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@example.com")
 
+
+# Random song sampling (featured / made-for-you / trending)
+# Set SONG_POOL_CACHE_ALIAS to a shared cache to let workers reuse the id pool.
+SONG_POOL_CACHE_ALIAS = os.getenv("SONG_POOL_CACHE_ALIAS") or None
+SONG_POOL_TTL = int(os.getenv("SONG_POOL_TTL", "300"))
+
+# Play events are buffered in-process and flushed in batches
+PLAY_BUFFER_SIZE = int(os.getenv("PLAY_BUFFER_SIZE", "1000"))
+PLAY_FLUSH_INTERVAL = float(os.getenv("PLAY_FLUSH_INTERVAL", "1.0"))
+# Events held while the database is unavailable; beyond this requests flush
+# themselves and POST /play/ answers 503 if that fails too
+PLAY_BUFFER_MAX_PENDING = int(os.getenv("PLAY_BUFFER_MAX_PENDING", "100000"))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+
+# Real-time message push (see api/pubsub.py)
+# Use "api.pubsub.RelayBroker" with `manage.py run_pubsub_relay` when running
+# several ASGI worker processes.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "api.pubsub.InMemoryBroker")
+PUBSUB_RELAY_ADDRESS = os.getenv("PUBSUB_RELAY_ADDRESS", "127.0.0.1:8765")
+
+# Audio streaming (GET /api/songs/{id}/stream/)
+# "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd) hands the file to
+# the front proxy; unset, Django serves ranges itself (sendfile under gunicorn).
+AUDIO_STREAM_OFFLOAD = os.getenv("AUDIO_STREAM_OFFLOAD") or None
+AUDIO_ACCEL_REDIRECT_PREFIX = os.getenv("AUDIO_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+
+# Versioned catalog response cache (list / retrieve / featured)
+CATALOG_CACHE_ALIAS = os.getenv("CATALOG_CACHE_ALIAS", "catalog")
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "300"))
+FEATURED_CACHE_TIMEOUT = int(os.getenv("FEATURED_CACHE_TIMEOUT", "60"))
+
+# Multi-get (GET/POST /api/songs/batch/, /api/albums/batch/): ids per request
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "100"))
+
+# Search (GET /api/search/): rebuild the in-process index this often (seconds).
+# 0 never rebuilds; set it when several processes write the catalog, since
+# each index only sees the writes made in its own process
+SEARCH_INDEX_TTL = int(os.getenv("SEARCH_INDEX_TTL", "0"))
+
+# Admin stats (GET /api/stats/) are kept by signals and reconciled this often
+# (seconds). "approximate" counts artists with a HyperLogLog sketch.
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+STATS_ARTIST_COUNT = os.getenv("STATS_ARTIST_COUNT", "exact")
+
+# Per-view latency / SQL metrics (GET /api/metrics/). Requests slower than
+# SLOW_REQUEST_MS are logged with their SQL; 0 disables the log.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "0"))
+
+# Token authentication: token -> user lookups are cached for AUTH_CACHE_TIMEOUT
+# seconds (use a shared cache alias to invalidate across workers on logout).
+# Signed access tokens (POST /api/auth/access-token/) expire after
+# ACCESS_TOKEN_LIFETIME seconds and can't be revoked before that.
+AUTH_CACHE_ALIAS = os.getenv("AUTH_CACHE_ALIAS", "auth")
+AUTH_CACHE_TIMEOUT = int(os.getenv("AUTH_CACHE_TIMEOUT", "300"))
+ACCESS_TOKEN_LIFETIME = int(os.getenv("ACCESS_TOKEN_LIFETIME", "900"))
+
+# Sessions are read through the cache, falling back to the database
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
+
+# Image derivatives (thumbnails, WebP): worker processes per server process.
+# 0 generates them synchronously after commit.
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Audio analysis (waveform peaks, metadata of rows saved without signals):
+# worker processes per server process. 0 analyzes synchronously after commit.
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+
+# Song/album deletes (api/deletion.py): rows per set-based DELETE batch.
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "1000"))
+# Files of deleted rows are removed by a background thread this many seconds
+# apart (and right after each delete). 0 removes them synchronously on commit.
+MEDIA_CLEANUP_INTERVAL = float(os.getenv("MEDIA_CLEANUP_INTERVAL", "5.0"))
+MEDIA_CLEANUP_BATCH_SIZE = int(os.getenv("MEDIA_CLEANUP_BATCH_SIZE", "500"))